@@ -0,0 +1,301 @@
+"""
+async_serial.py
+---------------
+asyncio serial frame reader: wakes on data (loop.add_reader on the port's
+file descriptor) instead of polling with sleeps, decodes frames as they
+arrive and hands them to consumers through a bounded channel.
+
+Decimation happens right after the vectorized checksum pass: when a burst
+holds more frames than the output rate allows, only the newest one is
+converted into a SensorFrame. The per-frame work downstream (copy, smoothing,
+fusion) therefore scales with the output rate, not the wire rate. Output
+slots are a fixed 1/max_rate_hz grid (next_due += period), not "one period
+since the last emit", so a 30 Hz stream capped at 20 Hz comes out at 20 Hz
+rather than every other frame (15 Hz).
+
+Channel overflow policies (consumer slower than the output rate):
+    drop-oldest   keep the newest `maxsize` frames, count the dropped ones
+    latest        latest-wins slot: a new frame replaces the unread one
+    block         stop reading the port until the consumer catches up
+                  (backpressure lands in the OS / pty buffer)
+
+Run this file for a pty loopback demo: python -m sensors.async_serial
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from sensors.frame_decoder import FrameDecoder, READ_CHUNK
+from sensors.sensor_frame import SensorFrame, MM
+
+OVERFLOW_POLICIES = ("drop-oldest", "latest", "block")
+
+
+class ChannelClosed(Exception):
+    """The reader stopped (port closed / EOF); raised to consumers once drained."""
+
+
+# === CHANNEL ===
+class FrameChannel:
+    """Bounded single-loop channel with a selectable overflow policy."""
+
+    def __init__(self, maxsize=4, policy="drop-oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"policy must be one of {OVERFLOW_POLICIES}, got {policy!r}")
+        self.policy = policy
+        self.maxsize = 1 if policy == "latest" else max(1, maxsize)
+        self._items = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._closed = None         # exception to raise once drained
+        self.stats = {"put": 0, "got": 0, "dropped": 0, "max_depth": 0}
+
+    def full(self):
+        return len(self._items) >= self.maxsize
+
+    def __len__(self):
+        return len(self._items)
+
+    def offer(self, item):
+        """
+        Non-blocking put. drop-oldest / latest always succeed (evicting the
+        oldest item if full); block returns False when full.
+        """
+        if self.full():
+            if self.policy == "block":
+                return False
+            self._items.popleft()
+            self.stats["dropped"] += 1
+        self._items.append(item)
+        self.stats["put"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._items))
+        self._readable.set()
+        if self.full():
+            self._writable.clear()
+        return True
+
+    async def put(self, item):
+        while not self.offer(item):
+            await self._writable.wait()
+
+    async def wait_writable(self):
+        await self._writable.wait()
+
+    async def get(self):
+        while not self._items:
+            if self._closed is not None:
+                raise self._closed
+            self._readable.clear()
+            await self._readable.wait()
+        item = self._items.popleft()
+        self.stats["got"] += 1
+        self._writable.set()
+        return item
+
+    def close(self, exc=None):
+        self._closed = exc or ChannelClosed()
+        self._readable.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.get()
+        except ChannelClosed:
+            raise StopAsyncIteration
+
+
+# === READER ===
+class AsyncFrameReader:
+    """
+    Reads frames from a non-blocking stream with fileno() + readinto()
+    (serial.Serial(timeout=0), or a pty opened with buffering=0) whenever
+    the event loop reports it readable.
+
+    max_rate_hz: output cap (None = every frame). Frames arriving faster are
+                 dropped before conversion; within a burst the newest wins.
+    on_burst:    optional callback(burst) seeing every decoded frame (recording).
+    device:      id stamped on every SensorFrame (multi-port hub)
+    owns_channel: close the channel when the stream ends (False when several
+                 readers share one channel)
+    """
+
+    def __init__(self, stream, channel, max_rate_hz=None, on_burst=None, decoder=None,
+                 device=None, owns_channel=True):
+        self.stream = stream
+        self.channel = channel
+        self.device = device
+        self.owns_channel = owns_channel
+        self.decoder = decoder or FrameDecoder()
+        self.min_interval_ns = int(1e9 / max_rate_hz) if max_rate_hz else 0
+        self.on_burst = on_burst
+        self.done = None
+        self._loop = None
+        self._fd = stream.fileno()
+        self._reading = False
+        self._next_due_ns = 0       # start of the next output slot (max_rate_hz)
+        self._backlog = deque()     # converted frames waiting for room (block policy)
+        self._draining = False
+        self.stats = {"wakeups": 0, "wire_frames": 0, "decimated": 0, "emitted": 0}
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.done = self._loop.create_future()
+        self._resume()
+        return self.done
+
+    def stop(self, exc=None):
+        self._pause()
+        if self.done is not None and not self.done.done():
+            if exc is None:
+                self.done.set_result(self.stats)
+            else:
+                self.done.set_exception(exc)
+        if self.owns_channel:
+            self.channel.close(exc)
+
+    def _resume(self):
+        if not self._reading:
+            self._loop.add_reader(self._fd, self._on_readable)
+            self._reading = True
+
+    def _pause(self):
+        if self._reading:
+            self._loop.remove_reader(self._fd)
+            self._reading = False
+
+    # --- Event loop callback ---
+    def _on_readable(self):
+        self.stats["wakeups"] += 1
+        try:
+            pending = getattr(self.stream, "in_waiting", 0)
+            n = self.decoder.readinto(self.stream, max(pending, READ_CHUNK))
+        except BlockingIOError:
+            return
+        except OSError as e:     # unplugged port / closed pty
+            self.stop(e)
+            return
+        if not n:
+            self.stop(EOFError("serial stream closed"))
+            return
+
+        burst = self.decoder.decode()
+        if not len(burst):
+            return
+        self.stats["wire_frames"] += len(burst)
+        if self.on_burst:
+            self.on_burst(burst)
+
+        now = time.monotonic_ns()
+        if self.min_interval_ns:
+            if now < self._next_due_ns:
+                self.stats["decimated"] += len(burst)
+                return
+            self.stats["decimated"] += len(burst) - 1
+            # Next slot one period on; after a gap, restart from now instead of bursting to catch up
+            self._next_due_ns = max(self._next_due_ns + self.min_interval_ns, now)
+            indices = (len(burst) - 1,)      # newest frame of the burst wins
+        else:
+            indices = range(len(burst))
+
+        tof, us = burst["tof"], burst["us"]
+        for i in indices:
+            # Copy out of the decoder buffer: consumers run after the next read
+            self._emit(SensorFrame(now, tof[i].copy(), float(us[i]), MM, self.device))
+
+    def _emit(self, frame):
+        if self._backlog or not self.channel.offer(frame):
+            # block policy, channel full: hold the frame and stop reading the port
+            self._backlog.append(frame)
+            self._pause()
+            if not self._draining:
+                self._draining = True
+                self._loop.create_task(self._drain_backlog())
+            return
+        self.stats["emitted"] += 1
+
+    async def _drain_backlog(self):
+        while self._backlog:
+            await self.channel.wait_writable()
+            while self._backlog and self.channel.offer(self._backlog[0]):
+                self._backlog.popleft()
+                self.stats["emitted"] += 1
+        self._draining = False
+        if self.done is not None and not self.done.done():
+            self._resume()
+
+
+async def consume(channel, sink):
+    """Feed every frame from channel to sink (e.g. sensor_processor.process_frame)."""
+    async for frame in channel:
+        sink(frame)
+
+
+def open_pty_pair():
+    """(master_fd, slave stream) loopback for tests/demos: write frames to master_fd."""
+    master, slave = os.openpty()
+    import tty
+    tty.setraw(slave)
+    os.set_blocking(slave, False)
+    return master, open(slave, "rb", buffering=0)
+
+
+# === PTY DEMO ===
+if __name__ == "__main__":
+    import sys
+    import threading
+
+    import numpy as np
+
+    from sensors.frame_decoder import encode_frame
+
+    # python -m sensors.async_serial [policy] [output cap Hz | none]
+    WIRE_HZ, SECONDS = 400, 3.0
+    policy = sys.argv[1] if len(sys.argv) > 1 else "latest"
+    OUT_HZ = None if len(sys.argv) > 2 and sys.argv[2] == "none" else float(sys.argv[2] if len(sys.argv) > 2 else 20)
+
+    def writer(fd):
+        """Simulated ESP32: WIRE_HZ frames/s into the pty master."""
+        frames = [encode_frame(np.full(64, 500 + i, dtype=np.uint16), 50.0) for i in range(100)]
+        t_next = time.perf_counter()
+        for k in range(int(WIRE_HZ * SECONDS)):
+            try:
+                os.write(fd, frames[k % 100])
+            except OSError:
+                return          # demo over, pty closed
+            t_next += 1 / WIRE_HZ
+            time.sleep(max(0.0, t_next - time.perf_counter()))
+
+    async def demo():
+        master, slave = open_pty_pair()
+        channel = FrameChannel(maxsize=4, policy=policy)
+        reader = AsyncFrameReader(slave, channel, max_rate_hz=OUT_HZ)
+        reader.start()
+
+        received = 0
+
+        def sink(frame):
+            nonlocal received
+            received += 1
+            time.sleep(0.004)    # consumer work: ~250 frames/s at most
+
+        threading.Thread(target=writer, args=(master,), daemon=True).start()
+        cpu0 = time.process_time()
+        consumer = asyncio.ensure_future(consume(channel, sink))
+        await asyncio.sleep(SECONDS + 0.2)
+        reader.stop()
+        await consumer
+        cpu = time.process_time() - cpu0
+        os.close(master)
+        slave.close()
+
+        print(f"policy={policy}: wire {reader.stats['wire_frames']} frames "
+              f"({WIRE_HZ} Hz) → delivered {received} (cap {OUT_HZ} Hz)")
+        print(f"   reader {reader.stats}  channel {channel.stats}")
+        print(f"   CPU {cpu * 1000:.0f} ms for {SECONDS:.0f} s of data")
+
+    asyncio.run(demo())
@@ -0,0 +1,575 @@
+"""
+audio_engine.py
+---------------
+Long-lived audio output: proximity tones, the proximity voice and speech
+(tts_engine) share one persistent stream, with no process or thread per beep.
+
+At startup every tone in audio_feedback.TONES is rendered once into an int16
+PCM buffer (sine with short raised-cosine edges, no clicks). One writer thread
+feeds a single persistent output stream, block by block and paced by the
+clock, writing silence between tones so the stream never underruns. beep()
+only queues the level name. The writer picks it up at the next block
+boundary, and a newer beep replaces the tone still playing (the newest zone
+is the one that matters).
+
+Sinks (AUDIO_SINK):
+    "pw-play"     raw PCM into `pw-play` (PipeWire: the default, e.g. Bluetooth, sink)
+    "aplay"       raw PCM into `aplay` (ALSA), small device buffer
+    "wav:<path>"  a WAV file, e.g. for tests on machines without audio
+    "null"        discard (latency stats still work)
+
+Onset latency (beep() call → first tone sample handed to the sink) is kept
+for every beep; latency() summarises it. The sink's own buffer (SINK_BUFFER_MS
+for the pipe sinks) comes on top.
+
+The pipe sinks pace the writer: their pipe is shrunk to PIPE_BYTES
+(F_SETPIPE_SZ) and written unbuffered, so a write blocks once the player is
+that far ahead and the device's own clock sets the rate. A perf_counter
+pace would drift against the device and slowly fill a default 64 KB pipe
+(~0.74 s of audio), and beep latency would creep up over a session. Only
+the file / null sinks are paced by the clock.
+
+The stream is stereo (CHANNELS = 2): the mono mix of tones and voice is
+split into left/right with constant-power gains (cos θ, sin θ) for the pan
+position set by pan(), e.g. per sensor frame from the ToF column minima.
+θ ramps per sample within each block, so the pan follows the sensor at
+frame rate without re-synthesizing or clicking.
+
+The same stream carries the proximity voice: a parking-sensor style pulse
+train whose repetition rate and pitch follow the fused distance (pulled in
+by the closing speed). It is rendered block by block from two precomputed
+wavetables, a sine cycle and one pulse envelope, each read through a phase
+accumulator. The per-sample increments ramp from the previous block's
+setting to the new one, so pitch and repetition rate can change mid-pulse
+without clicks. Cost is a fixed handful of vector ops per block.
+
+Speech is queued as whole PCM clips (say()) and played back to back, centred
+and unpanned, on top of whatever tones are sounding: a beep never waits for
+a caption to finish. Each clip records when its first sample went to the
+sink (started / t_start) and sets done after its last one.
+
+    import audio_engine
+    audio_engine.start()               # once, at startup (beep() starts it lazily otherwise)
+    audio_engine.beep("near")          # enqueue only
+    audio_engine.proximity(0.8, 0.5)   # voice: distance m, closing speed m/s (per fused sample)
+    audio_engine.pan(-0.6)             # -1 left … +1 right (per sensor frame)
+    clip = audio_engine.say(pcm)       # int16 / float mono PCM at SAMPLE_RATE; clip.done.wait()
+"""
+
+import atexit
+import fcntl
+import subprocess
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from audio_feedback import TONES
+
+# === CONFIG ===
+SAMPLE_RATE = 22050
+BLOCK = 256               # samples per write (~11.6 ms): worst-case wait for the next boundary
+SINK_BUFFER_MS = 40       # device buffer requested from aplay / pw-play
+AMPLITUDE = 0.5
+FADE_MS = 5
+AUDIO_SINK = "pw-play"
+PIPE_BYTES = 4096         # audio queued ahead of the player: 1024 stereo frames, ~46 ms
+CHANNELS = 2              # 1 = mono (pan ignored)
+
+# === PROXIMITY VOICE ===
+VOICE_NEAR_M = 0.35             # at / below: solid tone
+VOICE_FAR_M = 2.0               # beyond: silent
+VOICE_RATE_HZ = (2.0, 12.0)     # pulse repetition, far → near
+VOICE_PITCH_HZ = (440.0, 1200.0)
+VOICE_DUTY = 0.4                # fraction of each period the pulse sounds
+VOICE_EDGE = 0.2                # attack / release, fraction of the pulse
+VOICE_LOOKAHEAD_S = 0.5         # closing speed pulls the distance in by speed × this
+VOICE_TIMEOUT_S = 0.5           # no proximity() update for this long → fade out
+VOICE_GAIN = 0.35
+WAVETABLE_SIZE = 4096
+ENVELOPE_SIZE = 1024
+
+# === SPEECH ===
+SPEECH_GAIN = 0.8               # per channel, on top of the (panned) tones
+
+SINK_COMMANDS = {
+    "aplay": ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-c", "{channels}", "-r", "{rate}",
+              "--buffer-time={buffer_us}"],
+    "pw-play": ["pw-play", "--rate", "{rate}", "--channels", "{channels}", "--format", "s16",
+                "--latency={buffer_ms}ms", "-"],
+}
+
+
+def render_tone(freq, duration, rate=SAMPLE_RATE, amplitude=AMPLITUDE, fade_ms=FADE_MS):
+    """One tone as float32 PCM (full scale ±1), with raised-cosine fade in/out."""
+    n = int(round(duration * rate))
+    t = np.arange(n) / rate
+    pcm = amplitude * np.sin(2 * np.pi * freq * t)
+    fade = min(n // 2, int(rate * fade_ms / 1000))
+    if fade:
+        ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(fade) / fade)
+        pcm[:fade] *= ramp
+        pcm[n - fade:] *= ramp[::-1]
+    return pcm.astype(np.float32)
+
+
+def pulse_envelope(duty=VOICE_DUTY, edge=VOICE_EDGE, size=ENVELOPE_SIZE):
+    """One repetition period of the voice: raised-cosine pulse over the first `duty`, then silence."""
+    env = np.zeros(size, dtype=np.float32)
+    on = max(2, int(size * duty))
+    ramp_n = max(1, int(on * edge))
+    env[:on] = 1.0
+    ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(ramp_n) / ramp_n)
+    env[:ramp_n] = ramp
+    env[on - ramp_n:on] = ramp[::-1]
+    return env
+
+
+class ProximityVoice:
+    """
+    Parking-sensor pulse train, rendered into the engine's mix block by block.
+    set() may be called from any thread; render() runs on the writer thread.
+    """
+
+    def __init__(self, rate=SAMPLE_RATE, block=BLOCK):
+        self.rate = rate
+        self.table = np.sin(2 * np.pi * np.arange(WAVETABLE_SIZE) / WAVETABLE_SIZE).astype(np.float32)
+        self.envelope = pulse_envelope()
+        self._ramp = np.arange(1, block + 1, dtype=np.float64) / block
+        self._inc = np.empty(block)
+        self._phase = np.empty(block)
+        self._idx = np.empty(block, dtype=np.intp)
+        self._tone = np.empty(block, dtype=np.float32)
+        self._env = np.empty(block, dtype=np.float32)
+        self._target = None                  # (distance, closing speed, monotonic time)
+        self.osc = self.pulse = 0.0          # phase accumulators (table units)
+        self.freq, self.prate = VOICE_PITCH_HZ[0], VOICE_RATE_HZ[0]
+        self.gain = self.solid = 0.0
+
+    def set(self, distance, closing=0.0):
+        """New fused distance (m, None = nothing) and closing speed (m/s, > 0 = approaching)."""
+        self._target = None if distance is None else (distance, closing, time.monotonic())
+
+    def targets(self):
+        """(pitch Hz, repetition Hz, gain, solid) for the current proximity."""
+        target = self._target
+        if target is None or time.monotonic() - target[2] > VOICE_TIMEOUT_S:
+            return self.freq, self.prate, 0.0, self.solid
+        distance, closing, _ = target
+        d = distance - VOICE_LOOKAHEAD_S * max(closing, 0.0)
+        if d > VOICE_FAR_M:
+            return self.freq, self.prate, 0.0, 0.0
+        x = min(1.0, max(0.0, (VOICE_FAR_M - d) / (VOICE_FAR_M - VOICE_NEAR_M)))   # 0 far … 1 near
+        (f0, f1), (r0, r1) = VOICE_PITCH_HZ, VOICE_RATE_HZ
+        return f0 * (f1 / f0) ** x, r0 * (r1 / r0) ** x, VOICE_GAIN, float(d <= VOICE_NEAR_M)
+
+    def _advance(self, start, old, new, size, table, out):
+        """Phase accumulator over one block, increment ramping old → new Hz; returns the end phase."""
+        inc, phase = self._inc, self._phase
+        np.multiply(self._ramp, new - old, out=inc)
+        inc += old
+        inc *= size / self.rate
+        np.cumsum(inc, out=phase)
+        phase += start
+        end = phase[-1] % size
+        np.remainder(phase, size, out=phase)
+        np.copyto(self._idx, phase, casting="unsafe")
+        np.take(table, self._idx, out=out)
+        return end
+
+    def render(self, mix):
+        """Add one block of the voice into mix (float32)."""
+        freq, prate, gain, solid = self.targets()
+        if gain == 0.0 and self.gain == 0.0:
+            self.pulse = 0.0                 # next pulse train starts with a pulse
+            return
+        tone, env = self._tone, self._env
+        self.osc = self._advance(self.osc, self.freq, freq, WAVETABLE_SIZE, self.table, tone)
+        self.pulse = self._advance(self.pulse, self.prate, prate, ENVELOPE_SIZE, self.envelope, env)
+        if solid or self.solid:              # crossfade the pulse train into a steady tone
+            fill = self._phase
+            np.multiply(self._ramp, solid - self.solid, out=fill)
+            fill += self.solid
+            fill *= 1.0 - env
+            env += fill
+        gains = self._inc
+        np.multiply(self._ramp, gain - self.gain, out=gains)
+        gains += self.gain
+        env *= gains
+        tone *= env
+        mix += tone
+        self.freq, self.prate, self.gain, self.solid = freq, prate, gain, solid
+
+
+# === SINKS ===
+class SpeechClip:
+    """One queued speech buffer; started / done are set by the writer thread."""
+
+    def __init__(self, pcm, gain=SPEECH_GAIN):
+        pcm = np.asarray(pcm).reshape(-1)
+        scale = gain / 32768 if pcm.dtype == np.int16 else gain
+        self.pcm = np.multiply(pcm, scale, dtype=np.float32)
+        self.pos = 0
+        self.t_start = None                # time.time() of the first sample handed to the sink
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+    @property
+    def duration(self):
+        return self.pcm.size / SAMPLE_RATE
+
+
+class PipeSink:
+    """Raw PCM into a persistent player process (aplay / pw-play); writes block at the device's pace."""
+
+    paced = True
+
+    def __init__(self, cmd, pipe_bytes=PIPE_BYTES):
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=0,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            fcntl.fcntl(self.proc.stdin.fileno(), getattr(fcntl, "F_SETPIPE_SZ", 1031), pipe_bytes)
+        except OSError:
+            pass                                   # not Linux: default pipe size
+
+    def write(self, pcm):
+        self.proc.stdin.write(pcm.tobytes())
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait(timeout=2)
+
+
+class WavSink:
+    paced = False
+
+    def __init__(self, path, rate=SAMPLE_RATE, channels=CHANNELS):
+        self.wav = wave.open(path, "wb")
+        self.wav.setnchannels(channels)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(rate)
+
+    def write(self, pcm):
+        self.wav.writeframes(pcm.tobytes())
+
+    def close(self):
+        self.wav.close()
+
+
+class NullSink:
+    paced = False
+
+    def write(self, pcm):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_sink(spec=AUDIO_SINK, rate=SAMPLE_RATE, channels=CHANNELS):
+    """Sink for an AUDIO_SINK spec; a missing player falls back to the null sink."""
+    if spec.startswith("wav:"):
+        return WavSink(spec[4:], rate, channels)
+    if spec == "null":
+        return NullSink()
+    fields = {"rate": rate, "channels": channels, "buffer_ms": SINK_BUFFER_MS,
+              "buffer_us": SINK_BUFFER_MS * 1000}
+    try:
+        return PipeSink([arg.format(**fields) for arg in SINK_COMMANDS[spec]])
+    except OSError as e:
+        print(f"⚠️ Audio sink {spec!r} unavailable ({e}); tones are discarded")
+        return NullSink()
+
+
+# === ENGINE ===
+class AudioEngine:
+    """
+    Usage:
+        engine = AudioEngine("wav:/tmp/beeps.wav").start()
+        engine.beep("close")
+        engine.latency()        # {"beeps", "mean_ms", "max_ms", ...}
+        engine.stop()
+    """
+
+    def __init__(self, sink=AUDIO_SINK, rate=SAMPLE_RATE, block=BLOCK, tones=TONES, channels=CHANNELS):
+        self.sink_spec = sink
+        self.rate = rate
+        self.block = block
+        self.bank = {level: render_tone(f, d, rate) for level, (f, d) in tones.items()}
+        self.sink = None
+        self._pending = deque()            # (level, perf_counter_ns of the beep() call)
+        self._speech = deque()             # SpeechClip, played in order
+        self._voice_buf = np.zeros(block, dtype=np.float32)
+        self._onsets_ms = deque(maxlen=256)
+        self.voice = ProximityVoice(rate, block)
+        self.channels = channels
+        self._mix = np.zeros(block, dtype=np.float32)
+        self._out = np.zeros((block, channels), dtype=np.float32)
+        self._buf = np.zeros((block, channels), dtype=np.int16)
+        self._ramp = np.arange(1, block + 1, dtype=np.float32) / block
+        self._theta = np.empty(block, dtype=np.float32)
+        self._gain = np.empty(block, dtype=np.float32)
+        self._pan_target = self._pan = np.pi / 4   # θ: 0 = left, π/4 = centre, π/2 = right
+        self._current = None
+        self._pos = 0
+        self._running = False
+        self._thread = None
+        self.beeps = 0
+        self.dropped = 0                   # replaced before they started
+        self.late_blocks = 0               # writer fell behind the clock
+
+    # --- Control ---
+    def start(self):
+        if self._running:
+            return self
+        self.sink = open_sink(self.sink_spec, self.rate, self.channels)
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, name="audio-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join(timeout=1.0)
+        self.sink.close()
+        while self._speech:
+            self._speech.popleft().done.set()      # nobody waits forever on a dead stream
+
+    # --- Speech path: enqueue only ---
+    def say(self, pcm, gain=SPEECH_GAIN):
+        """Queue mono speech PCM (int16, or float in -1…1) after any speech still playing; returns its SpeechClip."""
+        clip = SpeechClip(pcm, gain)
+        self._speech.append(clip)
+        return clip
+
+    def speaking(self):
+        return bool(self._speech)
+
+    # --- Beep path: enqueue only ---
+    def beep(self, level):
+        """Queue a tone (audio_feedback.TONES level); returns False for unknown levels."""
+        if level not in self.bank:
+            return False
+        self._pending.append((level, time.perf_counter_ns()))
+        return True
+
+    # --- Voice / panning: set targets only ---
+    def proximity(self, distance, closing=0.0):
+        """Drive the proximity voice (call per fused sample; it fades out when updates stop)."""
+        self.voice.set(distance, closing)
+
+    def pan(self, position):
+        """Stereo position of everything played from now on: -1 = left, 0 = centre, +1 = right."""
+        self._pan_target = (min(1.0, max(-1.0, position)) + 1.0) * np.pi / 4
+
+    # --- Writer thread ---
+    def _spatialize(self, mix):
+        """Mono mix → (block, channels) with constant-power gains, θ ramped from the last block."""
+        out = self._out
+        if self.channels == 1:
+            out[:, 0] = mix
+            return out
+        target = self._pan_target
+        theta = self._theta
+        np.multiply(self._ramp, target - self._pan, out=theta)
+        theta += self._pan
+        self._pan = target
+        np.cos(theta, out=self._gain)
+        np.multiply(mix, self._gain, out=out[:, 0])
+        np.sin(theta, out=self._gain)
+        np.multiply(mix, self._gain, out=out[:, 1])
+        return out
+
+    def _next_block(self):
+        mix = self._mix
+        request = None
+        while self._pending:
+            if request is not None:
+                self.dropped += 1
+            request = self._pending.popleft()  # the newest request wins
+        if request is not None:
+            level, t_request = request
+            self._current, self._pos = self.bank[level], 0
+            self._onsets_ms.append((time.perf_counter_ns() - t_request) / 1e6)
+            self.beeps += 1
+
+        n = 0
+        if self._current is not None:
+            n = min(self.block, self._current.size - self._pos)
+            mix[:n] = self._current[self._pos:self._pos + n]
+            self._pos += n
+            if self._pos >= self._current.size:
+                self._current = None
+        mix[n:] = 0
+        self.voice.render(mix)
+
+        out = self._spatialize(mix)
+        if self._speech:
+            np.add(out, self._next_speech()[:, None], out=out)
+        np.clip(out, -1.0, 1.0, out=out)
+        out *= 32767
+        np.copyto(self._buf, out, casting="unsafe")
+        return self._buf
+
+    def _next_speech(self):
+        """Next block of queued speech (clips back to back, zero-padded)."""
+        buf = self._voice_buf
+        n = 0
+        while n < self.block and self._speech:
+            clip = self._speech[0]
+            if clip.pos == 0:
+                clip.t_start = time.time()
+                clip.started.set()
+            k = min(self.block - n, clip.pcm.size - clip.pos)
+            buf[n:n + k] = clip.pcm[clip.pos:clip.pos + k]
+            clip.pos += k
+            n += k
+            if clip.pos >= clip.pcm.size:
+                self._speech.popleft()
+                clip.done.set()
+        buf[n:] = 0
+        return buf
+
+    def _writer(self):
+        period = self.block / self.rate
+        t_next = time.perf_counter()
+        while self._running:
+            try:
+                self.sink.write(self._next_block())
+            except (BrokenPipeError, ValueError) as e:
+                print(f"⚠️ Audio sink closed ({e}); tones are discarded")
+                self.sink = NullSink()
+            if self.sink.paced:
+                continue                       # the blocking write was the clock
+            t_next += period
+            delay = t_next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.25:
+                self.late_blocks += 1
+                t_next = time.perf_counter()   # stalled: resync instead of bursting
+
+    # --- Stats ---
+    def latency(self):
+        """Onset latency of recent beeps (ms, excluding the sink's own buffer)."""
+        onsets = np.array(self._onsets_ms)
+        if not onsets.size:
+            return {"beeps": self.beeps}
+        return {
+            "beeps": self.beeps,
+            "mean_ms": float(onsets.mean()),
+            "p99_ms": float(np.percentile(onsets, 99)),
+            "max_ms": float(onsets.max()),
+            "dropped": self.dropped,
+            "late_blocks": self.late_blocks,
+        }
+
+
+# Process-wide engine
+engine = AudioEngine()
+atexit.register(engine.stop)
+
+
+def start():
+    return engine.start()
+
+
+def beep(level):
+    """Enqueue a proximity tone on the process-wide engine (started on first use)."""
+    if not engine._running:
+        engine.start()
+    return engine.beep(level)
+
+
+def proximity(distance, closing=0.0):
+    """Drive the process-wide proximity voice (started on first use)."""
+    if not engine._running:
+        engine.start()
+    engine.proximity(distance, closing)
+
+
+def pan(position):
+    """Stereo position for the process-wide engine: -1 = left … +1 = right."""
+    engine.pan(position)
+
+
+def say(pcm, gain=SPEECH_GAIN):
+    """Queue speech PCM on the process-wide engine (started on first use); returns the SpeechClip."""
+    if not engine._running:
+        engine.start()
+    return engine.say(pcm, gain)
+
+
+def latency():
+    return engine.latency()
+
+
+# === BENCHMARK ===
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        path = f.name
+    test = AudioEngine(f"wav:{path}").start()
+    levels = list(TONES)
+    calls = []
+    for _ in range(40):
+        time.sleep(random.uniform(0.05, 0.3))
+        t0 = time.perf_counter_ns()
+        test.beep(random.choice(levels))
+        calls.append((time.perf_counter_ns() - t0) / 1e3)
+    time.sleep(0.6)
+    test.stop()
+    stats = test.latency()
+    print(f"beep() call: {np.median(calls):.1f} µs median (enqueue only)")
+    print(f"onset latency: mean {stats['mean_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, "
+          f"max {stats['max_ms']:.1f} ms over {stats['beeps']} beeps "
+          f"(+ {SINK_BUFFER_MS} ms device buffer with aplay / pw-play)")
+    with wave.open(path) as w:
+        print(f"wrote {w.getnframes() / w.getframerate():.2f} s of audio → {path}")
+
+    t0 = time.perf_counter()
+    for _ in range(10):
+        subprocess.run(["true"])
+    print(f"for comparison, spawning a process alone: {(time.perf_counter() - t0) * 100:.1f} ms")
+
+    # --- Proximity voice: walk in from 2.5 m to 0.2 m and back, render offline ---
+    voice = AudioEngine("null")
+    blocks = int(6.0 * SAMPLE_RATE / BLOCK)
+    pcm = np.empty((blocks * BLOCK, CHANNELS), dtype=np.int16)
+    t0 = time.perf_counter()
+    for b in range(blocks):
+        s = b * BLOCK / SAMPLE_RATE
+        voice.proximity(2.5 - 0.8 * s if s < 3 else 0.1 + 0.8 * (s - 3), 0.8 if s < 3 else -0.8)
+        pcm[b * BLOCK:(b + 1) * BLOCK] = voice._next_block()
+    per_block = (time.perf_counter() - t0) / blocks * 1e6
+    step = np.abs(np.diff(pcm.astype(np.int32), axis=0)).max() / 32767
+    print(f"proximity voice: {per_block:.0f} µs per {BLOCK}-sample block "
+          f"({per_block * SAMPLE_RATE / BLOCK / 1e4:.2f} % of one core), "
+          f"largest sample step {step:.3f} of full scale")
+
+    # --- Panning: a beep while the obstacle sweeps left → right at 15 Hz frame rate ---
+    pcm = []
+    voice.beep("close")
+    for b in range(int(0.5 * SAMPLE_RATE / BLOCK)):
+        voice.pan(-1 + 2 * (b * BLOCK / SAMPLE_RATE) / 0.5)
+        pcm.append(voice._next_block().astype(np.float64))
+    thirds = np.array_split(np.concatenate(pcm), 3)
+    mix = np.ones(BLOCK, dtype=np.float32)
+    n = 20000
+    t0 = time.perf_counter()
+    for k in range(n):
+        voice.pan(k % 3 - 1)
+        voice._spatialize(mix)
+    dt = (time.perf_counter() - t0) / n * 1e6
+    print("panning, beep swept left → right: L/R rms per third " + ", ".join(
+        f"{np.sqrt((t[:, 0] ** 2).mean()) / 32767:.2f}/{np.sqrt((t[:, 1] ** 2).mean()) / 32767:.2f}" for t in thirds)
+        + f"; {dt:.1f} µs per block")
@@ -1,15 +1,20 @@
 # audio_feedback.py (PipeWire / PulseAudio safe)
+# Tone table shared with audio_engine.py (pre-rendered, in-process playback);
+# beep() here is the one-shot SoX fallback: a `play` process per beep.
 import subprocess
 import time
 
+# level → (frequency Hz, duration s)
+TONES = {
+    "far":   (440, 0.15),
+    "mid":   (660, 0.15),
+    "near":  (880, 0.10),
+    "close": (1200, 0.5),
+    "mismatch": (300, 0.3),
+}
+
 def beep(level):
-    tones = {
-        "far":   (440, 0.15),
-        "mid":   (660, 0.15),
-        "near":  (880, 0.10),
-        "close": (1200, 0.5),
-        "mismatch": (300, 0.3),
-    }
+    tones = TONES
     if level not in tones:
         return
 
@@ -4,15 +4,18 @@ blip_model.py — loads the BLIP-base captioning model
 
 from transformers import BlipProcessor, BlipForConditionalGeneration
 import torch, time
+import cpu_budget
 
 
 def load_blip(model_id="Salesforce/blip-image-captioning-base"):
     """
-    Loads the BLIP model and processor once.
+    Loads the BLIP model and processor once, on the cores and thread count
+    cpu_budget gives "vision" (call from the thread that will caption).
     Returns: (model, processor)
     """
     print("🚀 Loading BLIP base model...")
     t0 = time.time()
+    budget = cpu_budget.apply("vision", set_threads=torch.set_num_threads)
 
     processor = BlipProcessor.from_pretrained(model_id)
     model = BlipForConditionalGeneration.from_pretrained(
@@ -21,8 +24,7 @@ def load_blip(model_id="Salesforce/blip-image-captioning-base"):
         low_cpu_mem_usage=True
     )
     model.to("cpu")
-    torch.set_num_threads(4)
-    torch.set_num_interop_threads(4)
+    torch.set_num_interop_threads(budget["interop"])
     torch.set_grad_enabled(False)
 
     print(f"✅ Model loaded in {time.time() - t0:.1f}s")
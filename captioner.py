@@ -4,6 +4,19 @@ captioner.py — runs inference on an image using BLIP
 
 from PIL import Image
 import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+import cpu_budget
+
+
+class BudgetSync(LogitsProcessor):
+    """Runs once per generated token: picks up cpu_budget thread changes (e.g. TTS started)."""
+
+    def __call__(self, input_ids, scores):
+        cpu_budget.sync("vision")
+        return scores
+
+
+_BUDGET_SYNC = LogitsProcessorList([BudgetSync()])
 
 
 def generate_caption(model, processor, image_path: str):
@@ -11,11 +24,12 @@ def generate_caption(model, processor, image_path: str):
     Generate a caption for the given image using the loaded BLIP model.
     """
     image = Image.open(image_path).convert("RGB")
+    cpu_budget.sync("vision")
 
     # Prepare inputs and run model
     inputs = processor(image, "a photo of", return_tensors="pt").to("cpu")
     with torch.no_grad():
-        out = model.generate(**inputs, max_new_tokens=100)
+        out = model.generate(**inputs, max_new_tokens=100, logits_processor=_BUDGET_SYNC)
         caption = processor.decode(out[0], skip_special_tokens=True)
 
         # Remove leading dataset phrases for natural speech
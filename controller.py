@@ -3,31 +3,44 @@ controller.py — VisionAssist runtime orchestrator (multi-thread mode + async v
 """
 import threading
 import multiprocessing
-import sys, select, time, subprocess
+import sys, select, time
 from pathlib import Path
 import cv2
 import numpy as np
-from queue import Queue
+from queue import Queue, Empty
+
+import cpu_budget
 
 # === SENSOR MODULES ===
-from audio_feedback import beep
-from sensors.sensor_serial_bridge import run_bridge as sensor_sim_main
+from audio_engine import beep
+import audio_engine
+import tts_engine
+from sensors.sensor_serial_bridge import run_bridge as sensor_sim_main, set_grid
 import event_bus
 from sensors import sensor_processor as sp
+from sensors.sensor_service import SensorService
+from sensors.tof_motion import unpack_mask
 
 EVENT_QUEUE = event_bus.EVENT_QUEUE
 VISION_QUEUE = event_bus.VISION_QUEUE
 
 
 # === VISION MODULES ===
-from vision_caption.blip_model import load_blip
-from vision_caption.captioner import generate_caption
+# imported in vision_task(): the spawned sensor process re-imports this module
+# and must not pull in torch / transformers
 
 LAST_MANUAL_TRIGGER = 0
 VISION_COOLDOWN = 15  # seconds
 
 # === SETTINGS ===
 ENABLE_VISUALIZER = True   # ← set False to disable heatmap window
+SENSOR_PROCESS = True      # bridge + fusion + beeps in their own process (sensor_service.py)
+TTS_STREAMING = True       # speak captions clause by clause, starting after the first clause
+TTS_WAIT_MARGIN_S = 2.0    # beyond the clips' own duration before the TTS worker stops waiting
+
+# Fused sensor state: sp.STATE in-process, the shared-memory ring with SENSOR_PROCESS
+STATE = sp.STATE
+SERVICE = None
 
 
 TTS_QUEUE = Queue()
@@ -46,13 +59,13 @@ def visualizer_task():
     VMAX_M = 4.0
     font = cv2.FONT_HERSHEY_SIMPLEX
 
+    seq = 0
     while True:
-        frame = getattr(sp, "last_tof_frame", None)
-        fused = float(getattr(sp, "last_fused_distance", 0.0))
-        us_cm = float(getattr(sp, "last_ultrasonic_cm", 0.0))
-
-        if frame and len(frame) >= 64:
-            data = np.asarray(frame[:64], dtype=np.float32).reshape(8, 8)
+        # Wake on each published frame (short timeout keeps the ESC check responsive)
+        new_seq = STATE.wait(seq, timeout=0.05)
+        if new_seq != seq:
+            seq = new_seq
+            token, data, fused, us_cm, ttc, sectors, motion = STATE.read()
 
             # mild dynamic contrast enhancement
             norm = np.clip(data / VMAX_M, 0, 1)
@@ -60,30 +73,47 @@ def visualizer_task():
             if dmax - dmin > 0.2:
                 norm = 0.9 * norm + 0.1 * np.clip((data - dmin) / (dmax - dmin), 0, 1)
 
-            up = cv2.resize(norm, (8 * CELL, 8 * CELL), interpolation=cv2.INTER_NEAREST)
+            rows, cols = data.shape
+            width, height = cols * CELL, rows * CELL
+            up = cv2.resize(norm, (width, height), interpolation=cv2.INTER_NEAREST)
             img = cv2.applyColorMap((up * 255).astype(np.uint8), cv2.COLORMAP_INFERNO)
 
-            for y in range(8):
-                for x in range(8):
+            for y in range(rows):
+                for x in range(cols):
                     v = data[y, x]
                     if v > 0:
                         color = (255, 255, 255) if v < 2.0 else (0, 0, 0)
                         cv2.putText(img, f"{v:.2f}", (x * CELL + 6, y * CELL + 24),
                                     font, 0.45, color, 1, cv2.LINE_AA)
 
-            # overlay fused + ultrasonic
-            cv2.rectangle(img, (0, 8 * CELL - 70), (8 * CELL, 8 * CELL), (0, 0, 0), -1)
-            cv2.putText(img, f"Fused: {fused:.2f} m", (10, 8 * CELL - 45),
+            # approaching zones (tof_motion) outlined
+            for y, x in zip(*np.nonzero(unpack_mask(motion, data.shape))):
+                cv2.rectangle(img, (x * CELL + 1, y * CELL + 1), ((x + 1) * CELL - 2, (y + 1) * CELL - 2),
+                              (255, 255, 0), 2)
+
+            # overlay fused + ultrasonic + sectors + time to collision
+            cv2.rectangle(img, (0, height - 120), (width, height), (0, 0, 0), -1)
+            cv2.putText(img, f"Fused: {fused:.2f} m", (10, height - 95),
                         font, 0.6, (0, 255, 255), 2, cv2.LINE_AA)
-            cv2.putText(img, f"Ultrasonic: {us_cm:.1f} cm", (10, 8 * CELL - 20),
+            cv2.putText(img, f"Ultrasonic: {us_cm:.1f} cm", (10, height - 70),
                         font, 0.6, (0, 255, 0), 2, cv2.LINE_AA)
-
-            cv2.imshow(win, img)
+            sector_text = "  ".join(
+                f"{name[0].upper()} {d:.1f}" if np.isfinite(d) else f"{name[0].upper()} --"
+                for name, d in zip(sp.sector_map.names, sectors.tolist()))
+            cv2.putText(img, sector_text, (10, height - 45),
+                        font, 0.5, (255, 200, 0), 1, cv2.LINE_AA)
+            ttc_text = f"TTC: {ttc:.1f} s" if np.isfinite(ttc) else "TTC: --"
+            ttc_color = (0, 0, 255) if ttc <= 2.0 else (200, 200, 200)
+            cv2.putText(img, ttc_text, (10, height - 20),
+                        font, 0.6, ttc_color, 2, cv2.LINE_AA)
+
+            # Only show it if the processor didn't overwrite the buffer while we drew
+            if STATE.still_valid(token):
+                cv2.imshow(win, img)
 
         # graceful exit on ESC
         if cv2.waitKey(1) & 0xFF == 27:
             break
-        time.sleep(0.015)
 
     cv2.destroyWindow(win)
     print("🛑 Visualizer stopped cleanly")
@@ -94,14 +124,21 @@ def visualizer_task():
 # ============================================================
 def keyboard_task():
     global LAST_MANUAL_TRIGGER
-    print("⌨️  Press Enter anytime to capture manually.")
+    print("⌨️  Press Enter anytime to capture manually ('grid 4' / 'grid 8' switches the ToF mode).")
     while True:
         if sys.stdin in select.select([sys.stdin], [], [], 0.1)[0]:
-            _ = sys.stdin.readline().strip()
+            line = sys.stdin.readline().strip().lower()
+            if line.startswith("grid"):
+                try:
+                    (SERVICE.set_grid if SERVICE else set_grid)(int(line.split()[-1]))
+                except (ValueError, RuntimeError) as e:
+                    print(f"⚠️  {e}")
+                continue
             now = time.time()
             if now - LAST_MANUAL_TRIGGER > VISION_COOLDOWN:
                 LAST_MANUAL_TRIGGER = now
-                VISION_QUEUE.put({"type": "vision_request", "source": "manual"})
+                VISION_QUEUE.put({"type": "vision_request", "source": "manual",
+                                  "priority": event_bus.VISION_PRIORITY["manual"]})
                 print(f"[{time.strftime('%H:%M:%S')}] 🎥 Manual vision trigger fired.")
             else:
                 remaining = VISION_COOLDOWN - (now - LAST_MANUAL_TRIGGER)
@@ -113,6 +150,7 @@ def keyboard_task():
 # ============================================================
 def sensor_task():
     print("📡 Sensor task started (using sensor_serial_bridge)")
+    audio_engine.start()         # persistent tone stream, opened before the first zone change
     sensor_sim_main()
 
 
@@ -122,6 +160,13 @@ def sensor_task():
 def tts_worker():
     """Worker thread that plays each queued text sequentially."""
     model_path = "/home/geo/piper_voices/en_US-amy-medium.onnx"
+    cpu_budget.apply("tts")      # the voice's ONNX threads / piper process inherit the TTS cores
+    tts = tts_engine.TtsEngine(model_path)
+    try:
+        tts.load()               # once: no model reload per caption
+    except (RuntimeError, OSError) as e:
+        print(f"[TTS] unavailable: {e}")
+        return
     while True:
         item = TTS_QUEUE.get()
         if item is None:
@@ -138,31 +183,30 @@ def tts_worker():
         if not text:
             continue
 
-        # ⏱️ measure latency right before playback
-        if start_time:
-            latency = time.time() - start_time
-            print(f"⏱️ Latency: {latency:.2f} s from camera trigger to audio start")
-
-        cmd = (
-            f'echo "{text}" | '
-            f'piper --model {model_path} --output_file - | '
-            f'pw-play -'
-        )
         try:
-            subprocess.run(
-                cmd,
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            # vision shrinks its torch threads while piper synthesises (inside speak)
+            # one audio stream: with SENSOR_PROCESS it lives in the sensor process, next to the tones
+            output = SERVICE or audio_engine
+            clips = (tts.speak_stream(text, output=output) if TTS_STREAMING
+                     else [tts.speak(text, output=output)])
         except Exception as e:
             print(f"[TTS] error: {e}")
+            continue
+        if not clips:
+            continue
 
-        time.sleep(0.1)   # brief gap between sentences
-
+        # ⏱️ time to first audio: first sample handed to the audio stream
+        # (bounded waits: with SENSOR_PROCESS the events come from another process)
+        clips[0].started.wait(TTS_WAIT_MARGIN_S)
+        if start_time and clips[0].t_start:
+            latency = clips[0].t_start - start_time
+            synth = time.time() - start_time
+            print(f"⏱️ Latency: {latency:.2f} s from camera trigger to audio start "
+                  f"({len(clips)} clip(s), fully synthesized at {synth:.2f} s)")
+        if not clips[-1].done.wait(sum(clip.duration for clip in clips) + TTS_WAIT_MARGIN_S):
+            print("[TTS] playback didn't finish in time; moving on")
 
-# start once at launch
-threading.Thread(target=tts_worker, daemon=True).start()
+        time.sleep(0.1)   # brief gap between sentences
 
 
 def speak_piper_async(item):
@@ -184,7 +228,8 @@ def audio_task():
 
         if etype == "beep":
             try:
-                beep(event.get("level", "far"))
+                # one audio stream: with SENSOR_PROCESS it lives in the sensor process
+                (SERVICE.beep if SERVICE else beep)(event.get("level", "far"))
             except Exception as e:
                 print(f"[ERROR] Beep failed: {e}", flush=True)
 
@@ -206,14 +251,25 @@ def audio_task():
 # 👁️ VISION PROCESS
 # ============================================================
 def vision_task():
+    from vision_caption.blip_model import load_blip
+    from vision_caption.captioner import generate_caption
+
     print("👁️ Vision process started")
     model, processor = load_blip()
     print("✅ Vision model ready (separate process)")
+    captioning = threading.Event()     # a caption is running
 
     def run_caption(model, processor, img_path, start_time):
         """Generate caption and push to audio queue with latency timing."""
         try:
+            if SERVICE:
+                SERVICE.state.reset_jitter()
             caption = generate_caption(model, processor, str(img_path))
+            if SERVICE:
+                j = SERVICE.state.jitter()
+                if j["frames"]:
+                    print(f"⏱️ Sensor loop during caption: worst gap {j['max_ms']:.0f} ms "
+                          f"(nominal {j['median_ms']:.0f} ms, p99 {j['p99_ms']:.0f} ms)")
             EVENT_QUEUE.put({
                 "type": "tts",
                 "text": caption,
@@ -222,13 +278,19 @@ def vision_task():
             print(f"🖼️ Caption → {caption}")
         except Exception as e:
             print(f"⚠️ Caption error: {e}")
+        finally:
+            captioning.clear()
 
     while True:
-        event = VISION_QUEUE.get()
+        event = next_vision_request()
         print(f"[VISION] got event: {event}")
         if event is None:
             break
         if event.get("type") == "vision_request":
+            if captioning.is_set() and event.get("priority", 0) <= event_bus.VISION_PRIORITY["static"]:
+                print("⏭️ Static scenery, caption already running: skipped")
+                continue
+            captioning.set()
             print("📸 Capturing and captioning...")
             img_path = Path("webcam.jpg")
             start_time = time.time()       # ⏱️ mark trigger time
@@ -240,9 +302,23 @@ def vision_task():
                     daemon=True
                 ).start()
             else:
+                captioning.clear()
                 print("⚠️ Capture failed; no image.")
 
 
+def next_vision_request():
+    """Block for a VISION_QUEUE event, then take the most urgent one queued (the rest are stale)."""
+    event = VISION_QUEUE.get()
+    while event is not None:
+        try:
+            other = VISION_QUEUE.get_nowait()
+        except Empty:
+            break
+        if other is None or other.get("priority", 0) > event.get("priority", 0):
+            event = other
+    return event
+
+
 def capture_image(path="webcam.jpg"):
     cam = cv2.VideoCapture(0)
     ret, frame = cam.read()
@@ -258,16 +334,24 @@ def capture_image(path="webcam.jpg"):
 # 🧭 CONTROLLER MAIN
 # ============================================================
 def main():
+    global STATE, SERVICE
     print("\n🚀 Starting VisionAssist Controller (multi-thread mode)\n")
+    cpu_budget.apply("ui")       # threads/processes started from here inherit it, then narrow
 
     threads = [
-        threading.Thread(target=sensor_task, daemon=True),
         threading.Thread(target=audio_task, daemon=True),
         threading.Thread(target=keyboard_task, daemon=True),
         threading.Thread(target=vision_task, daemon=True),
+        threading.Thread(target=tts_worker, daemon=True),    # started here, not at import (spawned children re-import us)
     ]
+    if SENSOR_PROCESS:
+        SERVICE = SensorService()
+        STATE = SERVICE.start()
+    else:
+        threads.append(threading.Thread(target=sensor_task, daemon=True))
     for t in threads:
         t.start()
+    print(f"🧮 CPU budget: {cpu_budget.scheduler.describe()}")
 
     try:
         if ENABLE_VISUALIZER:
@@ -282,6 +366,8 @@ def main():
         for _ in threads:
             EVENT_QUEUE.put(None)
         EVENT_QUEUE.put(None)
+        if SERVICE:
+            SERVICE.stop()
         print("✅ Shutdown complete.")
 
 
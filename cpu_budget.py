@@ -0,0 +1,149 @@
+"""
+cpu_budget.py — declarative CPU budget for the Pi's cores
+
+Every subsystem gets a set of cores (os.sched_setaffinity) and a worker
+thread count from BUDGET. The safety path keeps a core to itself, and BLIP
+gets whatever is left. While a subsystem listed under "yield" is active
+(e.g. piper synthesising), vision drops to fewer torch threads.
+
+    apply("vision", set_threads=torch.set_num_threads)   # in the vision thread, before loading
+    sync("vision")                                       # vision thread, e.g. every token
+    with active("tts"):                                  # around each synthesis
+        subprocess.run(...)
+    allocation()                                         # current table
+
+Affinity is set on the calling thread. Threads and processes it creates
+afterwards inherit it: torch's OpenMP pool, piper started from the TTS
+worker, the spawned sensor process. Thread counts are only ever applied
+from the owning thread (sync), since OpenMP thread settings are per thread.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+# === BUDGET (4-core Pi) ===
+BUDGET = {
+    # safety path: serial bridge + fusion + beeps (sensor process), never shared
+    "sensors": {"cores": (0,), "threads": 1},
+    # OpenCV visualizer, keyboard, audio queue (controller main process)
+    "ui": {"cores": (1,), "threads": 1},
+    # piper synthesis + playback
+    "tts": {"cores": (1,), "threads": 1},
+    # BLIP: torch intra-op threads; fewer while TTS runs so speech isn't starved
+    "vision": {"cores": (1, 2, 3), "threads": 3, "interop": 1, "yield": {"tts": 2}},
+}
+
+_AVAILABLE = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+
+
+class CpuBudget:
+    """Resolves BUDGET against the cores this machine has and tracks who is active."""
+
+    def __init__(self, budget=BUDGET, available=_AVAILABLE):
+        self.available = list(available)
+        self.spec = {}
+        for name, entry in budget.items():
+            cores = [c for c in entry["cores"] if c in self.available] or self.available
+            self.spec[name] = {
+                "cores": cores,
+                "threads": max(1, min(entry.get("threads", len(cores)), len(cores))),
+                "interop": entry.get("interop", 1),
+                "yield": {other: max(1, min(n, len(cores))) for other, n in entry.get("yield", {}).items()},
+            }
+        self._lock = threading.Lock()
+        self._active = {}           # subsystem → nesting count
+        self._hooks = {}            # subsystem → set_threads callback
+        self._applied = threading.local()    # per thread: subsystem → count last applied
+
+    # --- Allocation ---
+    def threads(self, name):
+        """Thread count subsystem name should use right now."""
+        spec = self.spec[name]
+        n = spec["threads"]
+        with self._lock:
+            for other, limit in spec["yield"].items():
+                if self._active.get(other):
+                    n = min(n, limit)
+        return n
+
+    def allocation(self):
+        """{subsystem: {"cores", "threads", "active"}} as of now."""
+        with self._lock:
+            active = {name for name, count in self._active.items() if count}
+        return {
+            name: {"cores": list(spec["cores"]), "threads": self.threads(name), "active": name in active}
+            for name, spec in self.spec.items()
+        }
+
+    def describe(self):
+        return " | ".join(
+            f"{name}: cores {','.join(map(str, a['cores']))} × {a['threads']}{' *' if a['active'] else ''}"
+            for name, a in self.allocation().items()
+        )
+
+    # --- Applying ---
+    def apply(self, name, set_threads=None):
+        """
+        Pin the calling thread (and everything it starts later) to name's cores
+        and set its thread count through set_threads(n), if given.
+        """
+        spec = self.spec[name]
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, spec["cores"])
+        if set_threads is not None:
+            self._hooks[name] = set_threads
+            self._applied_here().pop(name, None)
+            self.sync(name)
+        return spec
+
+    def sync(self, name):
+        """Re-apply name's thread count if the budget changed since (call from name's own thread)."""
+        hook = self._hooks.get(name)
+        if hook is None:
+            return
+        n = self.threads(name)
+        applied = self._applied_here()
+        if applied.get(name) != n:
+            hook(n)
+            applied[name] = n
+
+    def _applied_here(self):
+        if not hasattr(self._applied, "counts"):
+            self._applied.counts = {}
+        return self._applied.counts
+
+    @contextmanager
+    def active(self, name):
+        """Mark name as busy: subsystems that yield to it shrink at their next sync()."""
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+        try:
+            yield self.spec[name]
+        finally:
+            with self._lock:
+                self._active[name] -= 1
+
+    def child_env(self, name, env=None):
+        """Environment for a child process of name (OpenMP / BLAS thread caps)."""
+        env = dict(os.environ if env is None else env)
+        n = str(self.threads(name))
+        env.update(OMP_NUM_THREADS=n, OPENBLAS_NUM_THREADS=n, MKL_NUM_THREADS=n)
+        return env
+
+
+# Process-wide scheduler
+scheduler = CpuBudget()
+
+apply = scheduler.apply
+sync = scheduler.sync
+active = scheduler.active
+allocation = scheduler.allocation
+child_env = scheduler.child_env
+
+
+if __name__ == "__main__":
+    print(f"Cores available: {scheduler.available}")
+    print(scheduler.describe())
+    with active("tts"):
+        print(scheduler.describe())
@@ -7,3 +7,7 @@ import queue
 EVENT_QUEUE = queue.Queue()
 VISION_QUEUE = queue.Queue()
 
+# vision_request "priority": the controller captions the most urgent pending
+# request and drops static-scenery ones while a caption is already running
+VISION_PRIORITY = {"static": 0, "zone": 1, "approaching": 2, "manual": 3}
+
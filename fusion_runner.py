@@ -3,14 +3,12 @@ fusion_runner.py — bridges serial_listener (TEST mode) with sensor_processor.
 Use this to simulate sensor fusion and audio feedback before real hardware.
 """
 
-from serial_listener import parse_sensor_line
-from sensor_processor import process_entry
-from datetime import datetime
+from sensors.replay import replay
 from pathlib import Path
-import time
 
 # Path to the simulated log file
 LOG_FILE = Path("fake_sensor_log.txt")
+REPLAY_SPEED = 1.0      # × original rate; None = as fast as possible (virtual clock)
 
 def main():
     if not LOG_FILE.exists():
@@ -19,22 +17,13 @@ def main():
 
     print(f"🧪 Running simulation from {LOG_FILE}...\n")
 
-    with open(LOG_FILE, "r", encoding="utf-8-sig", errors="ignore") as f:
-        for raw in f:
-            raw = raw.strip()
-            if not raw or "|" not in raw:
-                continue
+    if REPLAY_SPEED is None:
+        result = replay(LOG_FILE, mode="virtual")
+    else:
+        result = replay(LOG_FILE, mode="speed", speed=REPLAY_SPEED, audio=True)
 
-            entry = parse_sensor_line(raw)
-            if entry:
-                process_entry(entry)
-            else:
-                print(f"[WARN] Skipped malformed line: {raw[:60]}...")
-
-            # Throttle slightly for readability
-            time.sleep(0.1)
-
-    print("\n✅ Simulation complete.")
+    print(f"\n✅ Simulation complete: {result.events} readings, "
+          f"{result.log_seconds:.1f} s of data in {result.wall_seconds:.1f} s.")
 
 
 if __name__ == "__main__":
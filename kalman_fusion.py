@@ -0,0 +1,213 @@
+"""
+kalman_fusion.py
+----------------
+Constant-velocity Kalman filter fusing ToF and ultrasonic distance readings.
+
+State is [distance (m), velocity (m/s)]. Each sensor has its own measurement
+noise model, sigma = base + rel * distance, so the filter trusts whichever
+sensor is better at the current range. A reading whose innovation falls
+outside the gate (Mahalanobis² > GATE) is rejected as an outlier, and the
+ultrasonic timeout value (-1 / 0) counts as a dropout rather than a distance.
+
+If one sensor keeps reporting something *nearer* than the track (a new
+obstacle, or one only that sensor sees), the track re-initialises on it; a
+single sensor that persistently reads farther is ignored. Like min(), the
+estimate errs towards the closer obstacle. Only when every live sensor
+(a valid reading within STALE_S) has read farther for MAX_REJECTS updates
+in a row has the obstacle gone, and the track re-initialises on the far
+reading instead of waiting for its variance to grow wide enough.
+
+Everything is plain float arithmetic on the 2×2 covariance: O(1) per update.
+"""
+
+from collections import namedtuple
+import math
+
+# === NOISE MODELS ===
+# sigma (m) = base + rel * distance
+SENSOR_NOISE = {
+    "tof": (0.02, 0.03),    # VL53L5CX frame mean: ~2 cm + 3 %
+    "us": (0.01, 0.02),     # HC-SR04: ~1 cm + 2 % (multipath shows up as outliers)
+}
+ACCEL_SIGMA = 1.5           # m/s² process noise: walking pace changes / turning
+INITIAL_VEL_SIGMA = 0.5     # m/s, velocity uncertainty of a fresh track (wider lets a
+                            # farther sensor drag a just-reinitialised track away)
+
+# === GATING ===
+GATE = 9.0                  # Mahalanobis² (3 sigma) — larger innovations are outliers
+MAX_REJECTS = 5             # consecutive nearer rejects from one sensor before re-initialising on it
+                            # (farther: from every live sensor)
+STALE_S = 0.5               # a sensor without a valid reading for this long doesn't hold a far reinit back
+MIN_RANGE_M = 0.02
+MAX_RANGE_M = 4.0
+
+Estimate = namedtuple("Estimate", ["distance", "velocity", "sigma", "accepted"])
+
+
+class KalmanFusion:
+    """
+    Usage:
+        kf = KalmanFusion()
+        est = kf.update("tof", 1.23, t)     # t in seconds (any monotonic clock)
+        est = kf.update("us", -1, t)        # ultrasonic timeout → dropout, predict only
+        est.distance, est.velocity, est.sigma
+    """
+
+    def __init__(self, noise=None, accel_sigma=ACCEL_SIGMA, gate=GATE):
+        self.noise = dict(SENSOR_NOISE, **(noise or {}))
+        self.q = accel_sigma ** 2
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.d = self.v = 0.0
+        self.p00 = self.p01 = self.p11 = 0.0
+        self.t = None
+        self.initialized = False
+        self.rejects = {}       # sensor → consecutive gated-out nearer readings
+        self.far_rejects = {}   # sensor → consecutive gated-out farther readings
+        self.seen = {}          # sensor → time of its last valid reading
+        self.stats = {"updates": 0, "outliers": 0, "dropouts": 0, "reinits": 0}
+
+    # --- Model ---
+    def measurement_var(self, sensor, z):
+        base, rel = self.noise[sensor]
+        sigma = base + rel * z
+        return sigma * sigma
+
+    def predict(self, t):
+        """Advance the state to time t (no-op for t at or before the last update)."""
+        if self.t is None or not self.initialized:
+            self.t = t
+            return
+        dt = t - self.t
+        if dt <= 0:
+            return
+        self.t = t
+
+        self.d += self.v * dt
+        # P = F P Fᵀ + Q, F = [[1, dt], [0, 1]], Q = white-acceleration model
+        dt2 = dt * dt
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11)
+        p01 = self.p01 + dt * self.p11
+        self.p00 = p00 + self.q * dt2 * dt2 / 4
+        self.p01 = p01 + self.q * dt2 * dt / 2
+        self.p11 = self.p11 + self.q * dt2
+
+    def _init_track(self, z, r, t):
+        self.d, self.v = z, 0.0
+        self.p00, self.p01, self.p11 = r, 0.0, INITIAL_VEL_SIGMA ** 2
+        self.t = t
+        self.initialized = True
+        self.rejects.clear()
+        self.far_rejects.clear()
+
+    # --- Update ---
+    def update(self, sensor, z, t):
+        """Fuse one reading (metres) from `sensor` ("tof" | "us") taken at time t (s)."""
+        if z is None or not MIN_RANGE_M <= z <= MAX_RANGE_M or z != z:
+            self.stats["dropouts"] += 1
+            self.predict(t)
+            return self.estimate(False)
+
+        r = self.measurement_var(sensor, z)
+        self.seen[sensor] = t
+        if not self.initialized:
+            self._init_track(z, r, t)
+            self.stats["updates"] += 1
+            return self.estimate(True)
+
+        self.predict(t)
+        y = z - self.d
+        s = self.p00 + r
+        if y * y > self.gate * s:
+            self.stats["outliers"] += 1
+            if y > 0:
+                self.far_rejects[sensor] = self.far_rejects.get(sensor, 0) + 1
+                live = [name for name, seen in self.seen.items() if t - seen <= STALE_S]
+                if any(self.far_rejects.get(name, 0) < MAX_REJECTS for name in live):
+                    return self.estimate(False)
+                # Every sensor agrees it's farther: the obstacle cleared
+                self.stats["reinits"] += 1
+                self._init_track(z, r, t)
+                return self.estimate(True)
+            self.rejects[sensor] = self.rejects.get(sensor, 0) + 1
+            if self.rejects[sensor] < MAX_REJECTS:
+                return self.estimate(False)
+            # Persistently nearer: a new obstacle, not noise
+            self.stats["reinits"] += 1
+            self._init_track(z, r, t)
+            return self.estimate(True)
+
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        self.d += k0 * y
+        self.v += k1 * y
+        # P = (I - K H) P, H = [1, 0]
+        p00, p01 = self.p00, self.p01
+        self.p00 = p00 - k0 * p00
+        self.p01 = p01 - k0 * p01
+        self.p11 = self.p11 - k1 * p01
+
+        self.rejects[sensor] = 0
+        self.far_rejects[sensor] = 0
+        self.stats["updates"] += 1
+        return self.estimate(True)
+
+    def estimate(self, accepted=True):
+        return Estimate(self.d, self.v, math.sqrt(max(self.p00, 0.0)), accepted)
+
+
+# === SELF TEST ===
+if __name__ == "__main__":
+    import random
+
+    random.seed(1)
+    kf = KalmanFusion()
+    t, d_true = 0.0, 3.0
+    err_min = err_kf = 0.0
+    n = 0
+    for step in range(400):
+        t += 0.05
+        d_true = max(0.3, d_true - 0.03)     # walking towards a wall at 0.6 m/s
+
+        tof = d_true + random.gauss(0, 0.02 + 0.03 * d_true)
+        us = d_true + random.gauss(0, 0.01 + 0.02 * d_true)
+        if random.random() < 0.1:
+            us = -0.01                       # timeout (-1 cm)
+        elif random.random() < 0.05:
+            us = d_true + 1.5                # multipath echo
+
+        kf.update("tof", tof, t)
+        est = kf.update("us", us, t)
+        fused_min = min(tof, us) if us > 0 else tof
+        err_min += (fused_min - d_true) ** 2
+        err_kf += (est.distance - d_true) ** 2
+        n += 1
+
+    print(f"RMS error  min(): {math.sqrt(err_min / n) * 100:.1f} cm   "
+          f"kalman: {math.sqrt(err_kf / n) * 100:.1f} cm")
+    print(f"Final: d={est.distance:.2f} m  v={est.velocity:+.2f} m/s  ±{est.sigma * 100:.1f} cm")
+    print(kf.stats)
+
+    # Obstacle clears: 0.5 m → 3.0 m with both sensors agreeing (15 Hz)
+    kf = KalmanFusion()
+    t = 0.0
+    for step in range(60):
+        t += 1 / 15
+        d_true = 0.5 if step < 30 else 3.0
+        kf.update("tof", d_true + random.gauss(0, 0.01), t)
+        est = kf.update("us", d_true + random.gauss(0, 0.01), t)
+        if step >= 30 and est.distance > 2.5:
+            break
+    lag = step - 30 + 1
+    assert lag <= MAX_REJECTS, lag
+    print(f"Obstacle cleared: track at {est.distance:.2f} m after {lag} updates ({lag / 15 * 1000:.0f} ms)")
+
+    # Only the ultrasonic reads farther (e.g. a thin pole the ToF sees): the track stays near
+    for step in range(30):
+        t += 1 / 15
+        kf.update("tof", 0.5 + random.gauss(0, 0.01), t)
+        est = kf.update("us", 3.0, t)
+    assert est.distance < 0.6, est
+    print(f"One sensor farther: track held at {est.distance:.2f} m")
@@ -0,0 +1,188 @@
+"""
+replay.py
+---------
+Replays a recorded sensor session through sensor_processor.process_entry.
+
+Sources: TOF/US text logs (*.txt, parsed with serial_listener.parse_sensor_log)
+or binary sessions (*.vas, see session_format.py).
+
+Modes:
+    original   real time, at the rate the data was recorded
+    speed      N× faster (or slower) than real time
+    virtual    as fast as possible on a virtual clock
+
+In every mode the processor's clock (cooldowns in fuse_and_check) follows the
+replay timeline, so hours of captured data replay in seconds with the same
+alert decisions as live.
+"""
+
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from sensors import sensor_processor as sp
+from sensors.serial_listener import parse_sensor_log, SensorLog
+from sensors.session_format import SessionReader
+from sensors.sensor_frame import SensorFrame, MM
+
+MODES = ("original", "speed", "virtual")
+
+ReplayResult = namedtuple("ReplayResult", ["events", "log_seconds", "wall_seconds", "zones"])
+
+
+class ReplayClock:
+    """Replay-time clock in epoch seconds; installed as sensor_processor.clock."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# === EVENT STREAMS ===
+def _spread_seconds(ts_ns):
+    """
+    Text logs only have 1 s resolution. Spread each run of identical stamps
+    evenly across its second so original-timing replay isn't bursty.
+    """
+    if ts_ns.size == 0:
+        return ts_ns
+    starts = np.r_[0, np.flatnonzero(np.diff(ts_ns)) + 1]
+    counts = np.diff(np.r_[starts, ts_ns.size])
+    run = np.repeat(np.arange(starts.size), counts)
+    rank = np.arange(ts_ns.size) - starts[run]
+    return ts_ns + (rank * 1_000_000_000) // counts[run]
+
+
+def log_events(log: SensorLog):
+    """
+    Yield (ts_ns, entry) from a parsed text log in original line order. A US
+    line inherits the (spread) stamp of the ToF line it was logged with.
+    """
+    tof_ts = _spread_seconds(log.tof_ts)
+
+    seq = np.concatenate([log.tof_seq, log.us_seq])
+    kind = np.concatenate([np.zeros(len(log.tof_seq), dtype=np.int8), np.ones(len(log.us_seq), dtype=np.int8)])
+    row = np.concatenate([np.arange(len(log.tof_seq)), np.arange(len(log.us_seq))])
+    order = np.argsort(seq, kind="stable")
+    kind, row = kind[order], row[order]
+
+    is_tof = kind == 0
+    stamps = np.empty(kind.size, dtype=np.int64)
+    stamps[is_tof] = tof_ts[row[is_tof]]
+    us_pos = np.flatnonzero(~is_tof)
+    us_rows = row[us_pos]
+    stamps[us_pos] = log.us_ts[us_rows]
+
+    # A US line logged after a ToF line with the same raw stamp shares its spread stamp
+    last_tof_pos = np.maximum.accumulate(np.where(is_tof, np.arange(kind.size), -1))[us_pos]
+    known = last_tof_pos >= 0
+    tof_rows = row[last_tof_pos[known]]
+    same = log.tof_ts[tof_rows] == log.us_ts[us_rows[known]]
+    stamps[us_pos[known][same]] = tof_ts[tof_rows[same]]
+
+    for k, r, ts_ns in zip(kind.tolist(), row.tolist(), stamps.tolist()):
+        stamp = datetime.fromtimestamp(ts_ns / 1e9)
+        if k:
+            yield ts_ns, {"type": "US", "timestamp": stamp, "values": [float(log.us[r])]}
+        else:
+            yield ts_ns, {"type": "TOF", "timestamp": stamp, "values": log.tof[r]}
+
+
+def session_events(reader: SessionReader):
+    """
+    Yield (ts_ns, SensorFrame) per record of a binary session. The frames are
+    one reused object viewing the memory-mapped uint16 ToF data (no copies).
+    """
+    offset = reader.clock_offset_ns
+    frame = SensorFrame()
+    for ts, tof, us in reader.iter_chunks():
+        tof_mm = tof.reshape(len(ts), -1)
+        us_cm = us.tolist()
+        for i, ts_mono in enumerate(ts.tolist()):
+            yield ts_mono + offset, frame.set(ts_mono, tof_mm[i], us_cm[i], MM)
+
+
+def open_events(source):
+    """Event stream for a path (*.txt / *.vas), SensorLog or SessionReader."""
+    if isinstance(source, SensorLog):
+        return log_events(source)
+    if isinstance(source, SessionReader):
+        return session_events(source)
+    path = Path(source)
+    if path.suffix == ".vas":
+        return session_events(SessionReader(path))
+    return log_events(parse_sensor_log(path))
+
+
+# === ENGINE ===
+def replay(source, mode="original", speed=1.0, sink=None, audio=False):
+    """
+    Drive sink (default sensor_processor.process_entry) from a recording.
+
+    mode:  "original" | "speed" (uses `speed` multiplier) | "virtual"
+    audio: keep proximity beeps enabled during the replay
+    Returns ReplayResult(events, log_seconds, wall_seconds, zones) where zones
+    lists every (ts_ns, zone) transition the processor made.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if mode == "original":
+        speed = 1.0
+    elif mode == "speed" and not speed > 0:
+        raise ValueError("speed must be > 0")
+    sink = sink or sp.process_entry
+
+    clock = ReplayClock()
+    saved = sp.clock, sp.AUDIO_ENABLED
+    sp.clock, sp.AUDIO_ENABLED = clock, audio
+
+    zones = []
+    events = 0
+    first_ns = last_ns = None
+    wall_start = time.perf_counter()
+    try:
+        for ts_ns, entry in open_events(source):
+            if first_ns is None:
+                first_ns = ts_ns
+            last_ns = ts_ns
+
+            if mode != "virtual":
+                delay = wall_start + (ts_ns - first_ns) / 1e9 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            clock.now = ts_ns / 1e9
+            zone = sp.last_zone
+            sink(entry)
+            if sp.last_zone != zone:
+                zones.append((ts_ns, sp.last_zone))
+            events += 1
+        if sink is sp.process_entry:
+            sp.flush_pending()
+    finally:
+        sp.clock, sp.AUDIO_ENABLED = saved
+
+    log_seconds = (last_ns - first_ns) / 1e9 if events else 0.0
+    return ReplayResult(events, log_seconds, time.perf_counter() - wall_start, zones)
+
+
+# === CLI ===
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: replay.py LOG.txt|SESSION.vas [original|virtual|<speed multiplier>]")
+        sys.exit(1)
+
+    arg = sys.argv[2] if len(sys.argv) > 2 else "original"
+    if arg in MODES:
+        result = replay(sys.argv[1], mode=arg)
+    else:
+        result = replay(sys.argv[1], mode="speed", speed=float(arg))
+
+    print(f"\n✅ Replayed {result.events} events ({result.log_seconds:.1f} s of data) "
+          f"in {result.wall_seconds:.2f} s — {len(result.zones)} zone changes")
@@ -0,0 +1,101 @@
+"""
+sensor_frame.py
+---------------
+Compact record for one synchronized ToF + ultrasonic reading.
+
+The serial bridge used to build two dicts per frame, each with a datetime and
+a 64-element Python list that the processor turned straight back into an
+array. A SensorFrame instead holds a monotonic ns timestamp, the decoded
+ToF row (uint16 mm: a view, or one 128-byte copy for queued frames) and the
+ultrasonic float in a small __slots__ object.
+
+The dict form ({"type", "timestamp", "values"}) stays available through
+from_entries()/entries() for sensor_simulator, serial_listener and other
+text-based producers.
+"""
+
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+
+# monotonic → wall clock, for printing frame times
+MONO_TO_WALL_NS = time.time_ns() - time.monotonic_ns()
+
+MM = 0.001      # scale for uint16 millimetre frames (firmware / decoder)
+METRES = 1.0    # scale for float frames already in metres (simulator, text logs)
+
+
+class SensorFrame:
+    """
+    ts_ns:  capture time, time.monotonic_ns() timebase
+    tof:    flat (H*W,) array view — uint16 mm straight from the decoder, or float metres
+            (64 zones for 8×8, 16 for the 4×4 high-rate mode; see grid)
+    us_cm:  ultrasonic distance in cm (firmware sends -1 on timeout), None if absent
+    scale:  multiply tof by this to get metres (MM or METRES)
+    device: id of the node that sent it (sensor_hub), None for single-port setups
+
+    A frame may be a view into a decoder buffer: consume it before the next read,
+    or copy() it to keep it.
+    """
+
+    __slots__ = ("ts_ns", "tof", "us_cm", "scale", "device")
+
+    def __init__(self, ts_ns=0, tof=None, us_cm=None, scale=MM, device=None):
+        self.ts_ns = ts_ns
+        self.tof = tof
+        self.us_cm = us_cm
+        self.scale = scale
+        self.device = device
+
+    def set(self, ts_ns, tof, us_cm, scale=MM, device=None):
+        """Refill in place (replay reuses one frame object per record)."""
+        self.ts_ns = ts_ns
+        self.tof = tof
+        self.us_cm = us_cm
+        self.scale = scale
+        self.device = device
+        return self
+
+    def copy(self):
+        return SensorFrame(self.ts_ns, np.array(self.tof), self.us_cm, self.scale, self.device)
+
+    @property
+    def grid(self):
+        """(rows, cols) of the ToF zones: N×N from the zone count (2-D tof keeps its own shape)."""
+        if self.tof.ndim == 2:
+            return self.tof.shape
+        side = math.isqrt(self.tof.size)
+        return side, side
+
+    @property
+    def tof_m(self):
+        """ToF in metres as a new float32 (rows, cols) array (convenience, allocates)."""
+        return (self.tof * np.float32(self.scale)).astype(np.float32).reshape(self.grid)
+
+    @property
+    def timestamp(self):
+        """Wall-clock datetime of the capture."""
+        return datetime.fromtimestamp((self.ts_ns + MONO_TO_WALL_NS) / 1e9)
+
+    # --- Dict adapter ---
+    @classmethod
+    def from_entries(cls, tof_entry, us_entry=None, ts_ns=None):
+        """Build a frame from serial_listener-style TOF (+ US) dict entries (values in m / cm)."""
+        if ts_ns is None:
+            stamp = tof_entry.get("timestamp")
+            ts_ns = (int(stamp.timestamp() * 1e9) - MONO_TO_WALL_NS) if stamp else time.monotonic_ns()
+        us_cm = us_entry["values"][0] if us_entry and us_entry["values"] else None
+        return cls(ts_ns, np.asarray(tof_entry["values"], dtype=np.float32), us_cm, METRES)
+
+    def entries(self):
+        """The frame as (TOF entry, US entry or None) dicts, as serial_listener produces them."""
+        stamp = self.timestamp
+        tof = {"type": "TOF", "timestamp": stamp, "values": (self.tof * self.scale).tolist()}
+        us = None if self.us_cm is None else {"type": "US", "timestamp": stamp, "values": [self.us_cm]}
+        return tof, us
+
+    def __repr__(self):
+        device = f"device={self.device!r}, " if self.device is not None else ""
+        return f"SensorFrame({device}ts_ns={self.ts_ns}, us_cm={self.us_cm}, tof={self.tof.dtype}{self.tof.shape})"
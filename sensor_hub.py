@@ -0,0 +1,229 @@
+"""
+sensor_hub.py
+-------------
+Multiplexes several ESP32 sensor nodes (front, front-low, left, right, ...)
+in one asyncio event loop instead of one blocking thread per port.
+
+Every port gets its own FrameDecoder and AsyncFrameReader (async_serial.py);
+all of them feed one shared FrameChannel. Each SensorFrame is tagged with its
+device id and stamped with time.monotonic_ns() when its burst arrived, so
+frames from different nodes share one timebase and can be correlated.
+
+A port that fails or disappears is retried on its own every RECONNECT_DELAY
+seconds; the other nodes keep streaming. An exception raised by the sink for
+one frame is logged and counted (stats["sink_errors"]); the loop goes on.
+
+set_grid() sends the VL53L5CX grid command (frame_decoder.grid_command) to
+one node or all of them, from any thread; the choice is re-sent after every
+reconnect so a rebooted node comes back in the same mode.
+
+    hub = SensorHub({"front": "/dev/ttyUSB0", "left": "/dev/ttyUSB1"})
+    asyncio.run(hub.run(sink))      # sink(frame) for every frame, frame.device set
+
+Run this file for a demo with pseudo-terminals standing in for the devices:
+python -m sensors.sensor_hub
+"""
+
+import asyncio
+import time
+
+import serial
+
+from sensors.async_serial import AsyncFrameReader, FrameChannel, consume
+from sensors.frame_decoder import grid_command
+
+# === CONFIG ===
+DEVICES = {
+    "front": "/dev/ttyUSB0",
+    # "front_low": "/dev/ttyUSB1",
+    # "left": "/dev/ttyUSB2",
+    # "right": "/dev/ttyUSB3",
+}
+BAUD = 115200
+RECONNECT_DELAY = 3.0
+MAX_RATE_HZ = 20              # per device, decimated before conversion
+OVERFLOW_POLICY = "drop-oldest"
+CHANNEL_SIZE = 16             # shared by all devices
+TOF_GRID = None               # 4 / 8 → send the grid command on connect, None = firmware default
+
+
+class SensorHub:
+    """N serial ports → one channel of device-tagged SensorFrames."""
+
+    def __init__(self, devices=None, baud=BAUD, max_rate_hz=MAX_RATE_HZ,
+                 policy=OVERFLOW_POLICY, channel_size=CHANNEL_SIZE,
+                 reconnect_delay=RECONNECT_DELAY, opener=None, grid=TOF_GRID):
+        self.devices = dict(DEVICES if devices is None else devices)
+        self.baud = baud
+        self.max_rate_hz = max_rate_hz
+        self.policy = policy
+        self.channel_size = channel_size
+        self.reconnect_delay = reconnect_delay
+        self.opener = opener or (lambda port, baud: serial.Serial(port, baud, timeout=0))
+        self.on_burst = None        # optional callback(device, burst), e.g. recording
+        self.channel = None
+        self.readers = {}
+        self.latest = {}            # device → newest SensorFrame delivered
+        self.grid = {name: grid for name in self.devices}    # requested grid side per device
+        self.stats = {name: {"connected": False, "connects": 0, "errors": 0, "frames": 0,
+                             "sink_errors": 0}
+                      for name in self.devices}
+        self._tasks = []
+        self._loop = None
+
+    async def run(self, sink):
+        """Read all ports and call sink(frame) for every frame until cancelled."""
+        self.start()
+        try:
+            await consume(self.channel, lambda frame: self._deliver(frame, sink))
+        finally:
+            await self.stop()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.channel = FrameChannel(self.channel_size, self.policy)
+        self._tasks = [asyncio.ensure_future(self._port_task(name, port))
+                       for name, port in self.devices.items()]
+        return self.channel
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.channel.close()
+
+    # --- Commands to the nodes ---
+    def set_grid(self, side, device=None):
+        """Switch one node (or all) to a side×side ToF grid. Safe to call from any thread."""
+        command = grid_command(side)
+        names = [device] if device is not None else list(self.devices)
+        for name in names:
+            self.grid[name] = side
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._send_all, names, command)
+
+    def _send_all(self, names, command):
+        for name in names:
+            reader = self.readers.get(name)
+            if reader is not None:
+                self._send(name, reader.stream, command)
+
+    def _send(self, name, ser, command):
+        try:
+            ser.write(command)
+            print(f"📤 [{name}] {command.decode('ascii').strip()}")
+        except Exception as e:       # port going away: the reconnect re-sends it
+            print(f"⚠️  [{name}] command failed: {e}")
+
+    def _deliver(self, frame, sink):
+        stats = self.stats[frame.device]
+        self.latest[frame.device] = frame
+        stats["frames"] += 1
+        try:
+            sink(frame)
+        except Exception as e:       # one bad frame must not end the loop for every port
+            stats["sink_errors"] += 1
+            print(f"💥 [{frame.device}] frame handling failed: {e!r}")
+
+    # --- One reconnect loop per port ---
+    async def _port_task(self, name, port):
+        stats = self.stats[name]
+        while True:
+            ser = None
+            try:
+                ser = self.opener(port, self.baud)
+                stats["connected"] = True
+                stats["connects"] += 1
+                print(f"✅ [{name}] connected on {port}")
+
+                reader = AsyncFrameReader(ser, self.channel, max_rate_hz=self.max_rate_hz,
+                                          device=name, owns_channel=False)
+                bad_seen = lost_seen = 0
+
+                def on_burst(burst, reader=reader):
+                    nonlocal bad_seen, lost_seen
+                    if self.on_burst:
+                        self.on_burst(name, burst)
+                    decoder = reader.decoder
+                    if decoder.bad_checksum != bad_seen:
+                        print(f"⚠️  [{name}] Bad checksum, skipped {decoder.bad_checksum - bad_seen} frame(s).")
+                        bad_seen = decoder.bad_checksum
+                    if decoder.frames_lost != lost_seen:     # v2 sequence gap
+                        print(f"⚠️  [{name}] Lost {decoder.frames_lost - lost_seen} frame(s) "
+                              f"({decoder.loss_rate:.1%} overall).")
+                        lost_seen = decoder.frames_lost
+
+                reader.on_burst = on_burst
+                self.readers[name] = reader
+                if self.grid.get(name):
+                    self._send(name, ser, grid_command(self.grid[name]))
+                try:
+                    await reader.start()
+                    raise EOFError("serial stream closed")
+                finally:
+                    reader.stop()
+                    self.readers.pop(name, None)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"💥 [{name}] {port}: {e}")
+            finally:
+                stats["connected"] = False
+                if ser is not None:
+                    ser.close()
+
+            print(f"🔁 [{name}] Reconnecting in {self.reconnect_delay}s…")
+            await asyncio.sleep(self.reconnect_delay)
+
+
+# === PTY DEMO ===
+if __name__ == "__main__":
+    import os
+    import threading
+
+    import numpy as np
+
+    from sensors.frame_decoder import encode_frame
+
+    SECONDS = 3.0
+    nodes = {"front": 60, "left": 30, "right": 15}     # device → wire Hz
+
+    ptys = {}
+    for name in nodes:
+        master, slave = os.openpty()
+        ptys[name] = (master, os.ttyname(slave))
+
+    def writer(name, hz, fd, stop_after=None):
+        frame = encode_frame(np.full(64, 1000 + 100 * len(name), dtype=np.uint16), 80.0)
+        t_end = time.perf_counter() + (stop_after or SECONDS)
+        while time.perf_counter() < t_end:
+            os.write(fd, frame)
+            time.sleep(1 / hz)
+        if stop_after:
+            os.close(fd)     # "unplug" this node
+
+    async def demo():
+        hub = SensorHub({name: tty for name, (_, tty) in ptys.items()}, reconnect_delay=0.5)
+        first = {}
+
+        def sink(frame):
+            first.setdefault(frame.device, frame.ts_ns)
+
+        for name, hz in nodes.items():
+            stop_after = 1.0 if name == "right" else None
+            threading.Thread(target=writer, args=(name, hz, ptys[name][0], stop_after), daemon=True).start()
+
+        task = asyncio.ensure_future(hub.run(sink))
+        await asyncio.sleep(SECONDS)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        t0 = min(first.values())
+        for name, st in hub.stats.items():
+            print(f"{name:>6}: {st['frames']:3d} frames, first at +{(first.get(name, t0) - t0) / 1e6:5.1f} ms, "
+                  f"connects={st['connects']} errors={st['errors']}")
+
+    asyncio.run(demo())
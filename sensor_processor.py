@@ -5,40 +5,48 @@ Consumes parsed sensor data from serial_listener and performs:
 - smoothing
 - sensor fusion (ToF + Ultrasonic)
 - mismatch detection
-- obstacle detection
+- obstacle detection (distance + time-to-collision zones, per-sector alerts)
+- motion segmentation (static / approaching / receding zones)
 - audio signaling
 """
 
-from collections import deque
+from collections import deque, namedtuple
 from datetime import datetime
-import statistics
-import audio_feedback
+import bisect
+import math
+import audio_engine
 import time
 import event_bus
 
 import numpy as np
-import threading
-import cv2
+
+from sensors.sensor_state import SensorSnapshot
+from sensors.tof_filters import build_pipeline
+from sensors.kalman_fusion import KalmanFusion
+from sensors.sensor_sync import SensorSync
+from sensors.sensor_frame import SensorFrame
+from sensors.ttc_estimator import TtcEstimator
+from sensors.tof_sectors import SECTORS, SectorMap
+from sensors.tof_motion import MotionSegmenter, NO_MOTION
+from sensors.frame_decoder import GRID_SIDES
 
 EVENT_QUEUE = event_bus.EVENT_QUEUE
 VISION_QUEUE = event_bus.VISION_QUEUE
+VISION_PRIORITY = event_bus.VISION_PRIORITY
 
 # === SMOOTHING CONFIG ===
 decay_rate = 0.7
-prev_frame = np.zeros((8, 8), dtype=np.float32)
-
-def median3x3(img):
-    """Retained for optional fallback."""
-    s = [
-        img,
-        np.roll(img, 1, 0), np.roll(img, -1, 0),
-        np.roll(img, 1, 1), np.roll(img, -1, 1),
-        np.roll(np.roll(img, 1, 0), 1, 1),
-        np.roll(np.roll(img, 1, 0), -1, 1),
-        np.roll(np.roll(img, -1, 0), 1, 1),
-        np.roll(np.roll(img, -1, 0), -1, 1)
-    ]
-    return np.median(np.stack(s, axis=0), axis=0)
+MAX_RANGE = 4.0
+
+# Per-deployment filter chain (see tof_filters.py), e.g. add ("median", {}) or
+# ("tmedian", {"k": 5}) for noisy mounts. process_frames() mirrors this default.
+FILTER_CHAIN = [
+    ("ema", {"decay": decay_rate}),
+    ("gaussian", {"ksize": 3}),
+    ("clip", {"lo": 0.0, "hi": MAX_RANGE}),
+]
+GRID_SHAPE = (8, 8)           # ToF frame shape; configure_grid() for stitched panoramas
+tof_filter = build_pipeline(FILTER_CHAIN, GRID_SHAPE)
 
 
 # === CONFIGURATION ===
@@ -46,7 +54,17 @@ TOF_BUFFER_LEN = 5
 US_BUFFER_LEN = 5
 
 last_vision_trigger = 0
-VISION_COOLDOWN = 10  # seconds
+last_vision_source = "static"
+VISION_COOLDOWN = 10  # seconds; a more urgent request (VISION_PRIORITY) skips it
+
+# Time source for cooldowns; replay.py swaps in the replay clock
+clock = time.time
+AUDIO_ENABLED = True
+# "beeps": a tone per zone change | "voice": continuous parking-sensor pulse train
+# following the fused distance and closing speed (audio_engine.py) | "both"
+AUDIO_MODE = "beeps"
+# Stereo-pan all alerts towards the nearest obstacles (tof_sectors column minima)
+AUDIO_SPATIAL = False
 
 tof_buffer = deque(maxlen=TOF_BUFFER_LEN)
 us_buffer = deque(maxlen=US_BUFFER_LEN)
@@ -55,95 +73,473 @@ last_tof = None
 last_us = None
 last_zone = None
 
-
-# Shared for visualizer
-last_tof_frame = [0.0] * 64
-last_fused_distance = 0.0
-last_ultrasonic_cm = 0.0
+# === FUSION MODE ===
+# "min":    min(ToF mean, rolling US mean) — original behaviour
+# "kalman": constant-velocity Kalman filter on the raw readings (kalman_fusion.py),
+#           per-sensor noise, outlier gating, US timeouts treated as dropouts
+FUSION_MODE = "min"
+kalman = KalmanFusion()
+last_estimate = None    # kalman_fusion.Estimate (distance, velocity, sigma) in kalman mode
+
+# === STREAM SYNC ===
+# Separate TOF / US entries are paired by timestamp (sensor_sync.py) and fused
+# once per ToF frame. US older than US_MAX_AGE is stale → ToF-only fusion.
+SYNC_MODE = "interp"    # "interp" | "hold"
+US_MAX_AGE = 0.5        # seconds
+sync = SensorSync(SYNC_MODE, US_MAX_AGE)
+
+# === ZONES ===
+# fused distance (m) <= edge → zone on the left of it; above the last edge → "none"
+ZONE_EDGES = (0.35, 1.0, 1.5, 2.0)
+ZONE_NAMES = ("close", "near", "mid", "far", "none")
+
+# === TIME TO COLLISION ===
+# Zones also escalate on TTC (ttc_estimator.py): something closing fast enough
+# to be reached within TTC_EDGES[i] seconds counts as ZONE_NAMES[i] while it's
+# still further away. The escalation has to hold for TTC_CONFIRM consecutive
+# fused samples, so a single bad fit can't beep.
+TTC_ENABLED = True
+TTC_EDGES = (1.0, 2.0, 3.0)   # s → close, near, mid
+TTC_CONFIRM = 2
+ttc_estimator = TtcEstimator()
+last_ttc = ttc_estimator.last   # ttc_estimator.TtcEstimate (ttc, speed, distance, samples)
+_ttc_streak = 0
+
+# === SECTORS ===
+# Robust per-sector distances (tof_sectors.py: a low percentile per region of
+# interest) so an obstacle in one corner isn't averaged away. Sectors more
+# urgent than the overall zone get their own alert (SECTOR_ALERTS: which ones,
+# the lower band usually sees the floor). FUSION_ROI names the sector whose
+# distance feeds fusion; None keeps the whole-frame mean.
+SECTOR_PERCENTILE = 10
+SECTOR_ALERTS = ("left", "center", "right", "upper")
+FUSION_ROI = None
+
+# === MOTION ===
+# Per-zone temporal differencing (tof_motion.py) labels zones static /
+# approaching / receding. A confirmed approaching object is logged and, within
+# VISION_MOTION_RANGE, asks vision to look (as long as it keeps coming and is
+# in range, rate-limited); a close zone with nothing moving
+# (a wall) only sends a low-priority "static" request (none if VISION_STATIC
+# is False), so BLIP isn't spent on scenery.
+MOTION_ENABLED = True
+VISION_MOTION_RANGE = 2.0     # m
+VISION_STATIC = True
+
+
+# Shared with visualizer / TUI / controller: read STATE, don't poll module globals
+STATE = SensorSnapshot(GRID_SHAPE)
+
+# Preallocated per-frame work buffers
+_frame = np.zeros(GRID_SHAPE, dtype=np.float32)
+_frame_flat = _frame.reshape(-1)
+_scratch = np.zeros(GRID_SHAPE, dtype=np.float32)
+display_frame = np.zeros(GRID_SHAPE, dtype=np.float32)
+_GRID_ZONES = {side * side for side in GRID_SIDES}
+sector_map = SectorMap(GRID_SHAPE, SECTORS, SECTOR_PERCENTILE)
+sector_zones = [len(ZONE_NAMES) - 1] * len(sector_map.names)
+motion = MotionSegmenter(GRID_SHAPE)
+last_motion = NO_MOTION   # tof_motion.Motion (approaching, receding, nearest, speed, confirmed, event)
+
+
+def configure_grid(h, w):
+    """
+    Switch the processor to (h, w) ToF frames, e.g. a tof_stitch panorama.
+    Reallocates the work buffers and the filter chain (its history restarts)
+    and resizes STATE; call it before the first frame of the new shape.
+    """
+    global GRID_SHAPE, tof_filter, _frame, _frame_flat, _scratch, display_frame, sector_map, motion
+    GRID_SHAPE = (int(h), int(w))
+    tof_filter = build_pipeline(FILTER_CHAIN, GRID_SHAPE)
+    _frame = np.zeros(GRID_SHAPE, dtype=np.float32)
+    _frame_flat = _frame.reshape(-1)
+    _scratch = np.zeros(GRID_SHAPE, dtype=np.float32)
+    display_frame = np.zeros(GRID_SHAPE, dtype=np.float32)
+    sector_map = SectorMap(GRID_SHAPE, SECTORS, SECTOR_PERCENTILE)
+    motion = MotionSegmenter(GRID_SHAPE)
+    STATE.resize(GRID_SHAPE)
+
+
+def _accept_grid(n):
+    """
+    True if a ToF frame of n zones can be processed: it matches GRID_SHAPE,
+    or it is an N×N sensor mode (4×4 / 8×8) and the processor switches to it.
+    """
+    if n == _frame.size:
+        return True
+    side = math.isqrt(n)
+    if side * side != n or side not in GRID_SIDES:
+        return False
+    configure_grid(side, side)
+    print(f"🔳 ToF grid → {side}×{side}")
+    return True
 
 
 # === MAIN PROCESS ===
 def process_entry(entry):
-    """Handle a parsed sensor entry dict from serial_listener."""
-    global last_tof, last_us, prev_frame, last_tof_frame
+    """
+    Handle a parsed sensor entry dict from serial_listener (or a SensorFrame).
+    TOF and US entries are paired by sensor_sync; each completed pair goes
+    through process_pair.
+    """
+    if isinstance(entry, SensorFrame):
+        process_frame(entry)
+        return
 
     stype = entry["type"]
     vals = entry["values"]
-    ts = entry["timestamp"]
+    now = clock()
 
-    if stype == "TOF" and len(vals) == 64:
-        frame = np.array(vals, dtype=np.float32).reshape((8, 8))
+    if stype == "TOF" and (len(vals) == _frame.size or len(vals) in _GRID_ZONES):
+        pairs = sync.push_tof(now, entry)
+    elif stype == "US" and vals:
+        pairs = sync.push_us(now, vals[0])
+    else:
+        return
 
-        # ✅ Temporal smoothing (cheap)
-        prev_frame[:] = decay_rate * prev_frame + (1 - decay_rate) * frame
+    for pair in pairs:
+        process_pair(pair.tof["timestamp"], pair.tof["values"], pair.us, pair.t)
 
-        # ✅ Fast spatial smoothing (OpenCV Gaussian)
-        smoothed = cv2.GaussianBlur(prev_frame, (3, 3), 0)
 
-        # ✅ Normalization (unchanged)
-        MAX_RANGE = 4.0
-        smoothed = np.clip(smoothed, 0.0, MAX_RANGE)
+def flush_pending():
+    """Fuse the ToF frames still waiting for their ultrasonic reading (end of a replay)."""
+    for pair in sync.flush():
+        process_pair(pair.tof["timestamp"], pair.tof["values"], pair.us, pair.t)
 
-        arr_min = np.nanmin(smoothed)
-        arr_max = np.nanmax(smoothed)
-        range_span = arr_max - arr_min if arr_max > arr_min else 1.0
 
-        scaled = 0.9 * (smoothed / MAX_RANGE) + 0.1 * ((smoothed - arr_min) / range_span)
-        scaled = np.clip(scaled, 0.0, 1.0)
+def process_frame(frame):
+    """Hot path for the serial bridge / .vas replay: one SensorFrame, no per-frame dicts or lists."""
+    process_pair(None, frame.tof, frame.us_cm, scale=frame.scale)
 
-        last_tof_frame = (scaled * MAX_RANGE).flatten().tolist()
-        last_tof = float(np.mean(frame))  # ✅ update numeric avg for fusion
 
-    elif stype == "US" and vals:
-        dist = vals[0]
-        us_buffer.append(dist)
-        last_us = statistics.mean(us_buffer)
+def process_pair(ts, tof_values, us_cm, t=None, scale=1.0):
+    """
+    One ToF frame (GRID_SHAPE values × scale = m) with its ultrasonic reading (cm,
+    None if stale/missing): smoothing, exactly one fusion, one STATE publish.
+    ts is only used to label log lines (None → the processor clock).
+    """
+    global last_tof, last_us, last_motion
 
-    # ✅ Only fuse if both sensors available
-    if last_tof is not None and last_us is not None:
-        fuse_and_check(ts, last_tof, last_us)
+    t = clock() if t is None else t
+    fresh_motion = False
 
+    if _accept_grid(np.size(tof_values)):
+        np.multiply(np.reshape(tof_values, -1), np.float32(scale), out=_frame_flat, casting="unsafe")
 
-# === SENSOR FUSION + ALERT LOGIC ===
-def fuse_and_check(ts, tof_m, us_cm):
-    """Fuse ToF and Ultrasonic readings, check mismatch and proximity zones."""
-    global last_zone, last_fused_distance, last_ultrasonic_cm, last_vision_trigger
+        # ✅ Temporal + spatial smoothing (configured FILTER_CHAIN, preallocated)
+        smoothed = tof_filter(_frame)
 
-    # Prevent NoneType comparison crash
-    if tof_m is None or us_cm is None:
-        return
+        # ✅ Normalization (unchanged)
+        arr_min = float(np.nanmin(smoothed))
+        arr_max = float(np.nanmax(smoothed))
+        range_span = arr_max - arr_min if arr_max > arr_min else 1.0
+
+        # scaled = 0.9 * (s / MAX_RANGE) + 0.1 * ((s - min) / span), clipped to [0, 1], back in metres
+        np.multiply(smoothed, 0.9 / MAX_RANGE, out=display_frame)
+        np.subtract(smoothed, arr_min, out=_scratch)
+        np.multiply(_scratch, 0.1 / range_span, out=_scratch)
+        np.add(display_frame, _scratch, out=display_frame)
+        np.clip(display_frame, 0.0, 1.0, out=display_frame)
+        np.multiply(display_frame, MAX_RANGE, out=display_frame)
+
+        # ✅ Per-sector distances (one vectorized pass) + the fusion input
+        sectors = sector_map.update(_frame)
+        if FUSION_ROI is None:
+            last_tof = float(_frame.mean())
+        else:
+            last_tof = min(float(sectors[sector_map.slot[FUSION_ROI]]), MAX_RANGE)   # inf = nothing seen
+        if AUDIO_ENABLED and AUDIO_SPATIAL:
+            audio_engine.pan(sector_map.pan())          # target only; the writer ramps to it
+
+        # ✅ Per-zone motion labels (raw frame: the EMA would smear the differencing)
+        if MOTION_ENABLED:
+            last_motion = motion.update(_frame, t)
+            fresh_motion = True
+
+    if us_cm is not None:
+        us_buffer.append(us_cm)
+        last_us = sum(us_buffer) / len(us_buffer)  # plain float mean; statistics.mean is ~10× slower
+
+    fused, shown_us = STATE.latest()
+
+    if FUSION_MODE == "kalman":
+        # Raw readings straight into the filter: no 5-sample buffer latency
+        us_m = None if us_cm is None else us_cm / 100.0
+        fused = kalman_update(ts, t, last_tof, us_m, fused)
+        if us_cm is not None:
+            shown_us = us_cm
+
+    elif last_tof is not None:
+        fused = fuse_and_check(ts, last_tof, None if us_cm is None else last_us, t)
+        if us_cm is not None:
+            shown_us = last_us
+
+    if SECTOR_ALERTS and fused is not None:
+        check_sectors(ts, sector_map.out)
+    if AUDIO_ENABLED and AUDIO_MODE != "beeps" and fused is not None:
+        audio_engine.proximity(fused, last_ttc.speed)    # closing speed from the TTC fit
+    if fresh_motion and last_motion.confirmed:
+        check_motion(ts, last_motion)
+
+    # One consistent frame + fused + US + TTC + sectors + motion mask per pair, no per-frame allocation
+    STATE.publish(display_frame, fused, shown_us, last_ttc.ttc, sector_map.out,
+                  motion.mask_bits if MOTION_ENABLED else None)
 
-    us_m = us_cm / 100.0
-    fused_distance = min(tof_m, us_m)
-    last_fused_distance = fused_distance
-    last_ultrasonic_cm = us_cm
-
-    # --- Zone determination ---
-    if fused_distance > 2.0:
-        zone = "none"
-    elif fused_distance > 1.5:
-        zone = "far"
-    elif fused_distance > 1.0:
-        zone = "mid"
-    elif fused_distance > 0.35:
-        zone = "near"
-    else:
-        zone = "close"
+
+# === SENSOR FUSION + ALERT LOGIC ===
+def fuse_and_check(ts, tof_m, us_cm, t=None):
+    """
+    Fuse ToF and Ultrasonic readings, check mismatch and proximity zones.
+    us_cm=None (no fresh ultrasonic reading) fuses on ToF alone; t is the
+    sample time for the TTC estimate (None → the processor clock).
+    """
+    # Prevent NoneType comparison crash
+    if tof_m is None:
+        return None
+
+    fused_distance = tof_m if us_cm is None else min(tof_m, us_cm / 100.0)
+    check_zone(ts, fused_distance, t)
+    return fused_distance
+
+
+def kalman_update(ts, t, tof_m, us_m, fused=None):
+    """
+    Feed one synchronized pair of raw readings (m, either may be None) taken
+    at time t to the Kalman filter and run the zone logic once on the
+    estimate. Returns the fused distance (`fused` until a track exists).
+    """
+    global last_estimate
+    if tof_m is not None:
+        last_estimate = kalman.update("tof", tof_m, t)
+    if us_m is not None:
+        last_estimate = kalman.update("us", us_m, t)
+    if not kalman.initialized:
+        return fused
+    check_zone(ts, last_estimate.distance, t)
+    return last_estimate.distance
+
+
+def _escalate(zone_idx, ttc, streak):
+    """
+    Distance zone index → the more urgent of it and the TTC zone, once the TTC
+    zone has been more urgent for TTC_CONFIRM samples. Returns (zone_idx, streak).
+    """
+    ttc_idx = bisect.bisect_left(TTC_EDGES, ttc)      # inf → len(TTC_EDGES): no escalation
+    if ttc_idx >= min(zone_idx, len(TTC_EDGES)):
+        return zone_idx, 0
+    streak += 1
+    return (ttc_idx if streak >= TTC_CONFIRM else zone_idx), streak
+
+
+def check_zone(ts, fused_distance, t=None):
+    """Zone change → beep, log and (when close) a rate-limited vision trigger."""
+    global last_zone, last_ttc, _ttc_streak
+
+    # --- Zone determination: distance, escalated by a confirmed TTC ---
+    zone_idx = bisect.bisect_left(ZONE_EDGES, fused_distance)
+    if TTC_ENABLED:
+        last_ttc = ttc_estimator.update(clock() if t is None else t, fused_distance)
+        zone_idx, _ttc_streak = _escalate(zone_idx, last_ttc.ttc, _ttc_streak)
+    zone = ZONE_NAMES[zone_idx]
 
     # --- Only trigger when zone changes ---
     if zone != last_zone:
         last_zone = zone
-        if zone != "none":
-            threading.Thread(target=audio_feedback.beep, args=(zone,), daemon=True).start()
-        print(f"[{ts.strftime('%H:%M:%S')}] Zone={zone.upper()} | Fused={fused_distance:.2f} m")
-
-        # 🧠 Vision trigger if very close
-        now = time.time()
-        if zone == "close" and now - last_vision_trigger > VISION_COOLDOWN:
-            last_vision_trigger = now
-            VISION_QUEUE.put({"type": "vision_request"})
-            print(f"[{ts.strftime('%H:%M:%S')}] 🎥 Vision trigger fired (cooldown ok)")
-
+        ts = ts or datetime.fromtimestamp(clock())
+        if zone != "none" and AUDIO_ENABLED and AUDIO_MODE != "voice":
+            audio_engine.beep(zone)       # enqueue only: pre-rendered tone, persistent stream
+        ttc_note = f" | TTC={last_ttc.ttc:.1f} s" if math.isfinite(last_ttc.ttc) else ""
+        print(f"[{ts.strftime('%H:%M:%S')}] Zone={zone.upper()} | Fused={fused_distance:.2f} m{ttc_note}")
+
+        # 🧠 Vision trigger if very close: moving things outrank static scenery
+        if zone == "close":
+            if not MOTION_ENABLED:
+                request_vision(ts, "zone")
+            elif last_motion.confirmed:
+                request_vision(ts, "approaching")
+            elif VISION_STATIC:
+                request_vision(ts, "static")
+
+
+def check_motion(ts, m):
+    """Confirmed approaching object: log the event once, request vision while it's within VISION_MOTION_RANGE."""
+    ts = ts or datetime.fromtimestamp(clock())
+    if m.event:
+        print(f"[{ts.strftime('%H:%M:%S')}] 🚶 Approaching object: {m.approaching} zones, "
+              f"nearest {m.nearest:.2f} m, {m.speed:.1f} m/s")
+    if m.nearest <= VISION_MOTION_RANGE:
+        request_vision(ts, "approaching")
+
+
+def request_vision(ts, source):
+    """Rate-limited vision request; one more urgent than the last (VISION_PRIORITY) skips the cooldown."""
+    global last_vision_trigger, last_vision_source
+    now = clock()
+    priority = VISION_PRIORITY[source]
+    if now - last_vision_trigger <= VISION_COOLDOWN and priority <= VISION_PRIORITY[last_vision_source]:
+        return False
+    last_vision_trigger, last_vision_source = now, source
+    VISION_QUEUE.put({"type": "vision_request", "source": source, "priority": priority})
+    print(f"[{ts.strftime('%H:%M:%S')}] 🎥 Vision trigger fired ({source})")
+    return True
+
+
+
+def check_sectors(ts, distances):
+    """
+    Per-sector zones: a sector entering a zone more urgent than the overall one
+    (e.g. a corner obstacle the frame mean doesn't see) logs its direction and
+    beeps once per frame.
+    """
+    overall = ZONE_NAMES.index(last_zone) if last_zone else len(ZONE_NAMES) - 1
+    alerts = []
+    for i, (name, distance) in enumerate(zip(sector_map.names, distances.tolist())):
+        zone_idx = bisect.bisect_left(ZONE_EDGES, distance)
+        if zone_idx == sector_zones[i]:
+            continue
+        sector_zones[i] = zone_idx
+        if name in SECTOR_ALERTS and zone_idx < overall:
+            alerts.append((zone_idx, name, distance))
+
+    if alerts:
+        ts = ts or datetime.fromtimestamp(clock())
+        zone_idx = min(alerts)[0]
+        if AUDIO_ENABLED and AUDIO_MODE != "voice":
+            audio_engine.beep(ZONE_NAMES[zone_idx])
+        where = ", ".join(f"{name} {distance:.2f} m" for _, name, distance in alerts)
+        print(f"[{ts.strftime('%H:%M:%S')}] 🧭 Sector {ZONE_NAMES[zone_idx].upper()}: {where}")
+
+
+# === BATCH PROCESSING ===
+FrameBatch = namedtuple("FrameBatch", [
+    "smoothed",     # (N, H, W) float32 — EMA + Gaussian + clip (the default FILTER_CHAIN)
+    "tof_mean",     # (N,) float — per-frame ToF mean (m) used for fusion
+    "us_mean",      # (N,) float — rolling ultrasonic mean (cm)
+    "fused",        # (N,) float — fused distance (m), one per frame
+    "zones",        # list of (frame_index, zone, fused) transitions
+    "ttc",          # (N,) float — time to collision (s), inf without t / when not approaching
+    "sectors",      # (N, n_sectors) float32 — per-sector distances (m), sector_map.names order
+])
+
+EMA_BLOCK = 32
+
+
+def _ema_scan(x, decay, init):
+    """
+    y[k] = decay * y[k-1] + (1 - decay) * x[k] along axis 0, in blocks: each
+    block is one (L × L) lower-triangular matmul instead of L Python steps.
+    """
+    n = x.shape[0]
+    flat = x.reshape(n, -1).astype(np.float64)
+    out = np.empty_like(flat)
+    L = EMA_BLOCK
+    j = np.arange(L)
+    lags = j[:, None] - j[None, :]
+    weights = np.where(lags >= 0, (1 - decay) * decay ** np.maximum(lags, 0), 0.0)
+    carry_w = decay ** (j + 1)
+
+    y = np.asarray(init, dtype=np.float64).reshape(-1)
+    for s in range(0, n, L):
+        blk = flat[s:s + L]
+        m = blk.shape[0]
+        out[s:s + m] = weights[:m, :m] @ blk + carry_w[:m, None] * y
+        y = out[s + m - 1]
+    return out.reshape(x.shape)
+
+
+def _gaussian3x3(frames):
+    """cv2.GaussianBlur(frame, (3, 3), 0) for a whole (N, H, W) stack (BORDER_REFLECT_101)."""
+    p = np.pad(frames, ((0, 0), (1, 1), (1, 1)), mode="reflect")
+    rows = 0.25 * p[:, :-2, :] + 0.5 * p[:, 1:-1, :] + 0.25 * p[:, 2:, :]
+    return 0.25 * rows[:, :, :-2] + 0.5 * rows[:, :, 1:-1] + 0.25 * rows[:, :, 2:]
+
+
+def _rolling_mean(values, window):
+    """
+    Mean over the last `window` values (fewer at the start), adding left to
+    right exactly like sum(us_buffer) / len(us_buffer) in process_pair.
+    """
+    n = values.size
+    padded = np.concatenate([np.zeros(window - 1), values.astype(np.float64)])
+    acc = padded[0:n].copy()
+    for k in range(1, window):
+        acc += padded[k:k + n]
+    return acc / np.minimum(np.arange(1, n + 1), window)
+
+
+def zone_index(fused):
+    """Vectorized zone lookup: index into ZONE_NAMES for each fused distance."""
+    return np.digitize(fused, ZONE_EDGES, right=True)
+
+
+def process_frames(tof, us, t=None):
+    """
+    Batch counterpart of calling process_pair once per frame.
+
+    tof: (N, *GRID_SHAPE) or (N, H*W) ToF frames in metres, us: (N,) ultrasonic in cm,
+    t: optional (N,) sample times in seconds for the TTC escalation.
+    Runs from a fresh state and has no side effects (no beeps, prints or
+    vision triggers), so it's safe for offline analysis and parameter sweeps.
+    The zone transitions match the streaming path exactly (without t: with
+    TTC_ENABLED = False).
+    """
+    tof = np.asarray(tof, dtype=np.float32).reshape((len(tof),) + GRID_SHAPE)
+    us = np.asarray(us, dtype=np.float64).reshape(-1)
+    n = len(tof)
+    if us.size != n:
+        raise ValueError(f"need one ultrasonic reading per frame ({n}), got {us.size}")
+
+    # Smoothing (display path)
+    ema = _ema_scan(tof, decay_rate, np.zeros(GRID_SHAPE)).astype(np.float32)
+    smoothed = np.clip(_gaussian3x3(ema), 0.0, MAX_RANGE).astype(np.float32)
+
+    # Fusion inputs
+    sectors = sector_map.batch(tof)
+    if FUSION_ROI is None:
+        tof_mean = tof.reshape(n, -1).mean(axis=1).astype(np.float64)
+    else:
+        tof_mean = np.minimum(sectors[:, sector_map.slot[FUSION_ROI]], MAX_RANGE).astype(np.float64)
+    us_mean = _rolling_mean(us, US_BUFFER_LEN)
+
+    # One fusion per synchronized pair
+    fused = np.minimum(tof_mean, us_mean / 100.0)
+
+    zone_idx = zone_index(fused)
+    ttc = np.full(n, np.inf)
+    if TTC_ENABLED and t is not None:
+        # Sequential by nature (ring buffer + confirmation streak): one estimator pass
+        estimator, streak = TtcEstimator(), 0
+        for k, (tk, dk) in enumerate(zip(np.asarray(t, dtype=np.float64).tolist(), fused.tolist())):
+            ttc[k] = estimator.update(tk, dk).ttc
+            zone_idx[k], streak = _escalate(int(zone_idx[k]), ttc[k], streak)
+    changed = np.flatnonzero(np.diff(zone_idx, prepend=-1))
+    zones = [(k, ZONE_NAMES[zone_idx[k]], float(fused[k])) for k in changed.tolist()]
+
+    return FrameBatch(smoothed, tof_mean, us_mean, fused, zones, ttc, sectors)
+
+
+def reset_state():
+    """Forget all smoothing/fusion history (used between replays and regression runs)."""
+    global last_tof, last_us, last_zone, last_vision_trigger, last_vision_source, last_estimate, last_ttc, _ttc_streak
+    global last_motion
+    tof_filter.reset()
+    kalman.reset()
+    sync.reset()
+    ttc_estimator.reset()
+    sector_map.out.fill(np.inf)
+    sector_zones[:] = [len(ZONE_NAMES) - 1] * len(sector_map.names)
+    motion.reset()
+    last_motion = NO_MOTION
+    last_estimate = None
+    last_ttc = ttc_estimator.last
+    _ttc_streak = 0
+    display_frame[:] = 0.0
+    tof_buffer.clear()
+    us_buffer.clear()
+    last_tof = last_us = last_zone = None
+    last_vision_trigger = 0
+    last_vision_source = "static"
+    STATE.publish(display_frame, 0.0, 0.0)
 
 
 # === TEST HARNESS ===
@@ -154,3 +550,4 @@ if __name__ == "__main__":
                  "values": [65.0]}
     process_entry(sample_tof)
     process_entry(sample_us)
+    process_pair(datetime.now(), [0.4] * 64, 38.0)
@@ -1,89 +1,107 @@
-import serial
-import numpy as np
 import time
-from datetime import datetime
+import atexit
+import asyncio
 from sensors import sensor_processor as sp  # ✅ unified import (critical)
+from sensors.sensor_hub import SensorHub
+from sensors.tof_stitch import TofStitcher
+from sensors.session_format import SessionWriter
 from event_bus import EVENT_QUEUE
 
 PORT = "/dev/ttyUSB0"
 BAUD = 115200
-GRID_W = GRID_H = 8
-FRAME_SIZE = 2 + GRID_W * GRID_H * 2 + 4 + 1
-HEADER = b"\xAA\x55"
 RECONNECT_DELAY = 3.0
+RECORD_PATH = None   # e.g. "session.vas" to record every raw frame (see session_format.py)
+
+# Extra nodes (device id → port) read by the same loop; see sensor_hub.py.
+# Only PRIMARY_DEVICE drives the processor; the others are kept in hub.latest.
+PRIMARY_DEVICE = "front"
+EXTRA_DEVICES = {}   # e.g. {"left": "/dev/ttyUSB1", "right": "/dev/ttyUSB2"}
+
+# Stitch the ToF sensors into one wide panorama (see tof_stitch.py): device → yaw in
+# degrees, positive to the right. Every PRIMARY_DEVICE frame then drives the processor
+# with the panorama built from each sensor's latest frame. Empty = PRIMARY_DEVICE alone.
+STITCH_MOUNTS = {}   # e.g. {"left": -40, "front": 0, "right": 40}
+
+# Output rate to the processor. Extra wire frames are dropped right after the
+# checksum pass (newest wins), before any conversion or smoothing.
+MAX_RATE_HZ = 20
+# The channel is shared by all devices: "latest" would let one node's frames evict another's
+OVERFLOW_POLICY = "drop-oldest"   # "drop-oldest" | "latest" | "block" (see async_serial.py)
+CHANNEL_SIZE = 4                  # per device
+
+# VL53L5CX resolution sent to every node on connect: 8 (8×8, ≤15 Hz) or 4 (4×4, ≤60 Hz;
+# raise MAX_RATE_HZ to use it). None keeps the firmware default. set_grid() switches at runtime.
+TOF_GRID = None
+
+hub = None
+stitcher = None
 
 def run_bridge():
     """Continuously read binary sensor frames and feed VisionAssist processor."""
-    ser = None
+    asyncio.run(bridge_main())
+
+
+async def bridge_main():
+    """Event-driven bridge: wakes on serial data, reconnects each port on errors."""
+    global hub, stitcher
     last_fps_print = time.time()
     frames = 0
 
-    while True:
-        try:
-            if ser is None or not ser.is_open:
-                print(f"🔌 Connecting to {PORT} @ {BAUD}...")
-                ser = serial.Serial(PORT, BAUD, timeout=0.1)
-                print("✅ Serial connection established.")
-
-            buf = bytearray()
-            while True:
-                chunk = ser.read(256)
-                if not chunk:
-                    time.sleep(0.01)  # or 0.02 to yield CPU
-                    continue
-                buf.extend(chunk)
-
-                while len(buf) >= FRAME_SIZE:
-                    idx = buf.find(HEADER)
-                    if idx == -1:
-                        buf.clear()
-                        break
-                    if len(buf) - idx < FRAME_SIZE:
-                        break
-
-                    frame = buf[idx:idx + FRAME_SIZE]
-                    del buf[:idx + FRAME_SIZE]
-
-                    payload, checksum = frame[2:-1], frame[-1]
-                    if (sum(frame[:-1]) & 0xFF) != checksum:
-                        print("⚠️  Bad checksum, skipping frame.")
-                        continue
-
-                    # --- Parse ToF + Ultrasonic ---
-                    tof = np.frombuffer(payload[:GRID_W * GRID_H * 2],
-                                        dtype=np.uint16).astype(np.float32)
-                    tof /= 1000.0  # mm → m
-
-                    ultrasonic = np.frombuffer(
-                        payload[GRID_W * GRID_H * 2 : GRID_W * GRID_H * 2 + 4],
-                        dtype=np.float32
-                    )[0]
-
-                    # ✅ Add frame limiter here
-                    now = time.time()
-                    if 'last_frame_time' not in locals():
-                        last_frame_time = now
-                    if now - last_frame_time < 0.05:   # 20 Hz cap
-                        continue
-                    last_frame_time = now
-
-                    ts = datetime.now()
-                    sp.process_entry({"type": "TOF", "timestamp": ts, "values": tof.tolist()})
-                    sp.process_entry({"type": "US", "timestamp": ts, "values": [ultrasonic]})
-
-
-                    #print(f"[BRIDGE] Sent frame → ToF avg={np.mean(tof):.2f}m | US={ultrasonic:.1f}cm")
-
-
-                    frames += 1
-                    if time.time() - last_fps_print >= 1.0:
-                        #print(f"📡 FPS: {frames}")
-                        frames, last_fps_print = 0, time.time()
-
-        except Exception as e:
-            print(f"💥 Serial bridge error: {e}")
-            if ser:
-                ser.close()
-            ser = None
-            print(f"🔁 Reconnecting in {RECONNECT_DELAY}s…")
-            time.sleep(RECONNECT_DELAY)
+    devices = {PRIMARY_DEVICE: PORT, **EXTRA_DEVICES}
+    hub = SensorHub(devices, BAUD, max_rate_hz=MAX_RATE_HZ, policy=OVERFLOW_POLICY,
+                    channel_size=CHANNEL_SIZE * len(devices), reconnect_delay=RECONNECT_DELAY,
+                    grid=TOF_GRID)
+
+    if RECORD_PATH:
+        recorder = SessionWriter(RECORD_PATH, clock_offset_ns=time.time_ns() - time.monotonic_ns())
+        atexit.register(recorder.close)
+        print(f"💾 Recording raw frames → {RECORD_PATH}")
+
+        def record(device, burst):
+            # A .vas file has one grid: frames of another mode aren't recorded
+            if device == PRIMARY_DEVICE and burst["tof"].shape[1] == recorder.grid[0] * recorder.grid[1]:
+                recorder.append_frames(time.monotonic_ns(), burst)
+
+        hub.on_burst = record
+
+    if STITCH_MOUNTS:
+        stitcher = TofStitcher(STITCH_MOUNTS)
+        sp.configure_grid(*stitcher.shape)
+        print(f"🧩 Stitching {stitcher.describe()}")
+
+    def feed(frame):
+        global stitcher
+        nonlocal frames, last_fps_print
+        if stitcher is not None and frame.device in stitcher.slot:
+            if frame.grid != stitcher.grid:
+                if frame.device != PRIMARY_DEVICE:
+                    return      # node still on the old grid: wait for it to switch
+                stitcher = TofStitcher(STITCH_MOUNTS, grid=frame.grid)
+                sp.configure_grid(*stitcher.shape)
+                print(f"🧩 Stitching {stitcher.describe()}")
+            stitcher.update(frame.device, frame.tof, frame.scale, frame.ts_ns)
+        if frame.device != PRIMARY_DEVICE:
+            return
+
+        # One synchronized ToF + US pair per frame, one fusion
+        if stitcher is not None:
+            sp.process_pair(None, stitcher.stitch(frame.ts_ns), frame.us_cm)
+        else:
+            sp.process_frame(frame)
+
+        #print(f"[BRIDGE] Sent frame → ToF avg={frame.tof.mean() / 1000:.2f}m | US={frame.us_cm:.1f}cm")
+
+        frames += 1
+        if time.time() - last_fps_print >= 1.0:
+            #print(f"📡 FPS: {frames}")
+            frames, last_fps_print = 0, time.time()
+
+    print(f"🔌 Connecting to {', '.join(f'{name}={port}' for name, port in devices.items())} @ {BAUD}...")
+    await hub.run(feed)
+
+
+def set_grid(side, device=None):
+    """Switch the ToF sensor(s) to side×side zones (4 or 8) while the bridge runs; any thread."""
+    if hub is None:
+        raise RuntimeError("bridge not running")
+    hub.set_grid(side, device)
@@ -0,0 +1,563 @@
+"""
+sensor_service.py
+-----------------
+Runs the sensor safety path (serial bridge + sensor_processor: fusion, zone
+beeps, vision triggers) in its own process, so BLIP captioning in the main
+process can't stall it by holding the GIL or the CPU.
+
+The sensor process publishes every fused frame into a shared-memory ring
+(SharedSensorState). It has the same reader API as sensor_state.SensorSnapshot
+(read / latest / still_valid / copy_into / wait / shape), so the visualizers
+just read service.state instead of sensor_processor.STATE:
+
+    shared memory:  header | slot 0 | slot 1 | ... | slot N-1
+    slot:           version (seqlock, odd while written) | seq | ts | h, w | fused | us | ttc | sectors | motion | frame
+
+The writer fills slot seq % N and then bumps header.seq; readers take the
+newest slot and retry if its version changed underneath them. Vision requests
+come back over a multiprocessing queue and are forwarded to
+event_bus.VISION_QUEUE; commands (grid switch, beep, stop) go the other way.
+A sensor process that exits without stop() is reported and restarted after
+RESTART_DELAY, so the safety path doesn't stay down silently.
+
+The sensor process owns the only audio_engine stream (one persistent
+player, as exclusive ALSA devices require): the main process plays through
+service.beep() and service.say() instead of opening its own. Speech PCM
+goes over the command queue; a RemoteClip mirrors the engine's SpeechClip
+(started / t_start / done), updated from a status queue as it plays.
+
+The writer also keeps a histogram of the gaps between its publishes in the
+header. reset_jitter() / jitter() read it around any stretch of time, e.g. a
+caption, to report the sensor loop's worst-case jitter.
+
+Run this file for a jitter benchmark, sensor loop as a thread vs. as a process,
+under a captioning-like load: python -m sensors.sensor_service
+"""
+
+import math
+import os
+import threading
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import audio_engine
+import cpu_budget
+import event_bus
+from sensors.sensor_state import MAX_SECTORS
+
+# === CONFIG ===
+RING_SLOTS = 32
+MAX_CELLS = 1024          # largest frame: 8×8, 4×4 or a stitched panorama up to 8×128
+POLL_INTERVAL = 0.002     # s — wait() poll period (no cross-process condition variable)
+GAP_BINS = 2000           # publish-gap histogram: 1 ms bins, last bin = ≥ 2 s
+SOURCES = ("bridge", "synthetic")
+SYNTHETIC_HZ = 20
+RESTART_DELAY = 1.0       # s — before restarting a sensor process that exited on its own
+
+HEADER_DTYPE = np.dtype([
+    ("seq", "<u8"),               # publishes so far; the newest is in slot (seq - 1) % slots
+    ("slots", "<u4"),
+    ("max_cells", "<u4"),
+    ("h", "<u4"),                 # current grid (resize)
+    ("w", "<u4"),
+    ("writer_pid", "<i8"),
+    ("probe_epoch", "<u4"),       # bumped by reset_jitter(), seen by the writer
+    ("gap_count", "<u8"),
+    ("gap_sum_ns", "<u8"),
+    ("gap_max_ns", "<u8"),
+    ("last_ns", "<i8"),
+    ("gap_hist", "<u4", (GAP_BINS,)),
+], align=True)
+
+
+def slot_dtype(max_cells=MAX_CELLS):
+    return np.dtype([
+        ("version", "<u8"),
+        ("seq", "<u8"),
+        ("ts_ns", "<i8"),         # time.monotonic_ns() of the publish
+        ("h", "<u2"),
+        ("w", "<u2"),
+        ("fused", "<f8"),         # NaN = None
+        ("us_cm", "<f8"),
+        ("ttc", "<f8"),           # s, inf = not approaching
+        ("n_sectors", "<u2"),
+        ("sectors", "<f4", (MAX_SECTORS,)),
+        ("motion", "u1", ((max_cells + 7) // 8,)),   # packed approaching mask (tof_motion)
+        ("frame", "<f4", (max_cells,)),
+    ], align=True)
+
+
+class SharedSensorState:
+    """
+    Ring of fused sensor states in multiprocessing.shared_memory.
+    One writer (create(), in the sensor process) and any number of readers
+    (attach(name)); both ends have the reader API.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        buf = shm.buf
+        self._hdr = np.ndarray((), dtype=HEADER_DTYPE, buffer=buf)
+        n, cells = int(self._hdr["slots"]), int(self._hdr["max_cells"])
+        self._slots = np.ndarray((n,), dtype=slot_dtype(cells), buffer=buf, offset=HEADER_DTYPE.itemsize)
+        self._version = self._slots["version"]
+        self._frames = self._slots["frame"]
+        self._seq = self._hdr["seq"]              # field views for latest(): no per-call indexing
+        self._fused = self._slots["fused"]
+        self._us_cm = self._slots["us_cm"]
+        self._epoch = None
+
+    @classmethod
+    def create(cls, slots=RING_SLOTS, max_cells=MAX_CELLS, shape=(8, 8)):
+        size = HEADER_DTYPE.itemsize + slots * slot_dtype(max_cells).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        hdr = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        hdr[...] = 0
+        hdr["slots"], hdr["max_cells"] = slots, max_cells
+        hdr["h"], hdr["w"] = shape
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # Spawned children share the creator's resource tracker, so attaching
+        # doesn't hand the segment's cleanup to the child
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def close(self):
+        self._hdr = self._slots = self._version = self._frames = None
+        self._seq = self._fused = self._us_cm = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # --- Writer (single producer) ---
+    def resize(self, shape):
+        h, w = shape
+        if h * w > self._frames.shape[1]:
+            raise ValueError(f"{h}×{w} frame exceeds the ring's {self._frames.shape[1]} cells")
+        self._hdr["h"], self._hdr["w"] = h, w
+
+    def publish(self, frame, fused, us_cm, ttc=math.inf, sectors=(), motion=None):
+        """Same call as SensorSnapshot.publish: copy frame + scalars into the next slot."""
+        hdr = self._hdr
+        seq = int(hdr["seq"]) + 1
+        i = (seq - 1) % self._version.size
+        h, w = frame.shape
+        slot = self._slots[i]
+
+        self._version[i] += 1
+        self._frames[i, :h * w] = frame.reshape(-1)
+        slot["h"], slot["w"] = h, w
+        slot["fused"] = np.nan if fused is None else fused
+        slot["us_cm"] = np.nan if us_cm is None else us_cm
+        slot["ttc"] = ttc
+        n = len(sectors)
+        slot["sectors"][:n] = sectors
+        slot["n_sectors"] = n
+        motion_bytes = (h * w + 7) // 8
+        if motion is None:
+            slot["motion"][:motion_bytes] = 0
+        else:
+            slot["motion"][:motion_bytes] = motion
+        now = time.monotonic_ns()
+        slot["ts_ns"], slot["seq"] = now, seq
+        self._version[i] += 1
+        hdr["seq"] = seq
+
+        self._record_gap(now)
+
+    def _record_gap(self, now):
+        hdr = self._hdr
+        epoch = int(hdr["probe_epoch"])
+        if epoch != self._epoch:                  # a reader asked for fresh stats
+            self._epoch = epoch
+            hdr["gap_count"] = hdr["gap_sum_ns"] = hdr["gap_max_ns"] = 0
+            hdr["gap_hist"][:] = 0
+        else:
+            gap = now - int(hdr["last_ns"])
+            hdr["gap_count"] += 1
+            hdr["gap_sum_ns"] += gap
+            if gap > hdr["gap_max_ns"]:
+                hdr["gap_max_ns"] = gap
+            hdr["gap_hist"][min(gap // 1_000_000, GAP_BINS - 1)] += 1
+        hdr["last_ns"] = now
+
+    # --- Readers ---
+    @property
+    def shape(self):
+        return int(self._hdr["h"]), int(self._hdr["w"])
+
+    @property
+    def seq(self):
+        return int(self._hdr["seq"])
+
+    def read(self):
+        """(token, frame, fused, us_cm, ttc, sectors, motion) of the newest state; frame / sectors / motion are read-only views into the ring."""
+        while True:
+            seq = int(self._hdr["seq"])
+            if seq == 0:
+                h, w = self.shape
+                view = self._frames[0, :h * w].reshape(h, w).view()
+                view.flags.writeable = False
+                empty = self._slots[0]
+                return (0, -1), view, 0.0, 0.0, math.inf, empty["sectors"][:0], empty["motion"][:0]
+            i = (seq - 1) % self._version.size
+            version = int(self._version[i])
+            slot = self._slots[i]
+            h, w = int(slot["h"]), int(slot["w"])
+            fused, us_cm, ttc = float(slot["fused"]), float(slot["us_cm"]), float(slot["ttc"])
+            n = int(slot["n_sectors"])
+            if not version & 1 and version == self._version[i]:
+                break       # otherwise the writer lapped us: retry on the new newest slot
+        view = self._frames[i, :h * w].reshape(h, w).view()
+        view.flags.writeable = False
+        sectors = slot["sectors"][:n].view()
+        sectors.flags.writeable = False
+        motion = slot["motion"][:(h * w + 7) // 8].view()
+        motion.flags.writeable = False
+        return (i, version), view, _none_if_nan(fused), _none_if_nan(us_cm), ttc, sectors, motion
+
+    def latest(self):
+        """(fused, us_cm) of the newest state: scalars only, no views."""
+        while True:
+            seq = int(self._seq)
+            if seq == 0:
+                return 0.0, 0.0
+            i = (seq - 1) % self._version.size
+            version = int(self._version[i])
+            fused, us_cm = float(self._fused[i]), float(self._us_cm[i])
+            if not version & 1 and version == self._version[i]:
+                return _none_if_nan(fused), _none_if_nan(us_cm)
+
+    def still_valid(self, token):
+        i, version = token
+        return version < 0 or self._version[i] == version
+
+    def copy_into(self, out, sectors=None):
+        while True:
+            token, frame, fused, us_cm, ttc, sector_view, _ = self.read()
+            np.copyto(out, frame)
+            if sectors is not None:
+                sectors[:sector_view.size] = sector_view
+            if self.still_valid(token):
+                return fused, us_cm, ttc
+
+    def wait(self, last_seq, timeout=None):
+        """Block until a publish newer than last_seq (or timeout); returns the current seq."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seq = int(self._hdr["seq"])
+            if seq != last_seq or (deadline is not None and time.monotonic() >= deadline):
+                return seq
+            time.sleep(POLL_INTERVAL)
+
+    # --- Jitter probe ---
+    def reset_jitter(self):
+        """Start a new measurement window (takes effect at the writer's next publish)."""
+        self._hdr["probe_epoch"] += 1
+
+    def jitter(self):
+        """Publish-gap stats (ms) since reset_jitter(): nominal = median gap, jitter = max - median."""
+        hdr = self._hdr
+        n = int(hdr["gap_count"])
+        if not n:
+            return {"frames": 0}
+        cdf = np.cumsum(hdr["gap_hist"])
+        median = float(np.searchsorted(cdf, n * 0.5)) + 0.5
+        p99 = float(np.searchsorted(cdf, n * 0.99)) + 0.5
+        gap_max = int(hdr["gap_max_ns"]) / 1e6
+        return {
+            "frames": n,
+            "mean_ms": int(hdr["gap_sum_ns"]) / n / 1e6,
+            "median_ms": median,
+            "p99_ms": p99,
+            "max_ms": gap_max,
+            "jitter_ms": gap_max - median,
+        }
+
+
+def _none_if_nan(x):
+    return None if math.isnan(x) else x
+
+
+class RemoteClip:
+    """Main-process handle of speech played by the sensor process (audio_engine.SpeechClip interface)."""
+
+    def __init__(self, clip_id, samples):
+        self.id = clip_id
+        self.duration = samples / audio_engine.SAMPLE_RATE
+        self.t_start = None                # time.time() of the first sample, set by the sensor process
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+
+# === SENSOR PROCESS ===
+def _sensor_main(shm_name, vision_queue, commands, audio_status, source):
+    """Entry point of the sensor process (spawned)."""
+    from sensors import sensor_processor as sp
+
+    cpu_budget.apply("sensors")          # own core: captioning can't take it
+    state = SharedSensorState.attach(shm_name)
+    state._hdr["writer_pid"] = os.getpid()
+    state.resize(sp.GRID_SHAPE)
+    sp.STATE = state                     # process_pair / configure_grid publish into the ring
+    sp.VISION_QUEUE = vision_queue       # vision triggers go back to the main process
+    if sp.AUDIO_ENABLED:
+        audio_engine.start()             # tone stream lives here, next to the zone logic
+
+    try:                                 # before the command thread: "stop" may interrupt right away
+        threading.Thread(target=_command_loop, args=(commands, audio_status), daemon=True).start()
+        print(f"📡 Sensor process {os.getpid()} started ({source}), cores {sorted(os.sched_getaffinity(0))}")
+        if source == "bridge":
+            from sensors.sensor_serial_bridge import run_bridge
+            run_bridge()
+        else:
+            _synthetic_loop(sp)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.close()
+
+
+def _command_loop(commands, audio_status):
+    import _thread
+    from queue import Queue
+    playing = Queue()
+    threading.Thread(target=_report_speech, args=(playing, audio_status), daemon=True).start()
+    while True:
+        cmd, *args = commands.get()
+        if cmd == "stop":
+            _thread.interrupt_main()
+            return
+        if cmd == "beep":
+            audio_engine.beep(*args)
+        if cmd == "say":
+            clip_id, pcm, gain = args
+            playing.put((clip_id, audio_engine.say(pcm, gain)))
+        if cmd == "grid":
+            from sensors import sensor_serial_bridge
+            try:
+                sensor_serial_bridge.set_grid(*args)
+            except RuntimeError as e:
+                print(f"⚠️  {e}")
+
+
+def _report_speech(playing, audio_status):
+    """Clips play in order: report each one's start and end back to the main process."""
+    while True:
+        clip_id, clip = playing.get()
+        clip.started.wait()
+        audio_status.put(("started", clip_id, clip.t_start))
+        clip.done.wait()
+        audio_status.put(("done", clip_id))
+
+
+def _synthetic_loop(sp, hz=SYNTHETIC_HZ, stop=None):
+    """Fixed-rate fake frames through the real processing path (benchmarks, no hardware)."""
+    rng = np.random.default_rng(0)
+    period = 1.0 / hz
+    t_next = time.perf_counter()
+    while stop is None or not stop.is_set():
+        tof = (1.5 + 0.05 * rng.standard_normal(sp.GRID_SHAPE)).astype(np.float32)
+        sp.process_pair(None, tof, 150.0)
+        t_next += period
+        time.sleep(max(0.0, t_next - time.perf_counter()))
+
+
+class SensorService:
+    """
+    Usage:
+        service = SensorService()          # source="synthetic" without hardware
+        service.start()
+        token, frame, fused, us_cm, ttc, sectors, motion = service.state.read()
+        service.set_grid(4)
+        service.stop()
+    """
+
+    def __init__(self, source="bridge", slots=RING_SLOTS, max_cells=MAX_CELLS):
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {SOURCES}, got {source!r}")
+        self.source = source
+        self.slots = slots
+        self.max_cells = max_cells
+        self.state = None
+        self.process = None
+        self._ctx = mp.get_context("spawn")
+        self._vision = None
+        self._commands = None
+        self._forwarder = None
+        self._audio_status = None
+        self._speech_forwarder = None
+        self._clips = {}                   # id → RemoteClip still playing
+        self._clip_ids = 0
+        self._watchdog = None
+        self._lock = threading.Lock()      # process handle vs. stop()
+        self._stopping = False
+        self.restarts = 0
+
+    def start(self):
+        self.state = SharedSensorState.create(self.slots, self.max_cells)
+        self._vision = self._ctx.Queue()
+        self._commands = self._ctx.Queue()
+        self._audio_status = self._ctx.Queue()
+        self._stopping = False
+        self.process = self._spawn()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+        self._forwarder = threading.Thread(target=self._forward_vision, daemon=True)
+        self._forwarder.start()
+        self._speech_forwarder = threading.Thread(target=self._forward_speech, daemon=True)
+        self._speech_forwarder.start()
+        return self.state
+
+    def _spawn(self):
+        process = self._ctx.Process(target=_sensor_main, name="sensors", daemon=True,
+                                    args=(self.state.name, self._vision, self._commands,
+                                          self._audio_status, self.source))
+        process.start()
+        return process
+
+    def _watch(self):
+        """Restart the sensor process if it exits without stop(): no beeps or triggers otherwise."""
+        while True:
+            process = self.process
+            process.join()
+            if self._stopping:
+                return
+            print(f"💥 Sensor process exited (code {process.exitcode}); restarting in {RESTART_DELAY}s")
+            self._release_clips()          # its audio stream went with it
+            time.sleep(RESTART_DELAY)
+            with self._lock:
+                if self._stopping:
+                    return
+                self.process = self._spawn()
+                self.restarts += 1
+
+    def _release_clips(self):
+        """Set every pending clip's events, so nothing waits on audio that won't play."""
+        for clip_id in list(self._clips):
+            clip = self._clips.pop(clip_id, None)
+            if clip is not None:
+                clip.started.set()
+                clip.done.set()
+
+    def _forward_vision(self):
+        while True:
+            try:
+                item = self._vision.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            event_bus.VISION_QUEUE.put(item)
+
+    def _forward_speech(self):
+        while True:
+            try:
+                item = self._audio_status.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            event, clip_id, *rest = item
+            clip = self._clips.get(clip_id)
+            if clip is None:
+                continue
+            if event == "started":
+                clip.t_start = rest[0]
+                clip.started.set()
+            else:
+                self._clips.pop(clip_id, None)
+                clip.done.set()
+
+    def set_grid(self, side):
+        self._commands.put(("grid", side))
+
+    # --- Audio: played by the sensor process's engine ---
+    def beep(self, level):
+        self._commands.put(("beep", level))
+
+    def say(self, pcm, gain=audio_engine.SPEECH_GAIN):
+        """Queue speech PCM (as audio_engine.say) on the sensor process's stream; returns a RemoteClip."""
+        self._clip_ids += 1
+        clip = RemoteClip(self._clip_ids, len(pcm))
+        self._clips[clip.id] = clip
+        self._commands.put(("say", clip.id, pcm, gain))
+        return clip
+
+    def stop(self, timeout=2.0):
+        with self._lock:
+            self._stopping = True
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self._commands.put(("stop",))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+        self._vision.put(None)
+        self._forwarder.join(timeout)    # before interpreter exit closes the queue under it
+        self._audio_status.put(None)
+        self._speech_forwarder.join(timeout)
+        self._watchdog.join(timeout)
+        self._release_clips()              # never played: release anyone waiting on them
+        self.process = None
+        self.state.close()
+
+
+# === JITTER BENCHMARK ===
+def _caption_load(seconds):
+    """
+    Stand-in for generate_caption without torch: long GIL-holding C calls
+    (sorting, like tokenizer / Python-side generate work) between BLAS calls
+    that keep the cores busy.
+    """
+    rng = np.random.default_rng(1)
+    words = rng.integers(0, 1 << 30, 300_000).tolist()
+    a = rng.standard_normal((300, 300))
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        sorted(words)
+        a @ a
+
+
+if __name__ == "__main__":
+    from sensors import sensor_processor as sp
+
+    LOAD_S = 4.0
+
+    def report(label, stats):
+        print(f"{label:>8}: {stats['frames']} frames, nominal {stats['median_ms']:.0f} ms, "
+              f"p99 {stats['p99_ms']:.0f} ms, worst gap {stats['max_ms']:.1f} ms "
+              f"→ jitter {stats['jitter_ms']:.1f} ms")
+
+    # 1) Sensor loop as a thread of this process (the old controller layout)
+    state = SharedSensorState.create()
+    sp.STATE = state
+    stop = threading.Event()
+    loop = threading.Thread(target=_synthetic_loop, args=(sp, SYNTHETIC_HZ, stop), daemon=True)
+    loop.start()
+    time.sleep(0.5)
+    state.reset_jitter()
+    time.sleep(0.1)
+    _caption_load(LOAD_S)
+    report("thread", state.jitter())
+    stop.set()
+    loop.join()
+    state.close()
+
+    # 2) Sensor loop in its own process
+    service = SensorService(source="synthetic")
+    service.start()
+    time.sleep(3.0)          # spawn + imports
+    service.state.reset_jitter()
+    time.sleep(0.1)
+    _caption_load(LOAD_S)
+    report("process", service.state.jitter())
+    service.stop()
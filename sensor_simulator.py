@@ -6,13 +6,14 @@ Simulates ToF (8×8 grid) and Ultrasonic distance cycles, calling sensor_process
 import time, math, random
 from datetime import datetime
 from sensors import sensor_processor as sp
+from sensors.sensor_frame import SensorFrame
 
 
 # === CONFIG ===
 MODE = "oscillate"   # "steady", "approach", "oscillate", "random"
 UPDATE_RATE_HZ = 1   # updates per second
 CYCLE_TIME = 10      # seconds per full oscillation
-TOF_GRID = 64        # 8x8 ToF array
+TOF_SIDE = 8         # 8 → 8×8 ToF array, 4 → VL53L5CX 4×4 high-rate mode
 TOF_BASE_M = 1.5     # max range (m)
 TOF_MIN_M = 0.15     # closest (m)
 US_BASE_CM = 150     # max ultrasonic (cm)
@@ -46,12 +47,12 @@ def simulate_distance(t):
 
 
 def generate_tof_frame(center_m):
-    """Produce an 8×8 frame with gradient depth variation around a central value."""
+    """Produce an N×N frame with gradient depth variation around a central value."""
     frame = []
-    for i in range(TOF_GRID):
+    for i in range(TOF_SIDE * TOF_SIDE):
         # small sinusoidal pattern across grid
-        row, col = divmod(i, 8)
-        offset = math.sin((row + col) / 4.0) * 0.05
+        row, col = divmod(i, TOF_SIDE)
+        offset = math.sin((row + col) / (TOF_SIDE / 2)) * 0.05
         noise = random.uniform(-NOISE_TOF, NOISE_TOF)
         frame.append(max(0.0, center_m + offset + noise))
     return frame
@@ -78,9 +79,8 @@ def main():
                 "values": [us_cm],
             }
 
-            # send directly to processor
-            sp.process_entry(tof_entry)
-            sp.process_entry(us_entry)
+            # send directly to processor: one simulated ToF + US pair
+            sp.process_frame(SensorFrame.from_entries(tof_entry, us_entry))
 
             time.sleep(interval)
     except KeyboardInterrupt:
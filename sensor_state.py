@@ -0,0 +1,141 @@
+"""
+sensor_state.py
+---------------
+Latest sensor state shared between the processor thread and its readers
+(OpenCV visualizer, visual_tui, controller): ToF frame, fused distance,
+ultrasonic reading, time to collision, per-sector distances (tof_sectors)
+and the packed approaching-zone mask (tof_motion).
+
+The state lives in two preallocated buffers. The processor fills the back
+buffer and flips it to the front; readers get zero-copy views of the front
+buffer and can check afterwards that it wasn't overwritten while they used
+it (a per-buffer version counter, odd while being written — a seqlock).
+Readers that want every frame block on wait() instead of polling.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+MAX_SECTORS = 16
+
+
+def _mask_bytes(shape):
+    """Bytes of a packed one-bit-per-zone mask."""
+    return (int(np.prod(shape)) + 7) // 8
+
+
+class SensorSnapshot:
+    """Double-buffered ToF frame + fused distance + ultrasonic reading + TTC + sectors + motion mask."""
+
+    def __init__(self, shape=(8, 8)):
+        self._frames = np.zeros((2,) + tuple(shape), dtype=np.float32)
+        self._fused = [0.0, 0.0]
+        self._us_cm = [0.0, 0.0]
+        self._ttc = [math.inf, math.inf]
+        self._sectors = np.full((2, MAX_SECTORS), np.inf, dtype=np.float32)
+        self._n_sectors = [0, 0]
+        self._motion = np.zeros((2, _mask_bytes(shape)), dtype=np.uint8)
+        self._version = [0, 0]     # odd while that buffer is being written
+        self._front = 0
+        self.seq = 0               # number of publishes so far
+        self._cond = threading.Condition()
+
+    @property
+    def shape(self):
+        return self._frames.shape[1:]
+
+    # --- Writer (single producer) ---
+    def resize(self, shape):
+        """Switch to a new frame shape (e.g. a stitched panorama); called by the writer before publishing."""
+        shape = tuple(shape)
+        if shape == self.shape:
+            return
+        frames = np.zeros((2,) + shape, dtype=np.float32)
+        self._version[0] += 2
+        self._version[1] += 2     # invalidate outstanding read() tokens on the old buffers
+        self._frames = frames
+        self._motion = np.zeros((2, _mask_bytes(shape)), dtype=np.uint8)
+        self.seq += 1
+        with self._cond:
+            self._cond.notify_all()
+
+    def publish(self, frame, fused, us_cm, ttc=math.inf, sectors=(), motion=None):
+        """Copy frame (no allocation) + scalars into the back buffer and make it current."""
+        back = 1 - self._front
+        self._version[back] += 1
+        np.copyto(self._frames[back], frame)
+        self._fused[back] = fused
+        self._us_cm[back] = us_cm
+        self._ttc[back] = ttc
+        n = len(sectors)
+        self._sectors[back, :n] = sectors
+        self._n_sectors[back] = n
+        if motion is None:
+            self._motion[back] = 0
+        else:
+            np.copyto(self._motion[back], motion)
+        self._version[back] += 1
+
+        self._front = back
+        self.seq += 1
+        with self._cond:
+            self._cond.notify_all()
+
+    # --- Readers ---
+    def read(self):
+        """
+        Return (token, frame, fused, us_cm, ttc, sectors, motion) for the current
+        state. frame, sectors and motion (packed approaching mask, see
+        tof_motion.unpack_mask) are read-only views: call still_valid(token)
+        after using them to make sure the writer didn't reuse the buffer
+        meanwhile (it gets one full frame period).
+        """
+        while True:
+            idx = self._front
+            version = self._version[idx]
+            fused, us_cm, ttc = self._fused[idx], self._us_cm[idx], self._ttc[idx]
+            n = self._n_sectors[idx]
+            if not version & 1 and version == self._version[idx]:
+                break   # otherwise we caught the writer mid-flip: retry on the new front
+        view = self._frames[idx].view()
+        view.flags.writeable = False
+        sectors = self._sectors[idx, :n].view()
+        sectors.flags.writeable = False
+        motion = self._motion[idx].view()
+        motion.flags.writeable = False
+        return (idx, version), view, fused, us_cm, ttc, sectors, motion
+
+    def latest(self):
+        """(fused, us_cm) of the current state (scalars only: no views, no allocation)."""
+        while True:
+            idx = self._front
+            version = self._version[idx]
+            fused, us_cm = self._fused[idx], self._us_cm[idx]
+            if not version & 1 and version == self._version[idx]:
+                return fused, us_cm
+
+    def still_valid(self, token):
+        """True if the buffer behind a read() token hasn't been rewritten since."""
+        idx, version = token
+        return self._version[idx] == version
+
+    def copy_into(self, out, sectors=None):
+        """
+        Consistent copy of the current frame into out (and the sector distances
+        into the start of sectors, if given); returns (fused, us_cm, ttc).
+        """
+        while True:
+            token, frame, fused, us_cm, ttc, sector_view, _ = self.read()
+            np.copyto(out, frame)
+            if sectors is not None:
+                sectors[:sector_view.size] = sector_view
+            if self.still_valid(token):
+                return fused, us_cm, ttc
+
+    def wait(self, last_seq, timeout=None):
+        """Block until something newer than last_seq is published; returns the current seq."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != last_seq, timeout)
+        return self.seq
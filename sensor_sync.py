@@ -0,0 +1,137 @@
+"""
+sensor_sync.py
+--------------
+Pairs the ToF and ultrasonic streams by timestamp so fusion runs exactly once
+per ToF frame, on an ultrasonic value that belongs to that frame's time.
+
+ToF is the fusion clock (15 Hz firmware vs ~5 Hz HC-SR04). ToF frames queue
+until an ultrasonic reading at or after their timestamps arrives; that
+reading resolves all of them (about three per HC-SR04 period), each with the
+ultrasonic value at its own time:
+
+    interp   linear interpolation between the readings around it,
+             falling back to hold when it isn't bracketed
+    hold     the most recent reading at or before it
+
+A frame that has waited more than max_age seconds (ultrasonic gone quiet)
+is resolved with what is there. Readings older than max_age seconds are
+stale: the pair carries us=None.
+Timeout readings (<= 0 cm) are never interpolated across. A US reading with
+the same timestamp as the ToF frame belongs to it (text logs write the ToF
+line first); if the clock jumps backwards (looped log) the history restarts.
+"""
+
+from collections import deque, namedtuple
+
+SYNC_MODES = ("interp", "hold")
+MAX_US_AGE = 0.5    # s — 2.5 HC-SR04 periods
+
+SyncedPair = namedtuple("SyncedPair", ["t", "tof", "us", "us_age"])
+
+
+class SensorSync:
+    """
+    Usage:
+        sync = SensorSync()
+        for pair in sync.push_tof(t, frame):   # or sync.push_us(t, cm)
+            fuse(pair.tof, pair.us)             # us is None when stale
+
+    push_*() return the list of pairs completed by that reading, in ToF
+    order (usually none for a ToF frame, a few for an ultrasonic reading),
+    so callers fuse exactly once per ToF frame.
+    """
+
+    def __init__(self, mode="interp", max_age=MAX_US_AGE):
+        if mode not in SYNC_MODES:
+            raise ValueError(f"mode must be one of {SYNC_MODES}, got {mode!r}")
+        self.mode = mode
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        self._us_prev = None     # (t, cm) — reading before _us_last
+        self._us_last = None     # (t, cm) — newest reading
+        self._pending = deque()  # (t, payload) — ToF frames waiting for their ultrasonic value
+        self._t_max = None       # newest timestamp seen, to detect clock jumps
+        self.stats = {"pairs": 0, "interpolated": 0, "held": 0, "stale": 0}
+
+    # --- Inputs ---
+    def push_tof(self, t, payload):
+        out = self._check_clock(t)
+        if self._us_last is not None and self._us_last[0] > t:
+            out.append(self._resolve(t, payload))          # its US is already here
+            return out
+        pending = self._pending
+        while pending and t - pending[0][0] > self.max_age:
+            out.append(self._resolve(*pending.popleft()))  # no newer US within max_age: hold
+        pending.append((t, payload))
+        return out
+
+    def push_us(self, t, cm):
+        out = self._check_clock(t)
+        self._us_prev, self._us_last = self._us_last, (t, cm)
+        pending = self._pending
+        while pending and pending[0][0] <= t:
+            out.append(self._resolve(*pending.popleft()))
+        return out
+
+    def _check_clock(self, t):
+        """Clock went backwards: pair what's pending with the old history, then start over."""
+        if self._t_max is None or t >= self._t_max:
+            self._t_max = t
+            return []
+        out = self.flush()
+        self._us_prev = self._us_last = None
+        self._t_max = t
+        return out
+
+    def flush(self):
+        """Pair the frames still waiting for an ultrasonic reading (end of stream)."""
+        out = [self._resolve(*pending) for pending in self._pending]
+        self._pending.clear()
+        return out
+
+    # --- Alignment ---
+    def _resolve(self, t, payload):
+        self.stats["pairs"] += 1
+        prev, last = self._us_prev, self._us_last
+        if last is None:
+            self.stats["stale"] += 1
+            return SyncedPair(t, payload, None, None)
+
+        (t1, v1) = last
+        if (self.mode == "interp" and prev is not None and prev[0] <= t <= t1
+                and t1 > prev[0] and prev[1] > 0 and v1 > 0):
+            t0, v0 = prev
+            us = v1 - (v1 - v0) * (t1 - t) / (t1 - t0)    # exact v1 at t == t1
+            age = min(t - t0, t1 - t)
+            kind = "interpolated"
+        elif t1 <= t or prev is None or prev[0] > t:
+            us, age, kind = v1, abs(t - t1), "held"          # newest (or only) reading
+        else:
+            us, age, kind = prev[1], t - prev[0], "held"     # last reading at or before t
+
+        if age > self.max_age:
+            self.stats["stale"] += 1
+            return SyncedPair(t, payload, None, age)
+        self.stats[kind] += 1
+        return SyncedPair(t, payload, us, age)
+
+
+# === SELF TEST ===
+if __name__ == "__main__":
+    # 15 Hz ToF, 5 Hz ultrasonic ramp (100 → 50 cm), ultrasonic goes silent after 2 s
+    sync = SensorSync("interp")
+    events = [(i / 15, "tof", i) for i in range(60)]
+    events += [(i / 5 + 0.01, "us", 100.0 - 5 * i) for i in range(11)]
+    events.sort(key=lambda e: e[0])
+
+    pairs = []
+    for t, kind, value in events:
+        pairs += sync.push_tof(t, value) if kind == "tof" else sync.push_us(t, value)
+    pairs += sync.flush()
+
+    for p in pairs[::6]:
+        us = "stale" if p.us is None else f"{p.us:6.1f} cm"
+        print(f"t={p.t:5.2f}s  frame={p.tof:2d}  us={us}")
+    print(f"{len(pairs)} pairs for 60 frames —", sync.stats)
@@ -14,17 +14,25 @@ Examples:
 import serial
 import time
 import sys
+import codecs
+import functools
+import warnings
+from collections import namedtuple
 from datetime import datetime
 from pathlib import Path
 import re
 
+import numpy as np
+
 # === CONFIGURATION ===
 MODE = "TEST"                  # "LIVE" or "TEST"
 PORT = "COM5"                  # e.g. "COM5" on Windows or "/dev/ttyUSB0" on Linux
 BAUD = 115200
 TIMEOUT = 2
 TEST_FILE = Path("fake_sensor_log.txt")
-SPEED = 0.2                    # seconds between lines in test mode
+REPLAY_SPEED = 1.0             # test mode: × original rate (None = as fast as possible)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TOF_ZONES = 64
 
 
 # === PARSER ===
@@ -60,7 +68,7 @@ def parse_sensor_line(line: str):
         values = [float(v.strip()) for v in values_list_content.split(',') if v.strip()]
         
         # Convert the timestamp string to a datetime object
-        timestamp = datetime.strptime(timestamp_str.strip(), "%Y-%m-%d %H:%M:%S")
+        timestamp = datetime.strptime(timestamp_str.strip(), TIMESTAMP_FORMAT)
 
         return {
             "type": sensor_type.strip(),
@@ -78,9 +86,202 @@ def parse_sensor_line(line: str):
         return None
 
 
+# === BULK PARSER ===
+SensorLog = namedtuple("SensorLog", [
+    "tof_ts",     # int64 epoch ns, (N,)
+    "tof",        # float32 metres, (N, 64)
+    "tof_seq",    # int64 position of each TOF reading in the log, (N,)
+    "us_ts",      # int64 epoch ns, (M,)
+    "us",         # float32 cm, (M,)
+    "us_seq",     # int64 position of each US reading in the log, (M,)
+])
+
+# SENSOR|TIMESTAMP|[values] — one C-level scan over the whole text
+_LINE_RE = re.compile(rb"^[ \t]*(TOF|US)[ \t]*\|([^|\n]*)\|[^\[\n]*\[([^\]\n]*)\]", re.M)
+_POW10 = 10.0 ** np.arange(23)
+
+
+def detect_encoding(head: bytes):
+    """
+    Guess the text encoding of a log from its first bytes.
+    Returns (codec, bom_length). Handles the UTF-16 LE + BOM files that
+    PowerShell redirection produces (e.g. fake_sensor_log.txt).
+    """
+    for bom, codec in ((codecs.BOM_UTF8, "utf-8"),
+                       (codecs.BOM_UTF16_LE, "utf-16-le"),
+                       (codecs.BOM_UTF16_BE, "utf-16-be")):
+        if head.startswith(bom):
+            return codec, len(bom)
+
+    # No BOM (e.g. a chunk from the middle of a file): ASCII text encoded as
+    # UTF-16 has a NUL in every other byte
+    sample = head[:4096]
+    if sample.count(b"\x00") > len(sample) // 4:
+        odd_nuls = sample[1::2].count(b"\x00")
+        even_nuls = sample[0::2].count(b"\x00")
+        return ("utf-16-le" if odd_nuls >= even_nuls else "utf-16-be"), 0
+    return "utf-8", 0
+
+
+def _to_ascii(data: bytes, encoding=None):
+    """Return the log as ASCII bytes, narrowing UTF-16 with NumPy instead of str decoding."""
+    if encoding is None:
+        encoding, skip = detect_encoding(data)
+    else:
+        skip = 0
+    data = memoryview(data)[skip:]
+
+    if encoding.startswith("utf-16"):
+        dtype = "<u2" if encoding == "utf-16-le" else ">u2"
+        units = np.frombuffer(data, dtype=dtype, count=len(data) // 2)
+        if units.size == 0 or units.max() < 0x80:
+            # Pure ASCII payload: just keep the low byte of every code unit
+            return units.astype(np.uint8).tobytes()
+        return bytes(data[:len(units) * 2]).decode(encoding, errors="ignore").encode("ascii", errors="ignore")
+
+    return bytes(data)
+
+
+@functools.lru_cache(maxsize=65536)
+def _epoch_ns(timestamp: bytes):
+    """Parse one log timestamp to epoch ns (cached: logs repeat each second many times)."""
+    try:
+        ts = datetime.strptime(timestamp.strip().decode("ascii"), TIMESTAMP_FORMAT)
+    except (ValueError, UnicodeDecodeError):
+        return -1
+    return int(ts.timestamp()) * 1_000_000_000
+
+
+def _timestamps_ns(ts_list):
+    """Vectorized timestamp conversion: each distinct string is parsed once."""
+    if not ts_list:
+        return np.empty(0, dtype=np.int64)
+    uniq, inverse = np.unique(np.array(ts_list), return_inverse=True)
+    lut = np.array([_epoch_ns(bytes(u)) for u in uniq], dtype=np.int64)
+    return lut[inverse.reshape(-1)]
+
+
+def _parse_fixed_width(joined: bytes):
+    """
+    Fast path for the common case where every number has the same layout
+    (e.g. "0.7,0.6,..."): view the bytes as an (n, width) matrix and combine
+    digit columns with one dot product. Returns None if the layout differs.
+    """
+    a = np.frombuffer(joined + b",", dtype=np.uint8)
+    width = joined.find(b",") + 1
+    if width < 2 or a.size % width:
+        return None
+    m = a.reshape(-1, width)
+    if not (m[:, -1] == 44).all():
+        return None
+
+    first = m[0, :-1]
+    dot_cols = np.flatnonzero(first == 46)
+    digit_cols = np.flatnonzero(first != 46)
+    if dot_cols.size > 1 or (dot_cols.size and not (m[:, dot_cols[0]] == 46).all()):
+        return None
+
+    digits = m[:, digit_cols]
+    if ((digits < 48) | (digits > 57)).any():
+        return None
+
+    nd = digit_cols.size
+    frac = width - 2 - dot_cols[0] if dot_cols.size else 0
+    mantissa = (digits - 48.0) @ _POW10[nd - 1::-1]
+    return mantissa / _POW10[frac]
+
+
+def _parse_values(bodies, per_row):
+    """
+    Parse comma-separated number lists into a (len(bodies), per_row) float32
+    block in one vectorized pass. Returns (block, keep_mask).
+    """
+    n = len(bodies)
+    if n == 0:
+        return np.empty((0, per_row), dtype=np.float32), np.ones(0, dtype=bool)
+
+    joined = b",".join(bodies)
+    flat = _parse_fixed_width(joined)
+    if flat is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                flat = np.fromstring(joined.decode("ascii"), dtype=np.float64, sep=",")
+            except (ValueError, DeprecationWarning, UnicodeDecodeError):
+                flat = None
+    if flat is not None and flat.size == n * per_row:
+        return flat.astype(np.float32).reshape(n, per_row), np.ones(n, dtype=bool)
+
+    # Slow path: some line holds a malformed number, find it row by row
+    block = np.zeros((n, per_row), dtype=np.float32)
+    keep = np.zeros(n, dtype=bool)
+    for i, body in enumerate(bodies):
+        try:
+            row = [float(v) for v in body.split(b",") if v.strip()]
+        except ValueError:
+            continue
+        if len(row) == per_row:
+            block[i] = row
+            keep[i] = True
+    return block, keep
+
+
+def parse_sensor_log(source, encoding=None):
+    """
+    Bulk-parse a whole TOF/US text log (path or raw bytes chunk) into NumPy arrays.
+
+    Much faster than parse_sensor_line() per line: lines are matched with one
+    regex scan, numbers are parsed in one vectorized pass and each distinct
+    timestamp string is converted once. Malformed lines are skipped.
+    Returns a SensorLog namedtuple.
+    """
+    if isinstance(source, (str, Path)):
+        data = Path(source).read_bytes()
+    else:
+        data = bytes(source)
+    text = _to_ascii(data, encoding).replace(b"\x00", b"").replace(b"\r", b"")
+
+    tof_ts, tof_body, tof_seq = [], [], []
+    us_ts, us_body, us_seq = [], [], []
+
+    for i, (stype, ts, body) in enumerate(_LINE_RE.findall(text)):
+        if stype == b"TOF":
+            if body.count(b",") == TOF_ZONES - 1:
+                tof_ts.append(ts)
+                tof_body.append(body)
+                tof_seq.append(i)
+        elif body.strip():
+            us_ts.append(ts)
+            us_body.append(body.split(b",", 1)[0].strip())
+            us_seq.append(i)
+
+    tof, tof_ok = _parse_values(tof_body, TOF_ZONES)
+    us, us_ok = _parse_values(us_body, 1)
+
+    tof_ts, us_ts = _timestamps_ns(tof_ts), _timestamps_ns(us_ts)
+    tof_ok &= tof_ts >= 0
+    us_ok &= us_ts >= 0
+
+    return SensorLog(
+        tof_ts=tof_ts[tof_ok],
+        tof=tof[tof_ok],
+        tof_seq=np.asarray(tof_seq, dtype=np.int64)[tof_ok],
+        us_ts=us_ts[us_ok],
+        us=us[us_ok, 0],
+        us_seq=np.asarray(us_seq, dtype=np.int64)[us_ok],
+    )
+
+
 # === DISPLAY ===
 def display(entry: dict):
     """Prints the parsed sensor data. MODIFIED to return full values list."""
+    if not isinstance(entry, dict):
+        # SensorFrame (binary sessions): print it through its dict adapter
+        for part in entry.entries():
+            if part:
+                display(part)
+        return
+
     timestamp = entry['timestamp'].strftime("%H:%M:%S")
     sensor_type = entry['type']
     values = entry['values']
@@ -130,27 +331,14 @@ def run_test():
 
     print(f"[{datetime.now()}] TEST mode replay from {TEST_FILE}\n")
 
-    with open(TEST_FILE, "r", encoding="utf-8-sig", errors="ignore") as f:
-
-        for raw in f:
-            raw = raw.strip()  # Remove newline + spaces
-            
-            # 1. Skip truly blank lines
-            if not raw:
-                continue
+    from sensors.replay import replay
 
-            # 2. Filter out non-data/comment lines (headers, etc.)
-            if "|" not in raw:
-                continue
-                
-            entry = parse_sensor_line(raw)
-            if entry:
-                display(entry)
-            else:
-                # This should now only trigger if the line structure is fundamentally broken
-                print(f"[WARN] Malformed: {raw}")
-            
-            time.sleep(SPEED) # Throttle the output for readability
+    # Bulk-parse the whole file and replay it at the recorded rate
+    if REPLAY_SPEED is None:
+        result = replay(TEST_FILE, mode="virtual", sink=display)
+    else:
+        result = replay(TEST_FILE, mode="speed", speed=REPLAY_SPEED, sink=display)
+    print(f"\nReplayed {result.events} readings ({result.log_seconds:.1f} s of data)")
 
 
 # === EXECUTION ===
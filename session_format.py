@@ -0,0 +1,367 @@
+"""
+session_format.py
+-----------------
+Compact binary recording format for sensor sessions (*.vas), replacing the
+UTF-16 text logs for anything longer than a quick test.
+
+Layout:
+    header  (64 B)   magic, grid size, record count, block/index location
+    blocks  (fixed)  BLOCK_RECORDS records each, stored column by column:
+                       ts  int64[B]        ns (monotonic for live recordings)
+                       tof uint16[B, H*W]  mm
+                       us  float32[B]      cm
+    index            one (first_ts, last_ts, count) entry per block
+
+Every block has the same size, so the reader np.memmap()s the whole data
+region as an array of blocks and any time range is sliced through the index
+without touching the rest of the file.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from sensors.serial_listener import detect_encoding, parse_sensor_log
+
+# === FORMAT ===
+MAGIC = b"VASESS\x00\x01"
+VERSION = 1
+BLOCK_RECORDS = 4096
+GRID_W = GRID_H = 8
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u2"),
+    ("grid_h", "u1"),
+    ("grid_w", "u1"),
+    ("block_records", "<u4"),
+    ("record_count", "<u8"),
+    ("block_count", "<u4"),
+    ("index_offset", "<u8"),
+    ("clock_offset_ns", "<i8"),   # add to ts to get epoch ns (0 if ts already epoch)
+    ("reserved", "u1", (12,)),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize   # 64
+
+INDEX_DTYPE = np.dtype([
+    ("first_ts", "<i8"),
+    ("last_ts", "<i8"),
+    ("count", "<u4"),
+])
+
+
+def block_dtype(block_records=BLOCK_RECORDS, zones=GRID_W * GRID_H):
+    """Columnar block of block_records records."""
+    return np.dtype([
+        ("ts", "<i8", (block_records,)),
+        ("tof", "<u2", (block_records, zones)),
+        ("us", "<f4", (block_records,)),
+    ])
+
+
+# === WRITER ===
+class SessionWriter:
+    """
+    Append-only recorder. Records are staged in one preallocated block and
+    flushed to disk a block at a time; close() writes the index and header.
+
+        with SessionWriter("walk.vas", clock_offset_ns=...) as rec:
+            rec.append_frames(time.monotonic_ns(), decoder.decode())
+    """
+
+    def __init__(self, path, grid=(GRID_H, GRID_W), block_records=BLOCK_RECORDS, clock_offset_ns=0):
+        self.path = Path(path)
+        self.grid = grid
+        self.block_records = block_records
+        self.clock_offset_ns = clock_offset_ns
+
+        self._file = open(self.path, "wb")
+        self._file.write(bytes(HEADER_SIZE))           # placeholder, rewritten on close
+        self._block = np.zeros(1, dtype=block_dtype(block_records, grid[0] * grid[1]))
+        self._ts = self._block["ts"][0]
+        self._tof = self._block["tof"][0]
+        self._us = self._block["us"][0]
+        self._fill = 0
+        self._index = []
+        self.record_count = 0
+
+    def append(self, ts_ns, tof_mm, us_cm):
+        """Append one record."""
+        self._ts[self._fill] = ts_ns
+        self._tof[self._fill] = np.asarray(tof_mm).reshape(-1)
+        self._us[self._fill] = us_cm
+        self._advance(1)
+
+    def extend(self, ts_ns, tof_mm, us_cm):
+        """Append many records at once (arrays of length n; ts_ns may be a scalar)."""
+        tof_mm = np.asarray(tof_mm).reshape(len(tof_mm), -1)
+        n = len(tof_mm)
+        ts_ns = np.broadcast_to(np.asarray(ts_ns, dtype=np.int64), (n,))
+        us_cm = np.broadcast_to(np.asarray(us_cm, dtype=np.float32), (n,))
+
+        pos = 0
+        while pos < n:
+            take = min(n - pos, self.block_records - self._fill)
+            dst = slice(self._fill, self._fill + take)
+            src = slice(pos, pos + take)
+            self._ts[dst] = ts_ns[src]
+            self._tof[dst] = tof_mm[src]
+            self._us[dst] = us_cm[src]
+            self._advance(take)
+            pos += take
+
+    def append_frames(self, ts_ns, frames):
+        """Record decoded bridge frames (frame_decoder.FRAME_DTYPE) as-is."""
+        if len(frames):
+            self.extend(ts_ns, frames["tof"], frames["us"])
+
+    def _advance(self, n):
+        self._fill += n
+        self.record_count += n
+        if self._fill == self.block_records:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self._fill:
+            return
+        # Zero the unused tail of a partial block so files are reproducible
+        self._ts[self._fill:] = 0
+        self._tof[self._fill:] = 0
+        self._us[self._fill:] = 0
+        self._block.tofile(self._file)
+        self._index.append((self._ts[0], self._ts[self._fill - 1], self._fill))
+        self._fill = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_block()
+
+        index_offset = self._file.tell()
+        np.array(self._index, dtype=INDEX_DTYPE).tofile(self._file)
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["grid_h"], header["grid_w"] = self.grid
+        header["block_records"] = self.block_records
+        header["record_count"] = self.record_count
+        header["block_count"] = len(self._index)
+        header["index_offset"] = index_offset
+        header["clock_offset_ns"] = self.clock_offset_ns
+        self._file.seek(0)
+        header.tofile(self._file)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# === READER ===
+class SessionReader:
+    """
+    Memory-mapped reader. Only the header and the (tiny) index are read up
+    front; record data is paged in on demand when sliced.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        if header.size != 1 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{self.path} is not a VisionAssist session file")
+        self.header = header[0]
+        self.grid = (int(self.header["grid_h"]), int(self.header["grid_w"]))
+        self.block_records = int(self.header["block_records"])
+        self.clock_offset_ns = int(self.header["clock_offset_ns"])
+
+        block_count = int(self.header["block_count"])
+        self.index = np.fromfile(self.path, dtype=INDEX_DTYPE, count=block_count,
+                                 offset=int(self.header["index_offset"]))
+        self.blocks = np.memmap(self.path, dtype=block_dtype(self.block_records, self.grid[0] * self.grid[1]),
+                                mode="r", offset=HEADER_SIZE, shape=(block_count,)) if block_count else None
+
+    def __len__(self):
+        return int(self.header["record_count"])
+
+    @property
+    def start_ns(self):
+        return int(self.index["first_ts"][0]) if len(self.index) else 0
+
+    @property
+    def end_ns(self):
+        return int(self.index["last_ts"][-1]) if len(self.index) else 0
+
+    def records(self, start=0, stop=None):
+        """
+        Return (ts, tof, us) for records [start, stop). Views into the map when
+        the range sits inside one block, otherwise one concatenated copy.
+        tof has shape (n, H, W).
+        """
+        total = len(self)
+        stop = total if stop is None else min(stop, total)
+        start = max(0, min(start, stop))
+
+        B = self.block_records
+        parts = []
+        pos = start
+        while pos < stop:
+            b, off = divmod(pos, B)
+            take = min(stop - pos, B - off)
+            block = self.blocks[b]
+            parts.append((block["ts"][off:off + take], block["tof"][off:off + take], block["us"][off:off + take]))
+            pos += take
+
+        if not parts:
+            ts = np.empty(0, dtype=np.int64)
+            tof = np.empty((0, self.grid[0] * self.grid[1]), dtype=np.uint16)
+            us = np.empty(0, dtype=np.float32)
+        elif len(parts) == 1:
+            ts, tof, us = parts[0]
+        else:
+            ts, tof, us = (np.concatenate(col) for col in zip(*parts))
+        return ts, tof.reshape(-1, *self.grid), us
+
+    def time_slice(self, t0_ns, t1_ns):
+        """Return (ts, tof, us) for records with t0_ns <= ts < t1_ns."""
+        return self.records(*self._locate(t0_ns, t1_ns))
+
+    def _locate(self, t0_ns, t1_ns):
+        """Record range for [t0, t1): index binary search, then one search inside each edge block."""
+        if not len(self.index):
+            return 0, 0
+        B = self.block_records
+
+        def position(t):
+            b = int(np.searchsorted(self.index["last_ts"], t, side="left"))
+            if b >= len(self.index):
+                return len(self)
+            count = int(self.index["count"][b])
+            return b * B + int(np.searchsorted(self.blocks[b]["ts"][:count], t, side="left"))
+
+        return position(t0_ns), position(t1_ns)
+
+    def iter_chunks(self, records=BLOCK_RECORDS):
+        """Yield (ts, tof, us) in chunks of at most `records` records."""
+        for start in range(0, len(self), records):
+            yield self.records(start, start + records)
+
+
+# === TEXT LOG CONVERTER ===
+def _chunk_ranges(path, chunk_bytes):
+    """Split a text log into byte ranges that start and end on line boundaries."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        encoding, bom = detect_encoding(f.read(4096))
+        unit = 2 if encoding.startswith("utf-16") else 1
+        newline = "\n".encode(encoding)
+
+        bounds = [bom]
+        pos = bom + chunk_bytes - (chunk_bytes % unit)
+        while pos < size:
+            f.seek(pos)
+            tail = f.read(64 * 1024)
+            hit = tail.find(newline)
+            # A UTF-16 newline must start on a code-unit boundary
+            while hit != -1 and hit % unit:
+                hit = tail.find(newline, hit + 1)
+            if hit == -1:
+                break
+            bounds.append(pos + hit + len(newline))
+            pos = bounds[-1] + chunk_bytes - (chunk_bytes % unit)
+        bounds.append(size)
+
+    return encoding, [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _pair_readings(log):
+    """
+    One record per ToF reading. Its ultrasonic value is the US line logged
+    right after it with the same timestamp (same physical sample), otherwise
+    the previous US reading (NaN if none yet in this chunk).
+    """
+    n = len(log.tof)
+    us = np.full(n, np.nan, dtype=np.float32)
+    if n == 0 or len(log.us) == 0:
+        return us
+
+    nxt = np.searchsorted(log.us_seq, log.tof_seq)
+    next_tof_seq = np.append(log.tof_seq[1:], np.iinfo(np.int64).max)
+    has_next = nxt < len(log.us)
+    j = np.minimum(nxt, len(log.us) - 1)
+    same = has_next & (log.us_ts[j] == log.tof_ts) & (log.us_seq[j] < next_tof_seq)
+
+    prev = nxt - 1
+    us[prev >= 0] = log.us[prev[prev >= 0]]
+    us[same] = log.us[j[same]]
+    return us
+
+
+def _convert_chunk(args):
+    """Process-pool worker: parse one byte range of a text log into record columns."""
+    path, start, stop, encoding = args
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    log = parse_sensor_log(data, encoding)
+
+    tof_mm = np.clip(np.rint(log.tof * 1000.0), 0, 65535).astype(np.uint16)
+    last_us = log.us[-1] if len(log.us) else np.nan
+
+    # US lines before the first ToF line may belong to the previous chunk's last ToF
+    first_tof = log.tof_seq[0] if len(log.tof_seq) else np.iinfo(np.int64).max
+    lead = np.flatnonzero(log.us_seq < first_tof)
+    lead_us = (int(log.us_ts[lead[0]]), float(log.us[lead[0]])) if lead.size else None
+    tail_open = bool(len(log.tof_seq)) and not (log.us_seq > log.tof_seq[-1]).any()
+
+    return log.tof_ts, tof_mm, _pair_readings(log), last_us, lead_us, tail_open
+
+
+def convert_text_log(src, dst, workers=None, chunk_bytes=8 * 1024 * 1024):
+    """
+    Convert a TOF/US text log into a session file. The log is split into
+    line-aligned chunks that are parsed in parallel by a process pool and
+    written back in order. Returns the number of records written.
+    """
+    encoding, ranges = _chunk_ranges(src, chunk_bytes)
+    jobs = [(str(src), a, b, encoding) for a, b in ranges]
+
+    last_us = np.nan
+    pending = None   # previous chunk, held back until its last ToF can be paired
+    with SessionWriter(dst) as writer, ProcessPoolExecutor(max_workers=workers) as pool:
+        for ts, tof_mm, us, chunk_last_us, lead_us, tail_open in pool.map(_convert_chunk, jobs):
+            if pending is not None:
+                p_ts, p_tof, p_us, p_open = pending
+                if p_open and lead_us and len(p_ts) and lead_us[0] == p_ts[-1]:
+                    p_us[-1] = lead_us[1]
+                writer.extend(p_ts, p_tof, p_us)
+
+            # Readings before the chunk's first US line hold the previous chunk's value
+            missing = np.isnan(us)
+            if missing.any():
+                us[missing & (np.cumsum(~missing) == 0)] = last_us
+            if not np.isnan(chunk_last_us):
+                last_us = chunk_last_us
+            pending = (ts, tof_mm, us, tail_open)
+
+        if pending is not None:
+            writer.extend(*pending[:3])
+        return writer.record_count
+
+
+# === CLI ===
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        n = convert_text_log(sys.argv[1], sys.argv[2])
+        print(f"✅ Wrote {n} records → {sys.argv[2]}")
+    elif len(sys.argv) == 2:
+        reader = SessionReader(sys.argv[1])
+        span = (reader.end_ns - reader.start_ns) / 1e9
+        print(f"{reader.path}: {len(reader)} records, grid {reader.grid}, {span:.1f} s")
+    else:
+        print("Usage: session_format.py LOG.txt OUT.vas   |   session_format.py SESSION.vas")
@@ -1,41 +1,26 @@
-import subprocess, time
 from pathlib import Path
+import tts_engine
+
+# One engine per voice: the model is loaded on the first call only
+_engines = {}
 
 def speak_piper(text, model_path="~/piper_voices/en_US-amy-medium.onnx"):
     model_path = str(Path(model_path).expanduser())
-    wav_path = Path("tts_output.wav")
-    padded_path = Path("tts_output_padded.wav")
 
     try:
         # ------------------------------------------------------------
-        # 1️⃣ Generate the TTS file
-        # ------------------------------------------------------------
-        subprocess.run(
-            ["piper", "--model", model_path, "--output_file", str(wav_path)],
-            input=text.encode("utf-8"),
-            check=True
-        )
-
-        # ------------------------------------------------------------
-        # 2️⃣ Pad the start with 0.3s silence to avoid cut-off
+        # 1️⃣ Load the voice once (long-lived, see tts_engine.py)
         # ------------------------------------------------------------
-        subprocess.run([
-            "sox", str(wav_path), str(padded_path), "pad", "0.3", "0"
-        ], check=True)
+        tts = _engines.get(model_path)
+        if tts is None:
+            tts = _engines[model_path] = tts_engine.TtsEngine(model_path).load()
 
         # ------------------------------------------------------------
-        # 3️⃣ Small pre-playback delay (pipewire warm-up)
+        # 2️⃣ Synthesize, pad the start with silence in memory and play on
+        #    the persistent audio stream (no temp files, sox or pactl)
         # ------------------------------------------------------------
-        time.sleep(0.3)
-
-        # ------------------------------------------------------------
-        # 4️⃣ Play through PipeWire → Bluetooth default sink
-        # ------------------------------------------------------------
-        subprocess.run([
-            "bash", "-c",
-            f"pw-play --target=$(pactl info | awk -F': ' '/Default Sink/ {{print $2}}') '{padded_path}'"
-        ], check=True)
+        clip = tts.speak(text, pad=tts_engine.LEAD_SILENCE_S)
+        clip.done.wait()
 
     except Exception as e:
         print(f"⚠️ Piper TTS error: {e}")
-
@@ -0,0 +1,328 @@
+"""
+tof_filters.py
+--------------
+Configurable filter chain for ToF frames.
+
+Each stage owns a preallocated output buffer and writes into it with out=/dst=
+arguments, so running a chain allocates nothing per frame. A chain is built
+from config (a list of stage names or (name, kwargs) pairs):
+
+    chain = build_pipeline([
+        ("invalid", {"lo": 0.05, "hi": 4.0, "mode": "hold"}),
+        ("cosine", {"fov_x": 45, "fov_y": 45}),
+        "median",
+    ])
+    smoothed = chain(frame_m)        # view of the last stage's buffer
+
+Stages:
+    ema        exponential moving average (decay = weight of the previous output)
+    tmedian    temporal median over the last K frames
+    median     spatial median over a size × size window (zero-copy sliding window)
+    gaussian   cv2.GaussianBlur
+    cosine     per-zone cosine correction from the field of view (precomputed LUT)
+    invalid    out-of-range masking: hold last valid value, zero it, or clip it
+    clip       clamp to [lo, hi]
+
+The returned array is reused by the next call; copy it if it must outlive that.
+"""
+
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import cv2
+except ImportError:    # gaussian stage unavailable without OpenCV
+    cv2 = None
+
+DEFAULT_SHAPE = (8, 8)
+
+
+# === STAGES ===
+class Stage:
+    """Base class: one filter step with a preallocated output buffer."""
+
+    name = "stage"
+
+    def __init__(self, shape=DEFAULT_SHAPE):
+        self.shape = tuple(shape)
+        self.out = np.zeros(self.shape, dtype=np.float32)
+
+    def __call__(self, src):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget any history (the output buffer is the only state of most stages)."""
+        self.out[:] = 0.0
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+
+class EmaStage(Stage):
+    """out = decay * out + (1 - decay) * src"""
+
+    name = "ema"
+
+    def __init__(self, shape=DEFAULT_SHAPE, decay=0.7):
+        super().__init__(shape)
+        self.decay = float(decay)
+        self._tmp = np.empty(self.shape, dtype=np.float32)
+
+    def __call__(self, src):
+        np.multiply(src, 1.0 - self.decay, out=self._tmp)
+        np.multiply(self.out, self.decay, out=self.out)
+        np.add(self.out, self._tmp, out=self.out)
+        return self.out
+
+
+class TemporalMedianStage(Stage):
+    """Per-zone median of the last k frames (fewer until the ring has filled)."""
+
+    name = "tmedian"
+
+    def __init__(self, shape=DEFAULT_SHAPE, k=5):
+        super().__init__(shape)
+        if k < 1:
+            raise ValueError("k must be >= 1")
+        self.k = int(k)
+        self._ring = np.zeros((self.k,) + self.shape, dtype=np.float32)
+        self._work = np.empty((self.k, int(np.prod(self.shape))), dtype=np.float32)
+        self._pos = 0
+        self._count = 0
+
+    def __call__(self, src):
+        np.copyto(self._ring[self._pos], src)
+        self._pos = (self._pos + 1) % self.k
+        self._count = min(self._count + 1, self.k)
+
+        n = self._count
+        work = self._work[:n]
+        np.copyto(work, self._ring[:n].reshape(n, -1))
+        _median_rows(work.T, self.out.reshape(-1))
+        return self.out
+
+    def reset(self):
+        super().reset()
+        self._pos = self._count = 0
+
+
+class SpatialMedianStage(Stage):
+    """
+    size × size median. The padded frame lives in a fixed buffer, so its
+    sliding_window_view is built once and every call is copy → partition.
+    border: "edge" (replicate) or "wrap" (what the old np.roll median3x3 did).
+    """
+
+    name = "median"
+
+    def __init__(self, shape=DEFAULT_SHAPE, size=3, border="edge"):
+        super().__init__(shape)
+        if size < 1 or size % 2 == 0:
+            raise ValueError("size must be a positive odd number")
+        if border not in ("edge", "wrap"):
+            raise ValueError("border must be 'edge' or 'wrap'")
+        self.size = int(size)
+        self.border = border
+        self._r = r = self.size // 2
+        h, w = self.shape
+        self._padded = np.zeros((h + 2 * r, w + 2 * r), dtype=np.float32)
+        self._windows = sliding_window_view(self._padded, (self.size, self.size))   # (h, w, s, s) view
+        self._work = np.empty((h * w, self.size * self.size), dtype=np.float32)
+
+    def __call__(self, src):
+        r, p = self._r, self._padded
+        h, w = self.shape
+        p[r:r + h, r:r + w] = src
+        if r:
+            if self.border == "edge":
+                p[:r, r:r + w] = src[:1]
+                p[r + h:, r:r + w] = src[-1:]
+                p[:, :r] = p[:, r:r + 1]
+                p[:, r + w:] = p[:, r + w - 1:r + w]
+            else:
+                p[:r, r:r + w] = src[h - r:]
+                p[r + h:, r:r + w] = src[:r]
+                p[:, :r] = p[:, w:w + r]
+                p[:, r + w:] = p[:, r:2 * r]
+
+        np.copyto(self._work.reshape(h, w, self.size, self.size), self._windows)
+        _median_rows(self._work, self.out.reshape(-1))
+        return self.out
+
+
+class GaussianStage(Stage):
+    """cv2.GaussianBlur(src, (ksize, ksize), sigma) into the stage buffer."""
+
+    name = "gaussian"
+
+    def __init__(self, shape=DEFAULT_SHAPE, ksize=3, sigma=0):
+        if cv2 is None:
+            raise RuntimeError("gaussian stage needs OpenCV (cv2)")
+        super().__init__(shape)
+        self.ksize = (int(ksize), int(ksize))
+        self.sigma = sigma
+
+    def __call__(self, src):
+        cv2.GaussianBlur(src, self.ksize, self.sigma, dst=self.out)
+        return self.out
+
+
+def cosine_lut(shape=DEFAULT_SHAPE, fov_x=45.0, fov_y=45.0):
+    """cos(angle) per zone for a sensor with the given field of view (degrees)."""
+    h, w = shape
+    ax = np.linspace(-np.deg2rad(fov_x) / 2, np.deg2rad(fov_x) / 2, w)
+    ay = np.linspace(-np.deg2rad(fov_y) / 2, np.deg2rad(fov_y) / 2, h)
+    return np.outer(np.cos(ay), np.cos(ax)).astype(np.float32)
+
+
+class CosineStage(Stage):
+    """Project slant ranges onto the sensor axis: out = src * LUT."""
+
+    name = "cosine"
+
+    def __init__(self, shape=DEFAULT_SHAPE, fov_x=45.0, fov_y=45.0):
+        super().__init__(shape)
+        self.lut = cosine_lut(self.shape, fov_x, fov_y)
+
+    def __call__(self, src):
+        np.multiply(src, self.lut, out=self.out)
+        return self.out
+
+
+class InvalidMaskStage(Stage):
+    """
+    Zones outside [lo, hi] are out of range / no target.
+    mode: "hold" keeps the last valid value, "zero" writes 0, "clip" clamps.
+    """
+
+    name = "invalid"
+    MODES = ("hold", "zero", "clip")
+
+    def __init__(self, shape=DEFAULT_SHAPE, lo=0.05, hi=4.0, mode="hold"):
+        super().__init__(shape)
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode!r}")
+        self.lo, self.hi, self.mode = float(lo), float(hi), mode
+        self.invalid = np.zeros(self.shape, dtype=bool)
+        self._tmp = np.empty(self.shape, dtype=bool)
+
+    def __call__(self, src):
+        if self.mode == "clip":
+            np.clip(src, self.lo, self.hi, out=self.out)
+            return self.out
+
+        np.less(src, self.lo, out=self.invalid)
+        np.greater(src, self.hi, out=self._tmp)
+        self.invalid |= self._tmp
+        np.logical_not(self.invalid, out=self._tmp)
+        if self.mode == "zero":
+            self.out[:] = 0.0
+        np.copyto(self.out, src, where=self._tmp)
+        return self.out
+
+
+class ClipStage(Stage):
+    """Clamp to [lo, hi]."""
+
+    name = "clip"
+
+    def __init__(self, shape=DEFAULT_SHAPE, lo=0.0, hi=4.0):
+        super().__init__(shape)
+        self.lo, self.hi = float(lo), float(hi)
+
+    def __call__(self, src):
+        np.clip(src, self.lo, self.hi, out=self.out)
+        return self.out
+
+
+def _median_rows(work, out):
+    """Median of each row of work (partitioned in place) into out."""
+    n = work.shape[1]
+    mid = n // 2
+    if n % 2:
+        work.partition(mid, axis=1)
+        np.copyto(out, work[:, mid])
+    else:
+        work.partition((mid - 1, mid), axis=1)
+        np.add(work[:, mid - 1], work[:, mid], out=out)
+        np.multiply(out, 0.5, out=out)
+
+
+STAGES = {cls.name: cls for cls in (
+    EmaStage, TemporalMedianStage, SpatialMedianStage, GaussianStage,
+    CosineStage, InvalidMaskStage, ClipStage,
+)}
+
+
+# === PIPELINE ===
+class FilterPipeline:
+    """Runs stages in order; each stage reads the previous stage's buffer."""
+
+    def __init__(self, stages, shape=DEFAULT_SHAPE):
+        self.stages = list(stages)
+        self.shape = tuple(shape)
+        self._input = np.zeros(self.shape, dtype=np.float32)
+
+    def __call__(self, frame):
+        """Filter one frame (any float/int array reshapeable to shape)."""
+        np.copyto(self._input, np.reshape(frame, self.shape), casting="unsafe")
+        data = self._input
+        for stage in self.stages:
+            data = stage(data)
+        return data
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def benchmark(self, frames=2000, seed=0):
+        """Mean µs per call of each stage on its own, plus the whole chain."""
+        rng = np.random.default_rng(seed)
+        src = rng.uniform(0.0, 4.5, self.shape).astype(np.float32)
+        timings = {}
+        for i, stage in enumerate(self.stages):
+            t0 = time.perf_counter()
+            for _ in range(frames):
+                stage(src)
+            timings[f"{i}:{stage.name}"] = (time.perf_counter() - t0) / frames * 1e6
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            self(src)
+        timings["chain"] = (time.perf_counter() - t0) / frames * 1e6
+        self.reset()
+        return timings
+
+    def __repr__(self):
+        return " → ".join(stage.name for stage in self.stages) or "<empty pipeline>"
+
+
+def build_pipeline(config, shape=DEFAULT_SHAPE):
+    """
+    config: iterable of stage names or (name, kwargs) pairs, e.g.
+        ["ema", ("gaussian", {"ksize": 3}), ("clip", {"hi": 4.0})]
+    """
+    stages = []
+    for item in config:
+        name, kwargs = (item, {}) if isinstance(item, str) else item
+        if name not in STAGES:
+            raise ValueError(f"unknown filter stage {name!r} (known: {', '.join(STAGES)})")
+        stages.append(STAGES[name](shape, **kwargs))
+    return FilterPipeline(stages, shape)
+
+
+# === BENCHMARK ===
+if __name__ == "__main__":
+    chains = {
+        "processor": ["ema", "gaussian", "clip"],
+        "heatmap": [("invalid", {"mode": "hold"}), "cosine", ("median", {"border": "wrap"})],
+        "all": ["invalid", "cosine", ("tmedian", {"k": 5}), "median", "ema", "gaussian", "clip"],
+    }
+    names = sys.argv[1:] or list(chains)
+    for name in names:
+        chain = build_pipeline(chains[name])
+        print(f"\n⏱  {name}: {chain}")
+        for stage, us in chain.benchmark().items():
+            print(f"   {stage:<12} {us:7.2f} µs/frame")
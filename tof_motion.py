@@ -0,0 +1,214 @@
+"""
+tof_motion.py
+-------------
+Per-zone motion segmentation: tells an obstacle walking towards you from a
+wall at the same distance.
+
+The last HISTORY ToF frames sit in a preallocated circular (HISTORY, h, w)
+array. Each update differences the mean of the newest WINDOW frames against
+the mean of the oldest WINDOW frames, zone by zone (averaging WINDOW frames
+on each side keeps single-frame noise out), and labels every zone:
+
+    STATIC       no significant change
+    APPROACHING  closer by at least MIN_DELTA_M, at least MIN_SPEED_MPS
+    RECEDING     the same, moving away
+
+Zones with a dropout (< min_m) in either window stay STATIC, and so do zones
+none of whose 4-neighbours moved the same way: sensor noise is independent
+per zone, real objects cover several adjacent zones. When at least
+MIN_ZONES zones have been approaching for CONFIRM consecutive frames, the
+update flags an "approaching object" event (once, until the blob goes away).
+mask_bits is the approaching mask packed into bytes (np.packbits order): the
+compact form that goes into the shared sensor state.
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# === CONFIG ===
+HISTORY = 8               # frames in the ring (~0.5 s at 15 Hz)
+WINDOW = 3                # frames averaged at each end of the history
+MIN_SPEED_MPS = 0.3
+MIN_DELTA_M = 0.08        # well above the averaged per-zone noise (~1–2 cm)
+MIN_RANGE_M = 0.05
+MIN_ZONES = 3             # zones an approaching blob needs before it's an event
+CONFIRM = 2               # consecutive frames
+
+STATIC, APPROACHING, RECEDING = 0, 1, 2
+LABEL_NAMES = ("static", "approaching", "receding")
+
+Motion = namedtuple("Motion", [
+    "approaching",   # zones labelled APPROACHING
+    "receding",      # zones labelled RECEDING
+    "nearest",       # m, nearest approaching zone (inf if none)
+    "speed",         # m/s, median closing speed of the approaching zones (0 if none)
+    "confirmed",     # an approaching object is confirmed (MIN_ZONES for CONFIRM frames)
+    "event",         # True on the frame it gets confirmed
+])
+
+NO_MOTION = Motion(0, 0, math.inf, 0.0, False, False)
+
+
+def unpack_mask(bits, shape):
+    """Approaching mask (h, w) bool from mask_bits."""
+    h, w = shape
+    return np.unpackbits(bits, count=h * w).astype(bool).reshape(h, w)
+
+
+class MotionSegmenter:
+    """
+    Usage:
+        motion = MotionSegmenter((8, 8))
+        m = motion.update(frame_m, t)     # Motion summary; motion.labels is the (h, w) label grid
+        if m.event: ...
+    """
+
+    def __init__(self, shape, history=HISTORY, window=WINDOW, min_speed=MIN_SPEED_MPS,
+                 min_delta=MIN_DELTA_M, min_m=MIN_RANGE_M, min_zones=MIN_ZONES, confirm=CONFIRM):
+        if not 1 <= window <= history // 2:
+            raise ValueError(f"window must be 1…{history // 2} for a history of {history}")
+        self.shape = tuple(shape)
+        self.window = window
+        self.min_speed = min_speed
+        self.min_delta = min_delta
+        self.min_m = min_m
+        self.min_zones = min_zones
+        self.confirm = confirm
+        n = self.shape[0] * self.shape[1]
+
+        # --- Preallocated ring + work buffers ---
+        self._ring = np.zeros((history, n), dtype=np.float32)
+        self._t = np.zeros(history)
+        self._steps = np.arange(history)
+        self._win = np.empty((window, n), dtype=np.float32)
+        self._old = np.empty(n, dtype=np.float32)
+        self._new = np.empty(n, dtype=np.float32)
+        self._delta = np.empty(n, dtype=np.float32)
+        self._ok = np.empty(n, dtype=bool)
+        self._tmp = np.empty(n, dtype=bool)
+        self.approaching = np.zeros(n, dtype=bool)
+        self.receding = np.zeros(n, dtype=bool)
+        self._support = np.empty(self.shape, dtype=bool)
+        self.labels = np.zeros(self.shape, dtype=np.int8)
+        self._labels_flat = self.labels.reshape(-1)
+        self.mask_bits = np.packbits(self.approaching)
+        self.reset()
+
+    def reset(self):
+        self._head = 0
+        self._count = 0
+        self._streak = 0
+        self._reported = False
+        self.approaching[:] = False
+        self.receding[:] = False
+        self.labels[:] = STATIC
+        self.mask_bits[:] = 0
+        self.last = NO_MOTION
+
+    def _window_stats(self, rows, mean, ok):
+        """Mean over the ring rows into mean; ok &= every frame had a valid reading."""
+        np.take(self._ring, rows, axis=0, out=self._win)
+        np.min(self._win, axis=0, out=mean)
+        np.greater_equal(mean, self.min_m, out=self._tmp)
+        ok &= self._tmp
+        np.sum(self._win, axis=0, out=mean)
+        mean *= 1.0 / self.window
+
+    def _keep_supported(self, mask):
+        """Clear zones of mask (flat, in place) that have no 4-neighbour set."""
+        grid = mask.reshape(self.shape)
+        s = self._support
+        s[:] = False
+        s[1:] |= grid[:-1]
+        s[:-1] |= grid[1:]
+        s[:, 1:] |= grid[:, :-1]
+        s[:, :-1] |= grid[:, 1:]
+        grid &= s
+
+    def update(self, frame, t):
+        """Add one frame (metres, (h, w) or flat) taken at time t; returns the Motion summary."""
+        size = self._t.size
+        if self._count and t < self._t[self._head - 1]:
+            self.reset()                                   # clock went backwards (looped replay)
+        np.copyto(self._ring[self._head], np.reshape(frame, -1), casting="unsafe")
+        self._t[self._head] = t
+        self._head = (self._head + 1) % size
+        self._count = min(self._count + 1, size)
+        if self._count < size:
+            return self.last
+
+        order = (self._head + self._steps) % size          # oldest → newest
+        old, new = order[:self.window], order[-self.window:]
+        dt = float(self._t[new].mean() - self._t[old].mean())
+        if dt <= 0:
+            return self.last
+
+        ok = self._ok
+        ok[:] = True
+        self._window_stats(old, self._old, ok)
+        self._window_stats(new, self._new, ok)
+        delta = np.subtract(self._new, self._old, out=self._delta)   # < 0: closer
+
+        # approaching: -delta ≥ max(min_delta, min_speed·dt); receding mirrored
+        threshold = max(self.min_delta, self.min_speed * dt)
+        np.less_equal(delta, -threshold, out=self.approaching)
+        self.approaching &= ok
+        np.greater_equal(delta, threshold, out=self.receding)
+        self.receding &= ok
+        self._keep_supported(self.approaching)
+        self._keep_supported(self.receding)
+        self._labels_flat[:] = STATIC
+        self._labels_flat[self.approaching] = APPROACHING
+        self._labels_flat[self.receding] = RECEDING
+        self.mask_bits = np.packbits(self.approaching)
+
+        n_in = int(np.count_nonzero(self.approaching))
+        n_out = int(np.count_nonzero(self.receding))
+        nearest, speed = math.inf, 0.0
+        if n_in:
+            nearest = float(self._new[self.approaching].min())
+            speed = float(np.median(delta[self.approaching])) / -dt
+
+        # --- Event: a confirmed approaching blob, reported once ---
+        self._streak = self._streak + 1 if n_in >= self.min_zones else 0
+        confirmed = self._streak >= self.confirm
+        event = confirmed and not self._reported
+        self._reported = confirmed
+        self.last = Motion(n_in, n_out, nearest, speed, confirmed, event)
+        return self.last
+
+
+# === DEMO ===
+if __name__ == "__main__":
+    import time
+
+    HZ = 15
+    rng = np.random.default_rng(0)
+    motion = MotionSegmenter((8, 8))
+
+    # A wall at 1.0 m on the left, a person walking in at 1.2 m/s on the right
+    events = []
+    for k in range(45):
+        t = k / HZ
+        frame = 1.0 + rng.normal(0, 0.02, (8, 8))
+        frame[:, 4:] = 3.0 - 1.2 * max(0.0, t - 1.0) + rng.normal(0, 0.02, (8, 4))
+        m = motion.update(frame, t)
+        if m.event:
+            events.append((t, m))
+
+    for t, m in events:
+        print(f"  t={t:.2f} s: approaching object, {m.approaching} zones, "
+              f"nearest {m.nearest:.2f} m, {m.speed:.2f} m/s")
+    print("  labels (0 static, 1 approaching, 2 receding):")
+    for row in motion.labels:
+        print("   ", " ".join(str(v) for v in row))
+    print(f"  mask_bits: {motion.mask_bits.tobytes().hex()} "
+          f"({motion.mask_bits.nbytes} bytes for {motion.labels.size} zones)")
+
+    n = 5000
+    t0 = time.perf_counter()
+    for k in range(n):
+        motion.update(frame, 3.0 + k / HZ)
+    print(f"MotionSegmenter.update: {(time.perf_counter() - t0) / n * 1e6:.0f} µs per 8×8 frame")
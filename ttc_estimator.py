@@ -0,0 +1,160 @@
+"""
+ttc_estimator.py
+----------------
+Time to collision from the fused-distance history.
+
+The last WINDOW_S seconds of (t, distance) samples sit in a small ring
+buffer. Each update fits the approach speed with a Theil–Sen estimator (the
+median of all pairwise slopes). Unlike a least-squares slope, it shrugs off
+single-frame dropouts and ultrasonic spikes. The same fit extrapolates the
+distance to "now", so the TTC doesn't inherit the EMA / rolling-mean lag:
+
+    ttc = distance_now / closing_speed
+
+To keep false alarms down, a finite TTC is only reported when
+  - the window holds MIN_SAMPLES samples spanning at least MIN_SPAN_S,
+  - the closing speed is at least MIN_CLOSING_MPS (sensor noise and slow
+    drift aren't an approach),
+  - at least AGREEMENT of the pairwise slopes say "closing".
+Otherwise ttc is inf.
+
+Run this file for a walking-approach demo: python -m sensors.ttc_estimator
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# === CONFIG ===
+WINDOW_S = 1.0
+MAX_SAMPLES = 32          # ring size; at > 32 Hz the window gets shorter than WINDOW_S
+MIN_SAMPLES = 6
+MIN_SPAN_S = 0.4
+MIN_CLOSING_MPS = 0.25    # slow shuffling / noise below this
+AGREEMENT = 0.75          # fraction of pairwise slopes that must be negative
+MAX_TTC_S = 10.0
+
+TtcEstimate = namedtuple("TtcEstimate", [
+    "ttc",        # s until contact at the current closing speed, inf if not approaching
+    "speed",      # m/s, positive = closing
+    "distance",   # m, fused distance extrapolated to now by the fit
+    "samples",    # samples in the window
+])
+
+NO_TTC = TtcEstimate(math.inf, 0.0, math.nan, 0)
+
+_PAIRS = {}
+
+
+def _pairs(n):
+    """Upper-triangle index pairs for n samples (cached per n)."""
+    if n not in _PAIRS:
+        _PAIRS[n] = np.triu_indices(n, 1)
+    return _PAIRS[n]
+
+
+class TtcEstimator:
+    """
+    Usage:
+        ttc = TtcEstimator()
+        est = ttc.update(t, fused_m)     # once per fused sample
+        if est.ttc < 2.0: ...
+    """
+
+    def __init__(self, window_s=WINDOW_S, max_samples=MAX_SAMPLES, min_samples=MIN_SAMPLES,
+                 min_span_s=MIN_SPAN_S, min_closing=MIN_CLOSING_MPS, agreement=AGREEMENT,
+                 max_ttc=MAX_TTC_S):
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.min_span_s = min_span_s
+        self.min_closing = min_closing
+        self.agreement = agreement
+        self.max_ttc = max_ttc
+        self._t = np.zeros(max_samples)
+        self._d = np.zeros(max_samples)
+        self._ring = np.arange(max_samples)
+        self.reset()
+
+    def reset(self):
+        self._head = 0
+        self._n = 0
+        self.last = NO_TTC
+
+    def update(self, t, distance):
+        """Add one fused sample (None/NaN = dropout, skipped) and return the current TtcEstimate."""
+        if self._n and t < self._t[self._head - 1]:
+            self.reset()                                  # clock went backwards (looped replay)
+        if distance is not None and math.isfinite(distance):
+            size = self._t.size
+            self._t[self._head] = t
+            self._d[self._head] = distance
+            self._head = (self._head + 1) % size
+            self._n = min(self._n + 1, size)
+        self.last = self._estimate(t)
+        return self.last
+
+    def _estimate(self, now):
+        size = self._t.size
+        order = (self._head - self._n + self._ring[:self._n]) % size   # oldest → newest
+        t = self._t[order]
+        first = int(np.searchsorted(t, now - self.window_s))
+        t, d = t[first:], self._d[order[first:]]
+        n = t.size
+        if n < self.min_samples or t[-1] - t[0] < self.min_span_s:
+            return TtcEstimate(math.inf, 0.0, float(d[-1]) if n else math.nan, n)
+
+        i, j = _pairs(n)
+        dt = t[j] - t[i]
+        keep = dt > 1e-6
+        slopes = (d[j] - d[i])[keep] / dt[keep]
+        if not slopes.size:
+            return TtcEstimate(math.inf, 0.0, float(d[-1]), n)
+        slope = float(np.median(slopes))
+        distance = float(np.median(d - slope * (t - now)))
+        closing = -slope
+
+        if (closing < self.min_closing or distance <= 0.0
+                or np.count_nonzero(slopes < 0) < self.agreement * slopes.size):
+            return TtcEstimate(math.inf, closing, distance, n)
+        ttc = distance / closing
+        return TtcEstimate(ttc if ttc <= self.max_ttc else math.inf, closing, distance, n)
+
+
+# === DEMO ===
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    HZ, SPEED = 15, 1.4
+
+    def walk(speed, seconds=4.0, start=4.0):
+        """Fused samples of a walk towards a wall: 3 cm noise, 5 % dropouts, 3 % spikes."""
+        t = np.arange(int(seconds * HZ)) / HZ
+        d = np.maximum(start - speed * t, 0.05) + rng.normal(0, 0.03, t.size)
+        d[rng.random(t.size) < 0.03] = 4.0
+        d[rng.random(t.size) < 0.05] = np.nan
+        return t, d
+
+    t, d = walk(SPEED)
+    est = TtcEstimator()
+    first = {}
+    t0 = time.perf_counter()
+    for tk, dk in zip(t, d):
+        e = est.update(tk, dk)
+        for limit in (3.0, 2.0, 1.0):
+            if e.ttc <= limit and limit not in first:
+                first[limit] = (tk, 4.0 - SPEED * tk)
+    dt = (time.perf_counter() - t0) / t.size * 1e6
+    print(f"Walking at {SPEED} m/s from 4 m ({HZ} Hz, {dt:.0f} µs/update):")
+    for limit, (tk, dist) in sorted(first.items(), reverse=True):
+        print(f"  TTC ≤ {limit:.0f} s at t={tk:.2f} s, {dist:.2f} m away "
+              f"({dist / SPEED:.2f} s before contact)")
+    print(f"  distance alone reaches 0.35 m at t={(4.0 - 0.35) / SPEED:.2f} s")
+
+    # Standing still / swaying: no finite TTC allowed
+    t, d = walk(0.0, seconds=60.0, start=1.2)
+    d += 0.05 * np.sin(2 * np.pi * 0.5 * t)
+    est = TtcEstimator()
+    alarms = sum(est.update(tk, dk).ttc <= 3.0 for tk, dk in zip(t, d))
+    print(f"Standing 1.2 m away and swaying ±5 cm for 60 s: {alarms} frames with TTC ≤ 3 s")
@@ -0,0 +1,369 @@
+"""
+tts_engine.py
+-------------
+Long-lived Piper text-to-speech: the voice model is loaded once, not per
+caption.
+
+Backends (TTS_BACKEND):
+    "python"   piper-tts in this process (PiperVoice): the ONNX session stays
+               loaded, synthesis returns PCM directly
+    "process"  one persistent `piper --output-raw --json-input` process (the
+               piper binary), fed one JSON line per utterance; raw 16-bit PCM
+               is read back from its stdout by a reader thread
+    "auto"     "python" if piper-tts is importable, else "process"
+
+Piper's raw stream itself has no end-of-utterance marker. The boundary is
+its per-line log instead: after writing (and flushing) all of a line's PCM
+to stdout, piper logs "Real-time factor: ..." (LINE_DONE) to stderr. The
+reader thread watches both pipes; on that log line it first drains whatever
+stdout holds, which is the rest of that line's audio, then marks the end.
+A line that doesn't finish within PROCESS_LINE_TIMEOUT_S restarts the
+process, so its late audio can't leak into the next utterance; a process
+that has exited (crashed, killed) is restarted before the next one.
+
+Synthesized PCM is resampled to the audio engine's rate if the voice differs,
+padded with LEAD_SILENCE_S of silence in memory, and queued on the
+persistent audio stream: no temp files, no sox / pw-play / shell pipeline
+per utterance. The stream is output.say(): this process's audio_engine by
+default, or, in the controller with SENSOR_PROCESS, the sensor process's
+engine through SensorService.say(), where speech mixes with the proximity
+tones on the one player. Synthesis runs inside cpu_budget.active("tts"), so
+vision yields cores meanwhile.
+
+speak_stream() doesn't wait for the whole caption: split_clauses() cuts it
+at punctuation, or before conjunctions / prepositions once a clause gets
+long (BLIP captions rarely have punctuation). Each clause is queued the
+moment it is synthesized, and the next one is synthesized while the
+previous one plays (clips queue back to back on the audio stream). Time to
+first audio then depends on the first clause, kept to FIRST_CLAUSE_WORDS,
+not on the caption length. The process backend gets every clause line at
+once and its PCM is forwarded chunk by chunk as piper produces it.
+
+    tts = tts_engine.TtsEngine().load()     # once, in the TTS thread (after cpu_budget.apply("tts"))
+    pcm = tts.synthesize("a person at a desk")    # int16 mono at audio_engine.SAMPLE_RATE
+    clip = tts.speak("a person at a desk")        # queued on the audio stream; clip.done.wait()
+    clips = tts.speak_stream(caption)             # clause by clause; clips[0].t_start = first audio
+    tts.speak(caption, output=service)            # any object with say(pcm) → clip, e.g. SensorService
+"""
+
+import json
+import os
+import re
+import select
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from queue import Queue, Empty
+
+import numpy as np
+
+import audio_engine
+import cpu_budget
+
+try:
+    from piper import PiperVoice
+except ImportError:    # "process" backend only
+    PiperVoice = None
+
+# === CONFIG ===
+MODEL_PATH = "~/piper_voices/en_US-amy-medium.onnx"
+TTS_BACKEND = "auto"
+PIPER_CMD = ["piper", "--model", "{model}", "--output-raw", "--json-input"]
+LEAD_SILENCE_S = 0.15             # in-memory pad in front of each utterance
+PROCESS_LINE_TIMEOUT_S = 15.0     # process backend: one line must finish within this
+LINE_DONE = b"Real-time factor:"  # piper's stderr log after each line's audio is written
+READ_CHUNK = 4096                 # bytes per read from piper's stdout
+
+# === STREAMING ===
+FIRST_CLAUSE_WORDS = 6            # the first clause alone sets time to first audio
+MAX_CLAUSE_WORDS = 10
+MIN_CLAUSE_WORDS = 3              # shorter pieces join the previous clause
+CLAUSE_PUNCTUATION = re.compile(r"(?<=[.!?;:,])\s+")
+CLAUSE_WORDS = {"and", "but", "while", "with", "which", "where", "who",
+                "on", "in", "at", "near", "next", "under", "behind", "holding"}
+
+
+def split_clauses(text, first=FIRST_CLAUSE_WORDS, longest=MAX_CLAUSE_WORDS, shortest=MIN_CLAUSE_WORDS):
+    """
+    Clauses for streaming synthesis: split at punctuation, then cut anything
+    over first (first clause) / longest words before the last CLAUSE_WORDS
+    word that leaves at least shortest words, else hard at the limit.
+    """
+    clauses = []
+    for part in CLAUSE_PUNCTUATION.split(text.strip()):
+        words = part.split()
+        while words:
+            limit = first if not clauses else longest
+            cut = len(words)
+            if cut > limit:
+                cut = next((i for i in range(limit, shortest - 1, -1) if words[i].lower() in CLAUSE_WORDS), limit)
+            clause = " ".join(words[:cut])
+            if clauses and cut < shortest:
+                clauses[-1] += " " + clause
+            else:
+                clauses.append(clause)
+            words = words[cut:]
+    return clauses
+
+
+_LINE_END = object()              # reader → synthesizer: piper finished one input line
+
+
+def resample(pcm, rate_in, rate_out):
+    """Linear-interpolation resample of mono int16 PCM (no-op if the rates match)."""
+    if rate_in == rate_out or not pcm.size:
+        return pcm
+    n = int(round(pcm.size * rate_out / rate_in))
+    x = np.arange(n) * (rate_in / rate_out)
+    return np.interp(x, np.arange(pcm.size), pcm).astype(np.int16)
+
+
+def voice_rate(model_path, default=22050):
+    """Sample rate from the voice's .onnx.json config."""
+    try:
+        with open(f"{model_path}.json") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except (OSError, KeyError, ValueError):
+        return default
+
+
+class TtsEngine:
+    """
+    Usage:
+        tts = TtsEngine("~/piper_voices/en_US-amy-medium.onnx").load()
+        tts.speak("hello").done.wait()
+        tts.close()
+    """
+
+    def __init__(self, model_path=MODEL_PATH, backend=TTS_BACKEND, rate=audio_engine.SAMPLE_RATE):
+        self.model_path = str(Path(model_path).expanduser())
+        self.backend = backend
+        self.rate = rate
+        self.voice_rate = None
+        self._voice = None
+        self._proc = None
+        self._chunks = None               # process backend: PCM chunks, _LINE_END, None = exited
+        self._reader = None
+        self._lock = threading.Lock()      # one utterance at a time
+        self.load_s = None
+        self.utterances = 0
+
+    # --- Control ---
+    def load(self):
+        """Load the voice once (idempotent); returns self."""
+        if self._voice is not None or self._proc is not None:
+            return self
+        backend = self.backend
+        if backend == "auto":
+            backend = "python" if PiperVoice is not None else "process"
+        t0 = time.perf_counter()
+        if backend == "python":
+            if PiperVoice is None:
+                raise RuntimeError("TTS_BACKEND 'python' needs piper-tts (pip install piper-tts)")
+            self._voice = PiperVoice.load(self.model_path)
+            self.voice_rate = int(self._voice.config.sample_rate)
+        elif backend == "process":
+            self._start_process()
+        else:
+            raise ValueError(f"unknown TTS backend {backend!r}")
+        self.backend = backend
+        self.load_s = time.perf_counter() - t0
+        print(f"🗣️ Piper voice loaded ({backend}, {self.voice_rate} Hz) in {self.load_s:.2f} s")
+        return self
+
+    def _start_process(self):
+        if shutil.which(PIPER_CMD[0]) is None:
+            raise RuntimeError(f"TTS_BACKEND 'process' needs `{PIPER_CMD[0]}` on PATH")
+        self.voice_rate = voice_rate(self.model_path)
+        self._proc = subprocess.Popen(
+            [arg.format(model=self.model_path) for arg in PIPER_CMD],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=cpu_budget.child_env("tts"),
+        )
+        self._chunks = Queue()            # fresh per process: a dead reader can't feed the next one
+        self._reader = threading.Thread(target=self._read_output, args=(self._proc, self._chunks),
+                                        name="piper-reader", daemon=True)
+        self._reader.start()
+
+    @staticmethod
+    def _read_output(proc, chunks):
+        """
+        Reader thread: raw PCM from piper's stdout → int16 chunks (odd bytes
+        carried over), and a _LINE_END after each LINE_DONE log on stderr.
+        """
+        out, err = proc.stdout.fileno(), proc.stderr.fileno()
+        os.set_blocking(out, False)
+        carry, log = b"", b""
+        open_fds = [out, err]
+
+        def drain():
+            nonlocal carry
+            while True:
+                try:
+                    data = os.read(out, READ_CHUNK)
+                except BlockingIOError:
+                    return True
+                if not data:
+                    return False          # EOF
+                data = carry + data
+                cut = len(data) & ~1
+                carry = data[cut:]
+                if cut:
+                    chunks.put(np.frombuffer(data[:cut], dtype=np.int16))
+
+        while open_fds:
+            ready, _, _ = select.select(open_fds, [], [])
+            if out in ready and not drain():
+                open_fds.remove(out)
+            if err in ready:
+                data = os.read(err, READ_CHUNK)
+                if not data:
+                    open_fds.remove(err)
+                    continue
+                *lines, log = (log + data).split(b"\n")
+                for line in lines:
+                    if LINE_DONE in line:
+                        if out in open_fds and not drain():   # the line's audio is already in the pipe
+                            open_fds.remove(out)
+                        chunks.put(_LINE_END)
+        chunks.put(None)                  # piper exited
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self._proc.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+            self._proc = None
+        self._voice = None
+
+    # --- Synthesis ---
+    def _synthesize_python(self, text):
+        voice = self._voice
+        if hasattr(voice, "synthesize_stream_raw"):        # piper-tts 1.2: bytes per sentence
+            for raw in voice.synthesize_stream_raw(text):
+                yield np.frombuffer(raw, dtype=np.int16)
+        else:                                               # piper-tts ≥ 1.3: AudioChunk per sentence
+            for chunk in voice.synthesize(text):
+                yield chunk.audio_int16_array
+
+    def _synthesize_process(self, lines):
+        """Every line queued at once; PCM chunks in order as piper produces them, until each line has ended."""
+        payload = "".join(json.dumps({"text": line}) + "\n" for line in lines).encode("utf-8")
+        for retry in (False, True):
+            if self._proc.poll() is not None:               # exited since the last utterance: restart
+                self.close()
+                self.load()
+            try:
+                self._proc.stdin.write(payload)
+                self._proc.stdin.flush()
+                break
+            except OSError as e:                            # BrokenPipeError: died just now
+                self.close()
+                if retry:
+                    raise RuntimeError(f"piper process unavailable: {e}") from e
+                self.load()
+        remaining = len(lines)
+        while remaining:
+            try:
+                chunk = self._chunks.get(timeout=PROCESS_LINE_TIMEOUT_S)
+            except Empty:
+                self.close()                                # its late audio would belong to this line
+                raise RuntimeError(f"piper didn't finish a line within {PROCESS_LINE_TIMEOUT_S:g} s")
+            if chunk is None:
+                self.close()
+                raise RuntimeError("piper process exited")
+            if chunk is _LINE_END:
+                remaining -= 1
+            else:
+                yield chunk
+
+    def chunks(self, text):
+        """int16 PCM chunks of one utterance at the voice's rate, as the backend produces them."""
+        self.load()
+        if self._voice is not None:
+            return self._synthesize_python(text)
+        return self._synthesize_process([text])
+
+    def _finish(self, parts, pad):
+        """Concatenate voice-rate chunks, resample to self.rate, prepend pad seconds of silence."""
+        pcm = resample(np.concatenate(parts) if parts else np.zeros(0, np.int16), self.voice_rate, self.rate)
+        lead = int(pad * self.rate)
+        out = np.zeros(lead + pcm.size, dtype=np.int16)
+        out[lead:] = pcm
+        return out
+
+    def synthesize(self, text, pad=0.0):
+        """Whole utterance as int16 mono at self.rate, with pad seconds of leading silence."""
+        with self._lock, cpu_budget.active("tts"):
+            parts = list(self.chunks(text))
+        self.utterances += 1
+        return self._finish(parts, pad)
+
+    def speak(self, text, pad=LEAD_SILENCE_S, output=None):
+        """Synthesize and queue on output (default: audio_engine); returns its clip (SpeechClip interface)."""
+        return (output or audio_engine).say(self.synthesize(text, pad))
+
+    def _stream_parts(self, clauses):
+        """Lists of voice-rate chunks, each ready to play: one per clause (python) or per read (process)."""
+        self.load()
+        if self._voice is not None:
+            for clause in clauses:
+                yield list(self._synthesize_python(clause))
+        else:
+            for chunk in self._synthesize_process(clauses):
+                yield [chunk]
+
+    def speak_stream(self, text, pad=LEAD_SILENCE_S, output=None):
+        """
+        Speak clause by clause: each clause is queued as soon as it is
+        synthesized, while the next one is synthesized. Returns the
+        SpeechClips in order (clips[0].t_start is the time of first audio).
+        """
+        output = output or audio_engine
+        clips = []
+        with self._lock, cpu_budget.active("tts"):
+            for parts in self._stream_parts(split_clauses(text)):
+                clips.append(output.say(self._finish(parts, pad if not clips else 0.0)))
+        self.utterances += 1
+        return clips
+
+
+# === BENCHMARK ===
+if __name__ == "__main__":
+    import sys
+
+    text = " ".join(sys.argv[1:]) or ("there is a man sitting at a desk with a laptop "
+                                      "and a cup of coffee next to a window")
+    print(" | ".join(split_clauses(text)))
+    tts = TtsEngine()
+    try:
+        tts.load()
+    except RuntimeError as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+
+    audio_engine.start()
+    for k in range(3):
+        t0 = time.time()
+        clip = tts.speak(text)
+        t_synth = time.time() - t0
+        clip.started.wait()
+        print(f"utterance {k + 1}: synthesis {t_synth:.2f} s for {clip.duration:.2f} s of audio, "
+              f"first sample {clip.t_start - t0:.2f} s after the call")
+        clip.done.wait()
+    print(f"model loaded once: {tts.load_s:.2f} s (paid per utterance by `piper --model ... | pw-play`)")
+
+    t0 = time.time()
+    clips = tts.speak_stream(text)
+    clips[0].started.wait()
+    print(f"streamed: first audio {clips[0].t_start - t0:.2f} s after the call "
+          f"({len(clips)} clips, all synthesized after {time.time() - t0:.2f} s)")
+    clips[-1].done.wait()
+    tts.close()
@@ -1,5 +1,5 @@
 """
-visual_tui.py — Live 8×8 text visualizer for VisionAssist sensor simulation
+visual_tui.py — Live ToF text visualizer for VisionAssist sensor simulation
 Displays smoothed ToF data (in meters) from sensor_processor in real time.
 
 Works in any terminal (SSH, VS Code, or VNC).
@@ -9,13 +9,15 @@ Author: Geo & ChatGPT (2025)
 import os
 import time
 import math
+
+import numpy as np
+
 from sensors import sensor_processor as sp
 
 # === CONFIGURATION ===
 REFRESH_HZ = 5        # how many times per second to refresh
 SHOW_VALUES = True    # show numeric ToF values
 USE_COLOR = True      # ANSI color shading
-GRID_SIZE = 8
 
 
 # === COLOR MAPPING ===
@@ -43,31 +45,40 @@ def main():
     interval = 1.0 / REFRESH_HZ
 
     # Provide a placeholder frame so we always draw something
-    frame = [1.5 for _ in range(GRID_SIZE * GRID_SIZE)]
+    frame = np.full(sp.STATE.shape, 1.5, dtype=np.float32)
+    seq = 0
+    ttc = float("inf")
+    sectors = np.full(len(sp.sector_map.names), np.inf, dtype=np.float32)
 
     try:
         while True:
-            # if sensor_processor has data, update frame
-            if hasattr(sp, "last_tof_frame") and sp.last_tof_frame:
-                frame = sp.last_tof_frame
-            else:
-                # fallback to static data if no frame yet
-                frame = [1.5 for _ in range(GRID_SIZE * GRID_SIZE)]
+            # Block until sensor_processor publishes (no redraw of unchanged data)
+            new_seq = sp.STATE.wait(seq, timeout=1.0)
+            if new_seq != seq:
+                seq = new_seq
+                if frame.shape != sp.STATE.shape:     # grid switched (e.g. stitched panorama)
+                    frame = np.full(sp.STATE.shape, 1.5, dtype=np.float32)
+                _, _, ttc = sp.STATE.copy_into(frame, sectors)
 
 
             # draw frame
             clear_screen()
-            print("🧭 VisionAssist 8×8 Distance Map (m)\n")
-            for r in range(GRID_SIZE):
+            rows, cols = frame.shape
+            print(f"🧭 VisionAssist {rows}×{cols} Distance Map (m)\n")
+            for r in range(rows):
                 row_str = ""
-                for c in range(GRID_SIZE):
-                    val = frame[r * GRID_SIZE + c]
+                for c in range(cols):
+                    val = float(frame[r, c])
                     color = get_color(val)
                     if SHOW_VALUES:
                         row_str += f"{color}{val:4.2f}\033[0m "
                     else:
                         row_str += f"{color}██\033[0m "
                 print(row_str)
+            print("\n" + "  ".join(f"{name} {get_color(float(d))}{float(d):4.2f}\033[0m"
+                                    for name, d in zip(sp.sector_map.names, sectors)))
+            if ttc != float("inf"):
+                print(f"\n⚠️  Time to collision: {ttc:.1f} s")
             print("\nPress Ctrl+C to exit visualizer.")
             time.sleep(interval)
 